@@ -1,8 +1,12 @@
+import hmac
 import logging
+import math
 import os
-from typing import Optional
+from typing import Dict, Optional
 
-from fastapi import FastAPI, Header, HTTPException, Response
+from fastapi import Body, FastAPI, Header, HTTPException, Response
+
+from token_registry import TokenRegistry
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -10,6 +14,12 @@ logger = logging.getLogger(__name__)
 # allow cors
 from fastapi.middleware.cors import CORSMiddleware
 
+TOKEN_REGISTRY_PATH = os.getenv("TOKEN_REGISTRY_PATH")
+USAGE_REPORT_TOKEN = os.getenv("USAGE_REPORT_TOKEN")
+# Requests that start GPU work, the only ones a GPU time quota applies to.
+# Polling jobs, downloading results and health checks stay allowed.
+GENERATING_PATHS = ("/generate", "/generate/stream", "/jobs")
+
 app = FastAPI()
 
 app.add_middleware(
@@ -20,13 +30,42 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+registry = TokenRegistry(TOKEN_REGISTRY_PATH, fallback_token=os.getenv("VALID_TOKEN"))
 
-@app.get("/auth/validate")
-async def authenticate(authorization: Optional[str] = Header(None)):
-    valid_token = os.getenv("VALID_TOKEN")
 
-    if not valid_token:
-        logger.error("VALID_TOKEN environment variable not set")
+def _uses_gpu(method: Optional[str], uri: Optional[str]) -> bool:
+    """Whether the forwarded request starts a generation.
+
+    Traefik's ForwardAuth passes the original request in
+    ``X-Forwarded-Method`` and ``X-Forwarded-Uri``; without them the request
+    is assumed to generate.
+    """
+    if not method or not uri:
+        return True
+    path = uri.split("?", 1)[0].rstrip("/")
+    return method.upper() == "POST" and path.endswith(GENERATING_PATHS)
+
+
+def _require_usage_token(token: Optional[str]) -> None:
+    """Reject callers without the ``USAGE_REPORT_TOKEN`` in ``X-Usage-Token``."""
+    if (
+        not USAGE_REPORT_TOKEN
+        or not token
+        or not hmac.compare_digest(token, USAGE_REPORT_TOKEN)
+    ):
+        raise HTTPException(status_code=403, detail="Usage token required")
+
+
+@app.get("/auth/validate")
+async def authenticate(
+    authorization: Optional[str] = Header(None),
+    x_forwarded_method: Optional[str] = Header(None),
+    x_forwarded_uri: Optional[str] = Header(None),
+):
+    # Reload first, so a registry file created after startup is picked up.
+    registry.maybe_reload()
+    if not registry.configured:
+        logger.error("Neither VALID_TOKEN nor a token registry is configured")
         raise HTTPException(
             status_code=500, detail="Authentication configuration error"
         )
@@ -39,11 +78,22 @@ async def authenticate(authorization: Optional[str] = Header(None)):
         if scheme.lower() != "bearer":
             logger.warning(f"Invalid authentication scheme: {scheme}")
             raise HTTPException(status_code=401, detail="Invalid authentication scheme")
-        if token != valid_token:
+        entry = registry.authenticate(token)
+        if entry is None:
             logger.warning("Invalid token attempt")
             raise HTTPException(status_code=401, detail="Invalid token")
+        retry_after = None
+        if _uses_gpu(x_forwarded_method, x_forwarded_uri):
+            retry_after = registry.quota_retry_after(entry.tenant)
+        if retry_after is not None:
+            logger.info(f"Tenant {entry.tenant} is over its GPU time quota")
+            raise HTTPException(
+                status_code=429,
+                detail="GPU time quota exhausted",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
         response = Response(content='{"authenticated": true}')
-        response.headers["X-Auth-User"] = "authenticated"
+        response.headers["X-Auth-User"] = entry.tenant
         return response
     except ValueError:
         logger.warning("Malformed authorization header")
@@ -52,6 +102,29 @@ async def authenticate(authorization: Optional[str] = Header(None)):
         )
 
 
+@app.post("/auth/usage")
+async def report_usage(
+    usage: Dict[str, float] = Body(...),
+    x_usage_token: Optional[str] = Header(None),
+):
+    """Charge GPU seconds used per tenant against their quotas.
+
+    Called by the inference service with the seconds each tenant used since
+    its last report.
+    """
+    _require_usage_token(x_usage_token)
+    for tenant, gpu_seconds in usage.items():
+        registry.charge(tenant, gpu_seconds)
+    return {"charged": len(usage)}
+
+
+@app.get("/auth/stats")
+async def stats(x_usage_token: Optional[str] = Header(None)):
+    """Registry size, reload and rejection counts, and each tenant's quota."""
+    _require_usage_token(x_usage_token)
+    return registry.get_stats()
+
+
 @app.get("/auth/health")
 async def health_check():
     """Health check endpoint for container orchestration"""
@@ -0,0 +1,285 @@
+"""Registry of API tokens, the tenant each belongs to, and its GPU-time quota.
+
+Tokens are kept as SHA-256 digests in a JSON file:
+
+    {
+      "tokens": [
+        {"tenant": "ui", "sha256": "<hex digest>", "gpu_seconds_per_hour": 1800,
+         "burst_gpu_seconds": 300},
+        {"tenant": "nightly", "sha256": "<hex digest>"}
+      ]
+    }
+
+A token without ``gpu_seconds_per_hour`` is unlimited. Tokens that share a
+tenant share its quota. Create entries with:
+
+    python token_registry.py add tokens.json --tenant ui --gpu-seconds-per-hour 1800
+"""
+
+import argparse
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_TENANT = "default"
+
+
+def token_digest(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+
+@dataclass(frozen=True)
+class TokenEntry:
+    tenant: str
+    digest: bytes
+    gpu_seconds_per_hour: Optional[float] = None
+    burst_gpu_seconds: Optional[float] = None
+
+
+class TokenBucket:
+    """GPU seconds that refill continuously up to ``capacity``.
+
+    Usage is charged after it happens, so the level can go negative; the
+    tenant is then refused until it has refilled back above zero.
+    """
+
+    def __init__(self, rate_per_s: float, capacity: float):
+        self.rate_per_s = rate_per_s
+        self.capacity = capacity
+        self.level = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(
+            self.capacity, self.level + (now - self.updated_at) * self.rate_per_s
+        )
+        self.updated_at = now
+
+    def retry_after(self, now: float) -> Optional[float]:
+        """Seconds until the bucket is positive again, or None if it is."""
+        self._refill(now)
+        if self.level > 0:
+            return None
+        return -self.level / self.rate_per_s if self.rate_per_s > 0 else float("inf")
+
+    def charge(self, gpu_seconds: float, now: float) -> None:
+        self._refill(now)
+        self.level -= gpu_seconds
+
+
+class TokenRegistry:
+    """Hashed token lookup, reloaded when the registry file changes.
+
+    Presented tokens are hashed and looked up by digest, so lookup time does
+    not depend on the number of tokens, and the final comparison is constant
+    time. The file is checked for changes at most every
+    ``reload_interval_s``; a file that fails to parse leaves the previous
+    registry in place, and a missing file is an empty registry.
+    ``fallback_token`` (the legacy ``VALID_TOKEN``) is accepted as tenant
+    ``default`` without a quota.
+
+    Meant to be used from one event loop; it holds no locks.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        fallback_token: Optional[str] = None,
+        reload_interval_s: float = 1.0,
+    ):
+        self.path = path
+        self.fallback_token = fallback_token
+        self.reload_interval_s = reload_interval_s
+        self._entries: Dict[bytes, TokenEntry] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._file_state: Optional[Tuple[int, int]] = None
+        self._checked_at = 0.0
+        self.reloads = 0
+        self.reload_errors = 0
+        self.rejected_tokens = 0
+        self.rejected_quota = 0
+        self._load()
+
+    @property
+    def configured(self) -> bool:
+        return bool(self._entries)
+
+    def _parse(self) -> Dict[bytes, TokenEntry]:
+        entries: Dict[bytes, TokenEntry] = {}
+        if self.fallback_token:
+            digest = token_digest(self.fallback_token)
+            entries[digest] = TokenEntry(DEFAULT_TENANT, digest)
+        if not self.path or not os.path.exists(self.path):
+            return entries
+        with open(self.path) as f:
+            data = json.load(f)
+        for item in data.get("tokens", []):
+            digest = bytes.fromhex(item["sha256"])
+            if len(digest) != hashlib.sha256().digest_size:
+                raise ValueError(f"Bad digest for tenant {item.get('tenant')}")
+            entries[digest] = TokenEntry(
+                tenant=str(item["tenant"]),
+                digest=digest,
+                gpu_seconds_per_hour=item.get("gpu_seconds_per_hour"),
+                burst_gpu_seconds=item.get("burst_gpu_seconds"),
+            )
+        return entries
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self) -> None:
+        file_state = self._stat() if self.path else None
+        try:
+            entries = self._parse()
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            # Remember the broken file, so it is only parsed again once changed.
+            self._file_state = file_state
+            self.reload_errors += 1
+            logger.error(f"Could not load token registry {self.path}: {e}")
+            return
+        self._entries = entries
+        self._file_state = file_state
+        self._update_buckets()
+        self.reloads += 1
+        logger.info(
+            f"Loaded {len(entries)} tokens for "
+            f"{len({e.tenant for e in entries.values()})} tenants"
+        )
+
+    def _update_buckets(self) -> None:
+        """Apply quotas from the registry, keeping the level of existing buckets."""
+        quotas = {
+            entry.tenant: entry
+            for entry in self._entries.values()
+            if entry.gpu_seconds_per_hour is not None
+        }
+        buckets: Dict[str, TokenBucket] = {}
+        for tenant, entry in quotas.items():
+            rate = entry.gpu_seconds_per_hour / 3600
+            capacity = entry.burst_gpu_seconds or entry.gpu_seconds_per_hour / 60
+            bucket = self._buckets.get(tenant) or TokenBucket(rate, capacity)
+            bucket.rate_per_s, bucket.capacity = rate, capacity
+            bucket.level = min(bucket.level, capacity)
+            buckets[tenant] = bucket
+        self._buckets = buckets
+
+    def maybe_reload(self) -> None:
+        """Reload the file if it changed, checking at most every reload interval."""
+        if not self.path:
+            return
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval_s:
+            return
+        self._checked_at = now
+        if self._stat() != self._file_state:
+            self._load()
+
+    def authenticate(self, token: str) -> Optional[TokenEntry]:
+        """The entry for ``token``, or None if it is not registered."""
+        self.maybe_reload()
+        digest = token_digest(token)
+        entry = self._entries.get(digest)
+        if entry is None or not hmac.compare_digest(entry.digest, digest):
+            self.rejected_tokens += 1
+            return None
+        return entry
+
+    def quota_retry_after(self, tenant: str) -> Optional[float]:
+        """Seconds until ``tenant`` may send again, or None if within quota."""
+        bucket = self._buckets.get(tenant)
+        if bucket is None:
+            return None
+        retry_after = bucket.retry_after(time.monotonic())
+        if retry_after is not None:
+            self.rejected_quota += 1
+        return retry_after
+
+    def charge(self, tenant: str, gpu_seconds: float) -> None:
+        """Debit GPU seconds used by ``tenant`` from its quota, if it has one."""
+        bucket = self._buckets.get(tenant)
+        if bucket is not None and gpu_seconds > 0:
+            bucket.charge(gpu_seconds, time.monotonic())
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        quotas = {}
+        for tenant, bucket in self._buckets.items():
+            bucket._refill(now)
+            quotas[tenant] = {
+                "gpu_seconds_available": round(bucket.level, 3),
+                "capacity": bucket.capacity,
+                "gpu_seconds_per_hour": round(bucket.rate_per_s * 3600, 3),
+            }
+        return {
+            "tokens": len(self._entries),
+            "tenants": len({e.tenant for e in self._entries.values()}),
+            "reloads": self.reloads,
+            "reload_errors": self.reload_errors,
+            "rejected_tokens": self.rejected_tokens,
+            "rejected_quota": self.rejected_quota,
+            "quotas": quotas,
+        }
+
+
+def add_token(
+    path: str,
+    tenant: str,
+    gpu_seconds_per_hour: Optional[float],
+    burst_gpu_seconds: Optional[float],
+) -> str:
+    """Create a token for ``tenant`` and store its digest; returns the token."""
+    data: Dict[str, Any] = {"tokens": []}
+    if os.path.exists(path):
+        with open(path) as f:
+            data = json.load(f)
+    token = secrets.token_urlsafe(32)
+    entry: Dict[str, Any] = {
+        "tenant": tenant,
+        "sha256": token_digest(token).hex(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+    if gpu_seconds_per_hour is not None:
+        entry["gpu_seconds_per_hour"] = gpu_seconds_per_hour
+    if burst_gpu_seconds is not None:
+        entry["burst_gpu_seconds"] = burst_gpu_seconds
+    data.setdefault("tokens", []).append(entry)
+    # Write then rename, so the service never reads a half-written file.
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.chmod(tmp_path, 0o600)
+    os.replace(tmp_path, path)
+    return token
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage the auth token registry")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="Create a token and print it once")
+    add.add_argument("path")
+    add.add_argument("--tenant", required=True)
+    add.add_argument("--gpu-seconds-per-hour", type=float)
+    add.add_argument("--burst-gpu-seconds", type=float)
+    args = parser.parse_args()
+    token = add_token(
+        args.path, args.tenant, args.gpu_seconds_per_hour, args.burst_gpu_seconds
+    )
+    print(token)
+
+
+if __name__ == "__main__":
+    main()
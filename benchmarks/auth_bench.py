@@ -0,0 +1,141 @@
+"""Per-request overhead of token checking in the auth service.
+
+Times the work ``/auth/validate`` does for one request, without HTTP: the
+legacy comparison against a single ``VALID_TOKEN`` and the token registry
+lookup plus quota check, for registries of increasing size. Every registry
+tenant has a GPU time quota, so the quota path is always taken. Half of the
+presented tokens are unknown, as in a credential-stuffing burst.
+
+Usage:
+    python auth_bench.py
+    python auth_bench.py --sizes 1 1000 100000 --requests 200000
+"""
+
+import argparse
+import json
+import logging
+import secrets
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "auth"))
+
+from token_registry import TokenRegistry, token_digest
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def write_registry(path: Path, size: int) -> List[str]:
+    """A registry of ``size`` tokens, one tenant per 10 tokens; returns them."""
+    tokens = [secrets.token_urlsafe(32) for _ in range(size)]
+    entries = [
+        {
+            "tenant": f"tenant-{i // 10}",
+            "sha256": token_digest(token).hex(),
+            "gpu_seconds_per_hour": 3600,
+        }
+        for i, token in enumerate(tokens)
+    ]
+    path.write_text(json.dumps({"tokens": entries}))
+    return tokens
+
+
+def time_calls(
+    check: Callable[[str], Optional[str]], headers: List[str]
+) -> Dict[str, float]:
+    """Latency percentiles in microseconds of ``check`` over ``headers``."""
+    samples = []
+    for header in headers:
+        start = time.perf_counter_ns()
+        check(header)
+        samples.append(time.perf_counter_ns() - start)
+    samples.sort()
+    return {
+        "p50_us": samples[len(samples) // 2] / 1000,
+        "p99_us": samples[int(len(samples) * 0.99)] / 1000,
+        "max_us": samples[-1] / 1000,
+        "mean_us": statistics.fmean(samples) / 1000,
+    }
+
+
+def legacy_check(valid_token: str) -> Callable[[str], Optional[str]]:
+    def check(authorization: str) -> Optional[str]:
+        scheme, token = authorization.split()
+        if scheme.lower() != "bearer" or token != valid_token:
+            return None
+        return "authenticated"
+
+    return check
+
+
+def registry_check(registry: TokenRegistry) -> Callable[[str], Optional[str]]:
+    def check(authorization: str) -> Optional[str]:
+        scheme, token = authorization.split()
+        if scheme.lower() != "bearer":
+            return None
+        entry = registry.authenticate(token)
+        if entry is None or registry.quota_retry_after(entry.tenant) is not None:
+            return None
+        return entry.tenant
+
+    return check
+
+
+def make_headers(tokens: List[str], requests: int) -> List[str]:
+    """Bearer headers cycling through ``tokens``, every other one unknown."""
+    return [
+        "Bearer "
+        + (tokens[i // 2 % len(tokens)] if i % 2 == 0 else secrets.token_urlsafe(32))
+        for i in range(requests)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 1000, 100000])
+    parser.add_argument("--requests", type=int, default=100000)
+    parser.add_argument("--output", type=Path, help="Write results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    valid_token = secrets.token_urlsafe(32)
+    headers = make_headers([valid_token], args.requests)
+    timings = time_calls(legacy_check(valid_token), headers)
+    results.append({"check": "legacy", "tokens": 1, **timings})
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            path = Path(tmp) / f"tokens-{size}.json"
+            tokens = write_registry(path, size)
+            load_start = time.perf_counter()
+            registry = TokenRegistry(str(path))
+            load_s = time.perf_counter() - load_start
+            headers = make_headers(tokens, args.requests)
+            timings = time_calls(registry_check(registry), headers)
+            results.append(
+                {
+                    "check": "registry",
+                    "tokens": size,
+                    "load_s": round(load_s, 3),
+                    **timings,
+                }
+            )
+
+    print(f"{'check':<10} {'tokens':>8} {'p50 us':>8} {'p99 us':>8} {'max us':>9}")
+    for r in results:
+        print(
+            f"{r['check']:<10} {r['tokens']:>8} {r['p50_us']:>8.2f} "
+            f"{r['p99_us']:>8.2f} {r['max_us']:>9.1f}"
+        )
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(results, indent=2))
+        logger.info(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
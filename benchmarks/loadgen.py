@@ -0,0 +1,357 @@
+"""Open-loop load generator for the Stable Diffusion service.
+
+Requests are sent on a precomputed arrival schedule (Poisson, or a ramp of
+Poisson steps), whether or not earlier requests have finished, so queueing
+delay shows up in the latencies instead of being hidden by a closed loop.
+Each request is drawn from a weighted workload mix of models, sizes, steps
+and prompt corpora.
+
+Usage:
+    python loadgen.py --workload workloads/default.json --rate 1 --duration 60
+    python loadgen.py --ramp 0.5:60,1:60,2:60 --output results/ramp.json
+    python loadgen.py --rate 1 --duration 60 --baseline results/baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import aiohttp
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+COMPARED_METRICS = ("p50_s", "p90_s", "p99_s", "goodput_rps", "error_rate")
+# For these a higher value is better; for the rest lower is better.
+HIGHER_IS_BETTER = {"goodput_rps"}
+
+
+@dataclass
+class RequestSpec:
+    """One request of the workload, and where it came from in the mix."""
+
+    mix: str
+    body: Dict[str, Any]
+
+
+@dataclass
+class RequestResult:
+    mix: str
+    step: int
+    scheduled_at: float
+    latency_s: Optional[float]
+    status: Optional[int]
+    error: Optional[str] = None
+    response_bytes: int = 0
+    cache: Optional[str] = None
+    estimated_wait_s: Optional[float] = None
+
+
+@dataclass
+class Workload:
+    """Weighted mix of request templates plus prompt corpora.
+
+    ``prompts`` maps corpus names to files (relative to the workload file)
+    with one prompt per line. ``unique_prompts`` appends a counter so no
+    two prompts repeat, defeating the prompt-embedding cache; ``seed_pool``
+    draws seeds from a small pool so repeated requests hit the result cache.
+    """
+
+    mix: List[Dict[str, Any]]
+    prompts: Dict[str, List[str]]
+    sla_s: float = 10.0
+    unique_prompts: bool = False
+    seed_pool: Optional[int] = None
+    counter: int = field(default=0, repr=False)
+
+    @classmethod
+    def load(cls, path: Path) -> "Workload":
+        config = json.loads(path.read_text())
+        prompts = {
+            name: [
+                line.strip()
+                for line in (path.parent / file).read_text().splitlines()
+                if line.strip() and not line.startswith("#")
+            ]
+            for name, file in config["prompts"].items()
+        }
+        return cls(
+            mix=config["mix"],
+            prompts=prompts,
+            sla_s=config.get("sla_s", 10.0),
+            unique_prompts=config.get("unique_prompts", False),
+            seed_pool=config.get("seed_pool"),
+        )
+
+    def sample(self, rng: random.Random) -> RequestSpec:
+        entry = rng.choices(self.mix, weights=[e.get("weight", 1) for e in self.mix])[0]
+        corpus = entry.get("prompts", next(iter(self.prompts)))
+        prompt = rng.choice(self.prompts[corpus])
+        if self.unique_prompts:
+            self.counter += 1
+            prompt = f"{prompt}, variation {self.counter}"
+        body = {"prompt": prompt}
+        for key in ("model", "img_size", "num_inference_steps", "guidance_scale"):
+            if key in entry:
+                value = entry[key]
+                body[key] = rng.choice(value) if isinstance(value, list) else value
+        if "output_format" in entry:
+            body["output_format"] = entry["output_format"]
+        if self.seed_pool:
+            body["seed"] = rng.randrange(self.seed_pool)
+        name = entry.get("name") or "/".join(
+            str(body.get(k, "default"))
+            for k in ("model", "img_size", "num_inference_steps")
+        )
+        return RequestSpec(mix=name, body=body)
+
+
+def parse_ramp(ramp: str) -> List[Tuple[float, float]]:
+    """Parse ``rate:seconds,rate:seconds,...`` into ramp steps."""
+    steps = []
+    for part in ramp.split(","):
+        rate, seconds = part.split(":")
+        steps.append((float(rate), float(seconds)))
+    return steps
+
+
+def poisson_schedule(
+    steps: Sequence[Tuple[float, float]], rng: random.Random
+) -> List[Tuple[float, int]]:
+    """Arrival offsets (seconds from start) and the ramp step of each."""
+    arrivals = []
+    step_start = 0.0
+    for index, (rate, seconds) in enumerate(steps):
+        t = step_start
+        if rate > 0:
+            while True:
+                t += rng.expovariate(rate)
+                if t >= step_start + seconds:
+                    break
+                arrivals.append((t, index))
+        step_start += seconds
+    return arrivals
+
+
+def percentile(values: Sequence[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile, ``q`` in [0, 100]."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = math.ceil(q / 100 * len(ordered)) - 1
+    return ordered[max(0, min(len(ordered) - 1, rank))]
+
+
+def summarize(
+    results: Sequence[RequestResult], duration_s: float, sla_s: float
+) -> Dict[str, Any]:
+    """Latency percentiles, goodput and status breakdown of a set of results."""
+    ok = [r.latency_s for r in results if r.status == 200 and r.latency_s is not None]
+    good = [latency for latency in ok if latency <= sla_s]
+    statuses: Dict[str, int] = {}
+    for r in results:
+        key = str(r.status) if r.status is not None else (r.error or "error")
+        statuses[key] = statuses.get(key, 0) + 1
+    sent = len(results)
+    cache_hits = sum(1 for r in results if r.cache == "HIT")
+
+    def rounded(value: Optional[float]) -> Optional[float]:
+        return None if value is None else round(value, 4)
+
+    return {
+        "sent": sent,
+        "succeeded": len(ok),
+        "within_sla": len(good),
+        "offered_rps": round(sent / duration_s, 4) if duration_s else 0.0,
+        "throughput_rps": round(len(ok) / duration_s, 4) if duration_s else 0.0,
+        "goodput_rps": round(len(good) / duration_s, 4) if duration_s else 0.0,
+        "p50_s": rounded(percentile(ok, 50)),
+        "p90_s": rounded(percentile(ok, 90)),
+        "p99_s": rounded(percentile(ok, 99)),
+        "mean_s": rounded(sum(ok) / len(ok)) if ok else None,
+        "max_s": rounded(max(ok)) if ok else None,
+        "error_rate": round(1 - len(ok) / sent, 4) if sent else 0.0,
+        "rejected_429": statuses.get("429", 0),
+        "statuses": statuses,
+        "cache_hit_rate": round(cache_hits / len(ok), 4) if ok else 0.0,
+    }
+
+
+def build_report(
+    results: List[RequestResult],
+    steps: Sequence[Tuple[float, float]],
+    workload: Workload,
+    args: argparse.Namespace,
+) -> Dict[str, Any]:
+    total_s = sum(seconds for _, seconds in steps)
+    report = {
+        "created_at": time.time(),
+        "url": args.url,
+        "workload": str(args.workload),
+        "sla_s": workload.sla_s,
+        "steps": [{"rate": rate, "duration_s": s} for rate, s in steps],
+        "overall": summarize(results, total_s, workload.sla_s),
+        "by_step": [
+            summarize([r for r in results if r.step == i], s, workload.sla_s)
+            for i, (_, s) in enumerate(steps)
+        ],
+        "by_mix": {
+            mix: summarize([r for r in results if r.mix == mix], total_s, workload.sla_s)
+            for mix in sorted({r.mix for r in results})
+        },
+    }
+    if args.raw:
+        report["requests"] = [asdict(r) for r in results]
+    return report
+
+
+def compare(
+    report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float
+) -> List[str]:
+    """Describe every overall metric that regressed by more than ``tolerance``."""
+    regressions = []
+    for metric in COMPARED_METRICS:
+        current = report["overall"].get(metric)
+        previous = baseline["overall"].get(metric)
+        if current is None or previous is None:
+            continue
+        if metric in HIGHER_IS_BETTER:
+            worse = current < previous * (1 - tolerance)
+        elif metric == "error_rate":
+            worse = current > previous + tolerance
+        else:
+            worse = current > previous * (1 + tolerance)
+        change = (current - previous) / previous * 100 if previous else 0.0
+        line = f"{metric}: {previous} -> {current} ({change:+.1f}%)"
+        logger.info(("REGRESSION " if worse else "") + line)
+        if worse:
+            regressions.append(line)
+    return regressions
+
+
+async def send(
+    session: aiohttp.ClientSession,
+    url: str,
+    spec: RequestSpec,
+    step: int,
+    scheduled_at: float,
+    timeout_s: float,
+) -> RequestResult:
+    result = RequestResult(spec.mix, step, scheduled_at, None, None)
+    start = time.perf_counter()
+    try:
+        async with session.post(
+            url, json=spec.body, timeout=aiohttp.ClientTimeout(total=timeout_s)
+        ) as response:
+            content = await response.read()
+            result.status = response.status
+            result.response_bytes = len(content)
+            result.cache = response.headers.get("X-Cache")
+            if "X-Estimated-Wait" in response.headers:
+                result.estimated_wait_s = float(response.headers["X-Estimated-Wait"])
+    except asyncio.TimeoutError:
+        result.error = "timeout"
+    except aiohttp.ClientError as e:
+        result.error = type(e).__name__
+    result.latency_s = time.perf_counter() - start
+    return result
+
+
+async def run(
+    args: argparse.Namespace,
+    workload: Workload,
+    steps: Sequence[Tuple[float, float]],
+) -> List[RequestResult]:
+    rng = random.Random(args.seed)
+    schedule = poisson_schedule(steps, rng)
+    specs = [workload.sample(rng) for _ in schedule]
+    logger.info(
+        f"Sending {len(schedule)} requests over "
+        f"{sum(s for _, s in steps):.0f}s to {args.url}"
+    )
+    headers = {"Authorization": f"Bearer {args.token}"} if args.token else {}
+    if args.priority:
+        for spec in specs:
+            spec.body["priority"] = args.priority
+    connector = aiohttp.TCPConnector(limit=args.max_in_flight)
+    url = f"{args.url.rstrip('/')}/generate"
+    async with aiohttp.ClientSession(headers=headers, connector=connector) as session:
+        origin = time.perf_counter()
+        tasks = []
+        for (offset, step), spec in zip(schedule, specs):
+            delay = origin + offset - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(
+                asyncio.create_task(
+                    send(session, url, spec, step, offset, args.timeout)
+                )
+            )
+        return list(await asyncio.gather(*tasks))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--url", default=os.environ.get("SD_URL", "http://localhost:9000/imagine")
+    )
+    parser.add_argument("--token", default=os.environ.get("VALID_TOKEN"))
+    parser.add_argument(
+        "--workload", type=Path, default=BENCHMARK_DIR / "workloads" / "default.json"
+    )
+    parser.add_argument("--rate", type=float, default=1.0, help="Requests per second")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds")
+    parser.add_argument(
+        "--ramp", help="Step ramp as rate:seconds,... (overrides --rate/--duration)"
+    )
+    parser.add_argument("--sla", type=float, help="Override the workload's SLA (s)")
+    parser.add_argument("--priority", choices=["interactive", "batch"])
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--max-in-flight", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="Write the JSON report here")
+    parser.add_argument("--raw", action="store_true", help="Include every request")
+    parser.add_argument("--baseline", type=Path, help="Compare against a report")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.1, help="Allowed regression fraction"
+    )
+    args = parser.parse_args()
+
+    workload = Workload.load(args.workload)
+    if args.sla is not None:
+        workload.sla_s = args.sla
+    steps = parse_ramp(args.ramp) if args.ramp else [(args.rate, args.duration)]
+    results = asyncio.run(run(args, workload, steps))
+    report = build_report(results, steps, workload, args)
+
+    print(json.dumps(report["overall"], indent=2))
+    if len(steps) > 1:
+        for (rate, _), summary in zip(steps, report["by_step"]):
+            print(
+                f"rate {rate:>6.2f}/s  p50 {summary['p50_s']}  p99 {summary['p99_s']}  "
+                f"goodput {summary['goodput_rps']}/s  429s {summary['rejected_429']}"
+            )
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(report, indent=2))
+        logger.info(f"Wrote report to {args.output}")
+    if args.baseline:
+        regressions = compare(report, json.loads(args.baseline.read_text()), args.tolerance)
+        if regressions:
+            logger.error(f"{len(regressions)} metric(s) regressed beyond tolerance")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
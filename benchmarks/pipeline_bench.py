@@ -0,0 +1,401 @@
+"""Offline micro-benchmarks of the sd.py model classes on CPU.
+
+Every model class is built around a tiny, randomly initialized pipeline of
+the same architecture (UNet or Flux transformer, VAE, CLIP/T5 text
+encoders), so the service's generation code runs end to end without
+checkpoints, network access or a GPU. Timings are absolute numbers for the
+tiny models only; their use is spotting regressions in sd.py, such as
+optimizer, attention or callback changes, by comparing runs on the same
+machine against a saved baseline.
+
+Usage:
+    python pipeline_bench.py --output results/pipeline.json
+    python pipeline_bench.py --models sdxl flux --batch-sizes 1 4 --sizes 64 128
+    python pipeline_bench.py --baseline results/pipeline.json --tolerance 0.15
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Tiny pipelines are never worth snapshotting.
+os.environ.setdefault("PIPELINE_SNAPSHOT_ENABLED", "0")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import torch
+from diffusers import (
+    AutoencoderKL,
+    EulerDiscreteScheduler,
+    FlowMatchEulerDiscreteScheduler,
+    FluxPipeline,
+    FluxTransformer2DModel,
+    StableDiffusionPipeline,
+    StableDiffusionXLPipeline,
+    UNet2DConditionModel,
+)
+from tokenizers import Tokenizer, models, pre_tokenizers, processors
+from transformers import (
+    CLIPTextConfig,
+    CLIPTextModel,
+    CLIPTextModelWithProjection,
+    PreTrainedTokenizerFast,
+    T5Config,
+    T5EncoderModel,
+)
+
+from sd import (
+    FluxModel,
+    InferenceTimings,
+    SDXLLightningModel,
+    SDXLTurboModel,
+    StableDiffusion2Model,
+    StableDiffusionXLModel,
+)
+from utils.image_encoding import OutputOptions, encode_image
+from utils.memory_policy import MEMORY_MODES
+from utils.pipeline_snapshot import StartupTimer
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TOKENIZER_WORDS = "a an the of in on at with and photo painting portrait city cat dog".split()
+COMPARED_STAGES = ("text_encode_s", "step_s", "decode_s", "png_encode_s", "total_s")
+
+
+def tiny_tokenizer(max_length: int, bos: bool = True) -> PreTrainedTokenizerFast:
+    """Word-level tokenizer built in memory; unknown words map to <unk>.
+
+    Prompts are padded to ``max_length`` like the real tokenizers, so
+    sequence lengths, and therefore encoder cost, match the service.
+    """
+    specials = ["<|startoftext|>", "<pad>", "<|endoftext|>", "<unk>"]
+    vocab = {token: i for i, token in enumerate(specials + TOKENIZER_WORDS)}
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="<unk>"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    template = "<|startoftext|> $A <|endoftext|>" if bos else "$A <|endoftext|>"
+    tokenizer.post_processor = processors.TemplateProcessing(
+        single=template,
+        special_tokens=[("<|startoftext|>", 0), ("<|endoftext|>", 2)],
+    )
+    return PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer,
+        model_max_length=max_length,
+        bos_token="<|startoftext|>" if bos else None,
+        eos_token="<|endoftext|>",
+        pad_token="<pad>",
+        unk_token="<unk>",
+    )
+
+
+def tiny_clip_config() -> CLIPTextConfig:
+    return CLIPTextConfig(
+        bos_token_id=0,
+        eos_token_id=2,
+        pad_token_id=1,
+        hidden_size=32,
+        intermediate_size=37,
+        num_attention_heads=4,
+        num_hidden_layers=5,
+        vocab_size=1000,
+        projection_dim=32,
+        hidden_act="gelu",
+    )
+
+
+def tiny_unet(cross_attention_dim: int, sdxl: bool) -> UNet2DConditionModel:
+    extra = {}
+    if sdxl:
+        # 6 time ids x 8 + the 32-dim pooled projection of text_encoder_2.
+        extra = dict(
+            addition_embed_type="text_time",
+            addition_time_embed_dim=8,
+            projection_class_embeddings_input_dim=80,
+            transformer_layers_per_block=(1, 2),
+        )
+    return UNet2DConditionModel(
+        block_out_channels=(32, 64),
+        layers_per_block=2,
+        sample_size=32,
+        in_channels=4,
+        out_channels=4,
+        down_block_types=("DownBlock2D", "CrossAttnDownBlock2D"),
+        up_block_types=("CrossAttnUpBlock2D", "UpBlock2D"),
+        cross_attention_dim=cross_attention_dim,
+        attention_head_dim=(2, 4),
+        use_linear_projection=True,
+        norm_num_groups=8,
+        **extra,
+    )
+
+
+def tiny_vae() -> AutoencoderKL:
+    return AutoencoderKL(
+        block_out_channels=(32, 64),
+        in_channels=3,
+        out_channels=3,
+        down_block_types=("DownEncoderBlock2D", "DownEncoderBlock2D"),
+        up_block_types=("UpDecoderBlock2D", "UpDecoderBlock2D"),
+        latent_channels=4,
+        norm_num_groups=8,
+        sample_size=128,
+    )
+
+
+def tiny_sd2_pipeline() -> StableDiffusionPipeline:
+    return StableDiffusionPipeline(
+        vae=tiny_vae(),
+        text_encoder=CLIPTextModel(tiny_clip_config()),
+        tokenizer=tiny_tokenizer(77),
+        unet=tiny_unet(cross_attention_dim=32, sdxl=False),
+        scheduler=EulerDiscreteScheduler(
+            beta_start=0.00085, beta_end=0.012, beta_schedule="scaled_linear"
+        ),
+        safety_checker=None,
+        feature_extractor=None,
+        requires_safety_checker=False,
+    )
+
+
+def tiny_sdxl_pipeline(timestep_spacing: str = "leading") -> StableDiffusionXLPipeline:
+    return StableDiffusionXLPipeline(
+        vae=tiny_vae(),
+        text_encoder=CLIPTextModel(tiny_clip_config()),
+        text_encoder_2=CLIPTextModelWithProjection(tiny_clip_config()),
+        tokenizer=tiny_tokenizer(77),
+        tokenizer_2=tiny_tokenizer(77),
+        # Both encoders' 32-dim hidden states are concatenated.
+        unet=tiny_unet(cross_attention_dim=64, sdxl=True),
+        scheduler=EulerDiscreteScheduler(
+            beta_start=0.00085,
+            beta_end=0.012,
+            beta_schedule="scaled_linear",
+            steps_offset=1,
+            timestep_spacing=timestep_spacing,
+        ),
+    )
+
+
+def tiny_flux_pipeline() -> FluxPipeline:
+    return FluxPipeline(
+        transformer=FluxTransformer2DModel(
+            patch_size=1,
+            in_channels=4,
+            num_layers=1,
+            num_single_layers=1,
+            attention_head_dim=16,
+            num_attention_heads=2,
+            joint_attention_dim=32,
+            pooled_projection_dim=32,
+            axes_dims_rope=[4, 4, 8],
+        ),
+        vae=AutoencoderKL(
+            block_out_channels=(4,),
+            in_channels=3,
+            out_channels=3,
+            layers_per_block=1,
+            latent_channels=1,
+            norm_num_groups=1,
+            sample_size=32,
+            use_quant_conv=False,
+            use_post_quant_conv=False,
+            shift_factor=0.0609,
+            scaling_factor=1.5035,
+        ),
+        text_encoder=CLIPTextModel(tiny_clip_config()),
+        tokenizer=tiny_tokenizer(77),
+        text_encoder_2=T5EncoderModel(
+            T5Config(
+                vocab_size=1000, d_model=32, d_kv=8, d_ff=37, num_layers=2, num_heads=4
+            )
+        ),
+        tokenizer_2=tiny_tokenizer(512, bos=False),
+        scheduler=FlowMatchEulerDiscreteScheduler(),
+    )
+
+
+# Model name -> (service class, tiny pipeline builder, default steps)
+MODELS: Dict[str, Any] = {
+    "sd2": (StableDiffusion2Model, tiny_sd2_pipeline, 10),
+    "sdxl": (StableDiffusionXLModel, tiny_sdxl_pipeline, 10),
+    "sdxl-turbo": (SDXLTurboModel, tiny_sdxl_pipeline, 1),
+    "sdxl-lightning": (
+        SDXLLightningModel,
+        lambda: tiny_sdxl_pipeline(timestep_spacing="trailing"),
+        4,
+    ),
+    "flux": (FluxModel, tiny_flux_pipeline, 4),
+}
+
+
+def build_model(
+    name: str, dtype: torch.dtype, optimize: bool, memory_mode: Optional[str]
+):
+    """Instantiate the service's model class around a tiny pipeline."""
+    model_cls, build_pipeline, _ = MODELS[name]
+
+    class TinyModel(model_cls):
+        def _initialize_model(self):
+            self.startup = StartupTimer()
+            torch.manual_seed(0)
+            with self.startup.phase("deserialize"):
+                pipe = build_pipeline().to(dtype=self.dtype)
+            with self.startup.phase("device_transfer"):
+                self.pipe = pipe.to(self.device)
+            if optimize:
+                with self.startup.phase("optimize"):
+                    self._optimize_pipeline()
+            if memory_mode is not None:
+                self.set_memory_mode(memory_mode)
+
+    return TinyModel(device="cpu", dtype=dtype)
+
+
+def time_case(
+    model,
+    batch_size: int,
+    size: int,
+    steps: int,
+    repeats: int,
+    warmup: int,
+) -> Dict[str, Any]:
+    """Median time of each stage over ``repeats`` runs after ``warmup`` runs."""
+    samples: Dict[str, List[float]] = {stage: [] for stage in COMPARED_STAGES}
+    png = OutputOptions("png", 90, 6)
+    for run in range(warmup + repeats):
+        # Fresh prompts every run so the prompt embedding cache never hits.
+        prompts = [f"a photo of a city {run} {i}" for i in range(batch_size)]
+        timings = InferenceTimings(sync=False)
+        start = time.perf_counter()
+        images = model.generate_batch(
+            prompts,
+            size,
+            size,
+            seeds=list(range(batch_size)),
+            timings=timings,
+            num_inference_steps=steps,
+        )
+        png_s = sum(encode_image(image, png)[1] for image in images) / len(images)
+        total_s = time.perf_counter() - start
+        if run < warmup:
+            continue
+        samples["text_encode_s"].append(timings.text_encode_s)
+        samples["step_s"].append(statistics.median(timings.step_s))
+        samples["decode_s"].append(timings.decode_s)
+        samples["png_encode_s"].append(png_s)
+        samples["total_s"].append(total_s)
+    return {stage: round(statistics.median(v), 6) for stage, v in samples.items()}
+
+
+def compare(
+    results: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    tolerance: float,
+    min_delta_s: float,
+) -> List[str]:
+    """Stages that got slower than the baseline by more than ``tolerance``.
+
+    Differences under ``min_delta_s`` are ignored, since sub-millisecond
+    stages are dominated by timer noise.
+    """
+    regressions = []
+    for case, stages in results.items():
+        previous = baseline.get(case)
+        if previous is None:
+            continue
+        for stage in COMPARED_STAGES:
+            before, after = previous.get(stage), stages.get(stage)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            if change > tolerance and after - before > min_delta_s:
+                regressions.append(
+                    f"{case} {stage}: {before * 1000:.2f}ms -> "
+                    f"{after * 1000:.2f}ms ({change * 100:+.1f}%)"
+                )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--models", nargs="+", default=list(MODELS), choices=list(MODELS))
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 4])
+    parser.add_argument("--sizes", nargs="+", type=int, default=[64, 128])
+    parser.add_argument("--steps", type=int, help="Override each model's step count")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--dtype", choices=["float32", "bfloat16"], default="float32")
+    parser.add_argument(
+        "--no-optimize",
+        action="store_true",
+        help="Skip each model's _optimize_pipeline (IPEX)",
+    )
+    parser.add_argument(
+        "--memory-mode",
+        choices=MEMORY_MODES,
+        help="Attention/VAE memory mode (default: what _optimize_pipeline sets)",
+    )
+    parser.add_argument("--threads", type=int, help="torch intra-op threads")
+    parser.add_argument("--output", type=Path, help="Write results as JSON")
+    parser.add_argument("--baseline", type=Path, help="Compare against saved results")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    parser.add_argument("--min-delta-ms", type=float, default=1.0)
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    dtype = getattr(torch, args.dtype)
+    results: Dict[str, Dict[str, Any]] = {}
+    for name in args.models:
+        model = build_model(name, dtype, not args.no_optimize, args.memory_mode)
+        steps = args.steps or MODELS[name][2]
+        for batch_size in args.batch_sizes:
+            for size in args.sizes:
+                case = f"{name}/b{batch_size}/{size}px/{steps}steps"
+                results[case] = time_case(
+                    model, batch_size, size, steps, args.repeats, args.warmup
+                )
+                logger.info(
+                    f"{case}: "
+                    + "  ".join(
+                        f"{stage} {seconds * 1000:.2f}ms"
+                        for stage, seconds in results[case].items()
+                    )
+                )
+        del model
+
+    report = {
+        "created_at": time.time(),
+        "torch": torch.__version__,
+        "threads": torch.get_num_threads(),
+        "dtype": args.dtype,
+        "optimized": not args.no_optimize,
+        "memory_mode": args.memory_mode,
+        "results": results,
+    }
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(report, indent=2))
+        logger.info(f"Wrote results to {args.output}")
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        if baseline.get("threads") != report["threads"]:
+            logger.warning("Baseline was recorded with a different thread count")
+        regressions = compare(
+            results, baseline["results"], args.tolerance, args.min_delta_ms / 1000
+        )
+        for line in regressions:
+            logger.error(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        logger.info("No regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,23 +1,28 @@
 #!/bin/bash
+# Ramp the offered load in steps and report latency, goodput and errors per step.
+
+cd "$(dirname "$0")/.." || exit 1
+
+RAMP=${RAMP:-0.25:60,0.5:60,1:60,1.5:60,2:60,3:60}
+WORKLOAD=${WORKLOAD:-workloads/default.json}
+OUTPUT=${OUTPUT:-results/stress_$(date +%Y%m%d_%H%M%S).json}
 
-echo "Starting stress test..."
 check_health() {
     curl -s -H "Authorization: Bearer $VALID_TOKEN" http://localhost:9000/imagine/health >/dev/null
     return $?
 }
 
-for connections in 4 8 16 32 64; do
-    threads=$((connections / 4))
-    if [ $threads -lt 1 ]; then
-        threads=1
-    fi
-    echo "Testing with $connections connections and $threads threads..."
-    echo "date"
-    wrk -t$threads -c$connections -d30s -s $(dirname $0)/test.lua http://localhost:9000/imagine/generate
-    if ! check_health; then
-        echo "Service became unresponsive at $connections connections!"
-        break
-    fi
-    echo "Waiting 10s before next test..."
-    sleep 10
-done
+if ! check_health; then
+    echo "Service is not responding, start it with ./deploy.sh first"
+    exit 1
+fi
+
+echo "Starting stress test (ramp $RAMP)..."
+python loadgen.py --workload "$WORKLOAD" --ramp "$RAMP" --output "$OUTPUT" "$@"
+status=$?
+
+if ! check_health; then
+    echo "Service became unresponsive during the test!"
+    exit 1
+fi
+exit $status
@@ -0,0 +1,349 @@
+"""Asynchronous client for bulk generation against the Stable Diffusion service.
+
+Prompts are read from a JSONL file, one request body per line, and sent
+over a pool of keep-alive connections with bounded concurrency. Failed
+requests are retried with jittered exponential backoff, waiting as long as
+the server's ``Retry-After`` asks on 429 and 503. Images are streamed
+straight to disk, and every finished prompt is appended to a manifest, so an
+interrupted run picks up where it stopped when started again.
+
+Usage:
+    python async_client.py prompts.jsonl --output-dir bulk_out --concurrency 8
+
+Each input line is a ``/generate`` body with an optional ``id``:
+    {"id": "cat-1", "prompt": "a cat in a hat", "img_size": 768, "seed": 7}
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+from dataclasses import asdict, dataclass
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+import aiohttp
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+EXTENSIONS = {
+    "image/png": "png",
+    "image/jpeg": "jpg",
+    "image/webp": "webp",
+    "application/octet-stream": "raw",
+    "application/zip": "zip",
+}
+CHUNK_SIZE = 64 * 1024
+
+
+@dataclass
+class BulkResult:
+    """Outcome of one prompt, as recorded in the manifest."""
+
+    id: str
+    status: str
+    path: Optional[str] = None
+    seed: Optional[str] = None
+    bytes: int = 0
+    attempts: int = 0
+    elapsed_s: float = 0.0
+    error: Optional[str] = None
+    finished_at: float = 0.0
+
+
+class RetryableError(Exception):
+    """A failure worth retrying, with the delay the server asked for, if any."""
+
+    def __init__(self, message: str, retry_after_s: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after_s = retry_after_s
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds from a ``Retry-After`` header, in delta-seconds or HTTP-date form."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(
+    attempt: int,
+    base_s: float,
+    max_s: float,
+    retry_after_s: Optional[float] = None,
+) -> float:
+    """Full-jitter exponential backoff, never sooner than ``Retry-After``.
+
+    Jitter spreads retries out so clients rejected together do not all come
+    back at the same moment.
+    """
+    if retry_after_s is not None:
+        return retry_after_s + random.uniform(0, base_s)
+    return random.uniform(0, min(max_s, base_s * 2**attempt))
+
+
+def read_prompts(path: Path) -> Iterator[Dict[str, Any]]:
+    """Request bodies from a JSONL file, each with an ``id``.
+
+    Lines without an ``id`` are numbered by their line in the file, so ids
+    stay stable between runs of the same file.
+    """
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            body = json.loads(line)
+            if "prompt" not in body:
+                raise ValueError(f"{path}:{line_number}: missing 'prompt'")
+            body["id"] = str(body.get("id", line_number))
+            yield body
+
+
+class Manifest:
+    """Append-only JSONL record of finished prompts in the output directory."""
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def completed(self) -> Set[str]:
+        """Ids that succeeded in an earlier run and whose file still exists."""
+        done: Set[str] = set()
+        if not self.path.exists():
+            return done
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # a line cut short by an interrupted run
+                succeeded = entry.get("status") == "succeeded"
+                if succeeded and Path(entry["path"]).exists():
+                    done.add(entry["id"])
+                elif entry.get("id") in done:
+                    done.discard(entry["id"])
+        return done
+
+    def append(self, result: BulkResult) -> None:
+        with open(self.path, "a") as f:
+            f.write(json.dumps(asdict(result)) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class AsyncStableDiffusionClient:
+    """Asynchronous counterpart of ``StableDiffusionClient`` for bulk runs.
+
+    One ``aiohttp`` session with a connection pool sized to ``concurrency``
+    is reused for every request, so connections stay open between images.
+    Use as an async context manager.
+    """
+
+    def __init__(
+        self,
+        base_url: str = "http://localhost:9000/imagine",
+        token: Optional[str] = None,
+        concurrency: int = 4,
+        timeout_s: float = 300.0,
+        max_retries: int = 5,
+        backoff_base_s: float = 1.0,
+        backoff_max_s: float = 60.0,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.token = token if token is not None else os.getenv("VALID_TOKEN")
+        self.concurrency = concurrency
+        self.timeout = aiohttp.ClientTimeout(total=timeout_s)
+        self.max_retries = max_retries
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self) -> "AsyncStableDiffusionClient":
+        headers = {"Authorization": f"Bearer {self.token}"} if self.token else {}
+        self._session = aiohttp.ClientSession(
+            headers=headers,
+            timeout=self.timeout,
+            connector=aiohttp.TCPConnector(
+                limit=self.concurrency, keepalive_timeout=60
+            ),
+        )
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self._session.close()
+
+    async def get_info(self) -> Dict[str, Any]:
+        """Get server information."""
+        async with self._session.get(f"{self.base_url}/info") as response:
+            response.raise_for_status()
+            return await response.json()
+
+    async def _download(self, body: Dict[str, Any], path: Path) -> Dict[str, Any]:
+        """Send one request and stream the image into ``path``.
+
+        The body is written to a temporary file that is renamed once
+        complete, so a file at ``path`` is never partial. Raises
+        ``RetryableError`` for failures worth retrying.
+        """
+        try:
+            async with self._session.post(
+                f"{self.base_url}/generate", json=body
+            ) as response:
+                if response.status in RETRYABLE_STATUSES:
+                    detail = (await response.text())[:200]
+                    raise RetryableError(
+                        f"HTTP {response.status}: {detail}",
+                        parse_retry_after(response.headers.get("Retry-After")),
+                    )
+                if response.status != 200:
+                    detail = (await response.text())[:200]
+                    raise ValueError(f"HTTP {response.status}: {detail}")
+                media_type = response.headers.get("Content-Type", "").split(";")[0]
+                path = path.parent / f"{path.name}.{EXTENSIONS.get(media_type, 'bin')}"
+                partial = path.parent / f"{path.name}.part"
+                size = 0
+                with open(partial, "wb") as f:
+                    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                        f.write(chunk)
+                        size += len(chunk)
+                partial.rename(path)
+                return {
+                    "path": str(path),
+                    "bytes": size,
+                    "seed": response.headers.get("X-Seeds")
+                    or response.headers.get("X-Seed"),
+                }
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise RetryableError(f"{type(e).__name__}: {e}")
+
+    async def generate_to_file(self, body: Dict[str, Any], path: Path) -> BulkResult:
+        """Generate one image into ``path`` (extension set from the response)."""
+        start = time.perf_counter()
+        request = {k: v for k, v in body.items() if k != "id"}
+        result = BulkResult(id=body["id"], status="failed")
+        for attempt in range(self.max_retries + 1):
+            result.attempts = attempt + 1
+            try:
+                saved = await self._download(request, path)
+                result.status = "succeeded"
+                result.path = saved["path"]
+                result.bytes = saved["bytes"]
+                result.seed = saved["seed"]
+                result.error = None
+                break
+            except RetryableError as e:
+                result.error = str(e)
+                if attempt == self.max_retries:
+                    break
+                delay = backoff_delay(
+                    attempt, self.backoff_base_s, self.backoff_max_s, e.retry_after_s
+                )
+                logger.info(f"{body['id']}: {e}; retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+            except ValueError as e:
+                result.error = str(e)
+                break
+        result.elapsed_s = round(time.perf_counter() - start, 3)
+        result.finished_at = time.time()
+        return result
+
+    async def run_bulk(
+        self, prompts_file: Path, output_dir: Path, resume: bool = True
+    ) -> List[BulkResult]:
+        """Generate every prompt in ``prompts_file`` into ``output_dir``.
+
+        At most ``concurrency`` requests are in flight. Prompts already in
+        the manifest as succeeded are skipped when ``resume`` is set.
+        """
+        output_dir.mkdir(parents=True, exist_ok=True)
+        manifest = Manifest(output_dir / "manifest.jsonl")
+        done = manifest.completed() if resume else set()
+        bodies = [b for b in read_prompts(prompts_file) if b["id"] not in done]
+        if done:
+            logger.info(f"Skipping {len(done)} prompts finished in an earlier run")
+        logger.info(f"Generating {len(bodies)} prompts, {self.concurrency} at a time")
+        queue: asyncio.Queue = asyncio.Queue()
+        for body in bodies:
+            queue.put_nowait(body)
+        results: List[BulkResult] = []
+        start = time.perf_counter()
+
+        async def worker() -> None:
+            while True:
+                try:
+                    body = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                safe_id = "".join(
+                    c if c.isalnum() or c in "._-" else "_" for c in body["id"]
+                )
+                result = await self.generate_to_file(body, output_dir / safe_id)
+                manifest.append(result)
+                results.append(result)
+                if result.status != "succeeded":
+                    logger.warning(f"{result.id} failed: {result.error}")
+                if len(results) % 50 == 0 or len(results) == len(bodies):
+                    elapsed = time.perf_counter() - start
+                    logger.info(
+                        f"{len(results)}/{len(bodies)} done "
+                        f"({len(results) / elapsed:.2f}/s)"
+                    )
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        return results
+
+
+async def _main(args: argparse.Namespace) -> int:
+    async with AsyncStableDiffusionClient(
+        args.url,
+        token=args.token,
+        concurrency=args.concurrency,
+        timeout_s=args.timeout,
+        max_retries=args.retries,
+    ) as client:
+        results = await client.run_bulk(
+            args.prompts, args.output_dir, resume=not args.no_resume
+        )
+    failed = [r for r in results if r.status != "succeeded"]
+    logger.info(
+        f"{len(results) - len(failed)} succeeded, {len(failed)} failed; "
+        f"manifest at {args.output_dir / 'manifest.jsonl'}"
+    )
+    return 1 if failed else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("prompts", type=Path, help="JSONL file of request bodies")
+    parser.add_argument("--output-dir", type=Path, default=Path("bulk_images"))
+    parser.add_argument(
+        "--url", default=os.environ.get("SD_URL", "http://localhost:9000/imagine")
+    )
+    parser.add_argument("--token", default=os.environ.get("VALID_TOKEN"))
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--retries", type=int, default=5)
+    parser.add_argument(
+        "--no-resume",
+        action="store_true",
+        help="Regenerate prompts the manifest lists as done",
+    )
+    return asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
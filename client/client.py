@@ -1,9 +1,11 @@
 import hashlib
+import io
 import logging
 import os
+import zipfile
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 
 import requests
 from requests.exceptions import RequestException
@@ -18,12 +20,12 @@ class StableDiffusionClient:
         self.output_dir = Path("generated_images")
         self.output_dir.mkdir(exist_ok=True)
 
-    def _create_filename(self, prompt: str) -> str:
+    def _create_filename(self, prompt: str, suffix: str = "") -> str:
         """Create a filename from prompt using first few words and hash."""
         words = " ".join(prompt.split()[:5])
         prompt_hash = hashlib.md5(prompt.encode()).hexdigest()[:8]
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{words}_{prompt_hash}_{timestamp}.png"
+        filename = f"{words}_{prompt_hash}_{timestamp}{suffix}.png"
         return "".join(c if c.isalnum() or c in "._- " else "_" for c in filename)
 
     def check_health(self) -> Dict[str, Any]:
@@ -83,6 +85,48 @@ class StableDiffusionClient:
             logger.error(f"Failed to generate image: {e}")
             raise
 
+    def generate_images(
+        self,
+        prompt: str,
+        num_images: int = 4,
+        img_size: int = 512,
+        guidance_scale: Optional[float] = None,
+        num_inference_steps: Optional[int] = None,
+        seed: Optional[int] = None,
+    ) -> List[str]:
+        """Generate several candidates for a prompt in a single request."""
+        if not prompt:
+            raise ValueError("Prompt cannot be empty")
+        try:
+            response = requests.post(
+                f"{self.base_url}/generate",
+                headers={"Authorization": f"Bearer {os.getenv('VALID_TOKEN')}"},
+                json={
+                    "prompt": prompt,
+                    "img_size": img_size,
+                    "guidance_scale": guidance_scale,
+                    "num_inference_steps": num_inference_steps,
+                    "seed": seed,
+                    "num_images": num_images,
+                },
+            )
+            response.raise_for_status()
+            if response.headers.get("Content-Type") != "application/zip":
+                contents = [response.content]
+            else:
+                with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+                    contents = [archive.read(name) for name in archive.namelist()]
+            paths = []
+            for i, content in enumerate(contents):
+                image_path = self.output_dir / self._create_filename(prompt, f"_{i}")
+                with open(image_path, "wb") as f:
+                    f.write(content)
+                paths.append(str(image_path))
+            return paths
+        except RequestException as e:
+            logger.error(f"Failed to generate images: {e}")
+            raise
+
 
 def main():
     client = StableDiffusionClient()
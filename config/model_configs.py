@@ -1,9 +1,13 @@
+from typing import List
+
 MODEL_CONFIGS = {
     "sd2": {
         "default_steps": 50,
         "default_guidance": 7.5,
         "min_img_size": 512,
         "max_img_size": 768,
+        "approx_memory_gb": 2.6,
+        "max_images": 4,
         "default": False,
     },
     "sdxl": {
@@ -11,6 +15,8 @@ MODEL_CONFIGS = {
         "default_guidance": 7.5,
         "min_img_size": 512,
         "max_img_size": 1024,
+        "approx_memory_gb": 6.9,
+        "max_images": 4,
         "default": False,
     },
     "flux": {
@@ -18,6 +24,8 @@ MODEL_CONFIGS = {
         "default_guidance": 0.0,
         "min_img_size": 256,
         "max_img_size": 1024,
+        "approx_memory_gb": 33.7,
+        "max_images": 2,
         "default": False,
     },
     "sdxl-turbo": {
@@ -25,6 +33,8 @@ MODEL_CONFIGS = {
         "default_guidance": 0.0,
         "min_img_size": 512,
         "max_img_size": 1024,
+        "approx_memory_gb": 6.9,
+        "max_images": 8,
         "default": False,
     },
     "sdxl-lightning": {
@@ -32,6 +42,36 @@ MODEL_CONFIGS = {
         "default_guidance": 0.0,
         "min_img_size": 512,
         "max_img_size": 1024,
+        "approx_memory_gb": 6.9,
+        "max_images": 4,
         "default": True,
     },
+    # Random weights; only for load and autoscaling tests on CPU-only hosts.
+    "sd-tiny": {
+        "default_steps": 2,
+        "default_guidance": 0.0,
+        "min_img_size": 64,
+        "max_img_size": 128,
+        "approx_memory_gb": 0.01,
+        "max_images": 4,
+        "default": False,
+        "test_only": True,
+    },
 }
+
+IMG_SIZE_BUCKET = 128
+
+
+def img_size_buckets(model_name: str) -> List[int]:
+    """Image sizes from the model's minimum to maximum in bucket-sized steps.
+
+    These are the only sizes requests may use, so warmup covers every shape
+    the model will see. The maximum is always included.
+    """
+    config = MODEL_CONFIGS[model_name]
+    sizes = list(
+        range(config["min_img_size"], config["max_img_size"] + 1, IMG_SIZE_BUCKET)
+    )
+    if sizes[-1] != config["max_img_size"]:
+        sizes.append(config["max_img_size"])
+    return sizes
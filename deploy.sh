@@ -104,6 +104,12 @@ else
     chmod 600 "$TOKEN_FILE"
     echo "Generated new token: $VALID_TOKEN"
 fi
+# Shared secret the SD service uses to report per-tenant GPU time to auth
+if [ -z "$USAGE_REPORT_TOKEN" ]; then
+    export USAGE_REPORT_TOKEN=$(openssl rand -hex 24)
+    echo "export USAGE_REPORT_TOKEN=$USAGE_REPORT_TOKEN" >>"$TOKEN_FILE"
+fi
+mkdir -p auth/registry
 
 # ------------------------------------------------------------------------------
 # Manage Docker Services
@@ -150,7 +156,7 @@ echo "You can monitor the status with: ./monitor_sd.sh"
 TIMEOUT=120
 START_TIME=$(date +%s)
 while true; do
-    if curl -s -H "Authorization: Bearer $VALID_TOKEN" http://localhost:9000/imagine/health >/dev/null; then
+    if curl -sf -H "Authorization: Bearer $VALID_TOKEN" http://localhost:9000/imagine/health/ready >/dev/null; then
         break
     fi
 
@@ -2,12 +2,23 @@ import warnings
 
 warnings.filterwarnings("ignore")  # supress ipex warnings
 
+import contextlib
+import importlib
+import itertools
+import json
 import logging
-from typing import Any, Dict
+import os
+import threading
+import time
+import weakref
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
 
-import intel_extension_for_pytorch as ipex
+import diffusers
 import torch
+import transformers
 from diffusers import (
+    AutoencoderKL,
     DiffusionPipeline,
     EulerDiscreteScheduler,
     FluxPipeline,
@@ -18,13 +29,28 @@ from diffusers import (
 from huggingface_hub import hf_hub_download
 from PIL import Image
 from safetensors.torch import load_file
+from transformers import CLIPTextModel, CLIPTextModelWithProjection, CLIPTokenizer
+
+from utils.lru import SizedLRUCache
+from utils.memory_policy import MEMORY_MODES, SAFE_MEMORY_MODE
+from utils.parallel_loader import ParallelLoader
+from utils.pipeline_snapshot import PipelineSnapshotStore, StartupTimer
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.WARNING)
 
+try:
+    import intel_extension_for_pytorch as ipex
+except ImportError:
+    # Only on machines without Intel GPUs, e.g. for benchmarks/pipeline_bench.py;
+    # models then run without IPEX optimizations.
+    ipex = None
+
 
 def optimize_unet(unet):
     """Optimize UNet with IPEX"""
+    if ipex is None:
+        return unet
     try:
         logger.info("Optimizing UNet with IPEX")
         unet = ipex.optimize(unet.eval(), dtype=unet.dtype)
@@ -37,23 +63,280 @@ def optimize_unet(unet):
         return unet
 
 
-def perform_inference(
-    pipe, prompt: str, height: int, width: int, **kwargs
-) -> Image.Image:
-    """Perform inference with optimized settings."""
+def make_generators(seeds: Optional[List[int]]) -> Optional[List[torch.Generator]]:
+    """Create one seeded CPU generator per image so results are reproducible."""
+    if seeds is None:
+        return None
+    return [torch.Generator("cpu").manual_seed(seed) for seed in seeds]
+
+
+Embeddings = Tuple[torch.Tensor, ...]
+StepCallback = Callable[[int, int, torch.Tensor], None]
+
+
+def _embeddings_nbytes(embeddings: Embeddings) -> int:
+    return sum(t.numel() * t.element_size() for t in embeddings)
+
+
+def _split_batch(tensors: Sequence[torch.Tensor], batch_size: int) -> List[Embeddings]:
+    """Split batched encoder outputs into independent per-prompt tensors."""
+    return [
+        tuple(t[i : i + 1].clone() for t in tensors) for i in range(batch_size)
+    ]
+
+
+class PromptEmbeddingCache:
+    """Bounded LRU of text-encoder outputs keyed by model and prompt.
+
+    Each entry holds the per-prompt tensors returned by a model's encoder.
+    Prompts missing from the cache are encoded together in one call.
+    """
+
+    NEGATIVE_PROMPT_KEY = "<negative>"
+
+    def __init__(self, max_bytes: int):
+        self._cache = SizedLRUCache(max_bytes, sizeof=_embeddings_nbytes)
+        self.prompts_encoded = 0
+        self.encode_time_s = 0.0
+
+    def encode(
+        self,
+        model_key: str,
+        prompts: List[str],
+        encode_fn: Callable[[List[str]], List[Embeddings]],
+    ) -> Embeddings:
+        """Return batched embeddings for ``prompts``, encoding only misses."""
+        found = {p: self._cache.get((model_key, p)) for p in dict.fromkeys(prompts)}
+        missing = [p for p, embeddings in found.items() if embeddings is None]
+        if missing:
+            start = time.perf_counter()
+            for prompt, embeddings in zip(missing, encode_fn(missing)):
+                self._cache.put((model_key, prompt), embeddings)
+                found[prompt] = embeddings
+            self.encode_time_s += time.perf_counter() - start
+            self.prompts_encoded += len(missing)
+        per_prompt = [found[p] for p in prompts]
+        return tuple(torch.cat(parts) for parts in zip(*per_prompt))
+
+    def negative(
+        self, model_key: str, encode_fn: Callable[[], Embeddings]
+    ) -> Embeddings:
+        """Return the precomputed empty/negative-prompt embeddings."""
+        key = (model_key, self.NEGATIVE_PROMPT_KEY)
+        embeddings = self._cache.get(key)
+        if embeddings is None:
+            embeddings = encode_fn()
+            self._cache.put(key, embeddings)
+        return embeddings
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self._cache.get_stats()
+        stats.update(
+            {
+                "prompts_encoded": self.prompts_encoded,
+                "encode_time_s": round(self.encode_time_s, 3),
+            }
+        )
+        return stats
+
+
+PROMPT_EMBEDDING_CACHE = PromptEmbeddingCache(
+    int(os.environ.get("PROMPT_EMBED_CACHE_MB", "256")) * 1024**2
+)
+
+
+def sdxl_prompt_encoder(
+    pipe, model_key: str, do_classifier_free_guidance: bool
+) -> Callable[[List[str]], Dict[str, torch.Tensor]]:
+    """Build a cached prompt encoder for SDXL-family pipelines."""
+
+    def encode(prompts: List[str]) -> List[Embeddings]:
+        prompt_embeds, _, pooled_prompt_embeds, _ = pipe.encode_prompt(
+            prompts,
+            device=pipe.device,
+            num_images_per_prompt=1,
+            do_classifier_free_guidance=False,
+        )
+        return _split_batch((prompt_embeds, pooled_prompt_embeds), len(prompts))
+
+    def encode_negative() -> Embeddings:
+        _, negative_embeds, _, negative_pooled_embeds = pipe.encode_prompt(
+            [""],
+            device=pipe.device,
+            num_images_per_prompt=1,
+            do_classifier_free_guidance=True,
+        )
+        return negative_embeds, negative_pooled_embeds
+
+    def encoder(prompts: List[str]) -> Dict[str, torch.Tensor]:
+        prompt_embeds, pooled_prompt_embeds = PROMPT_EMBEDDING_CACHE.encode(
+            model_key, prompts, encode
+        )
+        embeds = {
+            "prompt_embeds": prompt_embeds,
+            "pooled_prompt_embeds": pooled_prompt_embeds,
+        }
+        if do_classifier_free_guidance:
+            negative_embeds, negative_pooled_embeds = PROMPT_EMBEDDING_CACHE.negative(
+                model_key, encode_negative
+            )
+            embeds["negative_prompt_embeds"] = negative_embeds.repeat(
+                len(prompts), 1, 1
+            )
+            embeds["negative_pooled_prompt_embeds"] = negative_pooled_embeds.repeat(
+                len(prompts), 1
+            )
+        return embeds
+
+    return encoder
+
+
+def flux_prompt_encoder(
+    pipe, model_key: str, max_sequence_length: int
+) -> Callable[[List[str]], Dict[str, torch.Tensor]]:
+    """Build a cached prompt encoder for Flux pipelines."""
+    cache_key = f"{model_key}:{max_sequence_length}"
+
+    def encode(prompts: List[str]) -> List[Embeddings]:
+        prompt_embeds, pooled_prompt_embeds, _ = pipe.encode_prompt(
+            prompts,
+            prompt_2=None,
+            device=pipe.device,
+            num_images_per_prompt=1,
+            max_sequence_length=max_sequence_length,
+        )
+        return _split_batch((prompt_embeds, pooled_prompt_embeds), len(prompts))
+
+    def encoder(prompts: List[str]) -> Dict[str, torch.Tensor]:
+        prompt_embeds, pooled_prompt_embeds = PROMPT_EMBEDDING_CACHE.encode(
+            cache_key, prompts, encode
+        )
+        return {
+            "prompt_embeds": prompt_embeds,
+            "pooled_prompt_embeds": pooled_prompt_embeds,
+        }
+
+    return encoder
+
+
+class InferenceTimings:
+    """Wall time of each stage of one pipeline call.
+
+    Device work is asynchronous, so with ``sync`` set the device is
+    synchronized at each stage boundary to attribute time to the right
+    stage. That costs one launch-latency bubble per step, small next to a
+    denoising step; without it only the total is exact.
+    """
+
+    def __init__(self, sync: bool = True):
+        self.sync = sync
+        self.text_encode_s = 0.0
+        self.denoise_s = 0.0
+        self.step_s: List[float] = []
+        self.decode_s = 0.0
+        self._device_type: Optional[str] = None
+        self._mark = 0.0
+
+    def start(self, device_type: str) -> None:
+        self._device_type = device_type
+        self._mark = time.perf_counter()
+
+    def lap(self) -> float:
+        """Seconds since the previous mark."""
+        if self.sync and self._device_type == "xpu":
+            torch.xpu.synchronize()
+        now = time.perf_counter()
+        elapsed, self._mark = now - self._mark, now
+        return elapsed
+
+    def step_end(self) -> None:
+        step_s = self.lap()
+        self.step_s.append(step_s)
+        self.denoise_s += step_s
+
+
+def _step_end_hook(
+    step_callback: Optional[StepCallback],
+    total_steps: int,
+    timings: Optional[InferenceTimings] = None,
+):
+    """Adapt a ``(step, total_steps, latents)`` callback to diffusers' hook."""
+
+    def hook(pipe, step: int, timestep, callback_kwargs: Dict[str, Any]):
+        if timings is not None:
+            timings.step_end()
+        if step_callback is not None:
+            step_callback(step + 1, total_steps, callback_kwargs["latents"])
+        return callback_kwargs
+
+    return hook
+
+
+def _autocast(device_type: str):
+    """Mixed precision on XPU; CPU runs the model in its load dtype."""
+    if device_type == "xpu":
+        return torch.xpu.amp.autocast()
+    return contextlib.nullcontext()
+
+
+def perform_batch_inference(
+    pipe,
+    prompts: List[str],
+    height: int,
+    width: int,
+    prompt_encoder: Optional[Callable[[List[str]], Dict[str, torch.Tensor]]] = None,
+    step_callback: Optional[StepCallback] = None,
+    timings: Optional[InferenceTimings] = None,
+    **kwargs,
+) -> List[Image.Image]:
+    """Perform inference for a batch of prompts in a single pipeline call.
+
+    When ``prompt_encoder`` is given, prompts are turned into embeddings by
+    it and the pipeline receives the embeddings instead of raw text.
+    ``step_callback`` is called with the current latents after every
+    denoising step. ``timings`` is filled in with the time spent encoding
+    prompts, in each denoising step, and decoding latents to images.
+    """
+    if step_callback is not None or timings is not None:
+        kwargs["callback_on_step_end"] = _step_end_hook(
+            step_callback, kwargs.get("num_inference_steps", 0), timings
+        )
+        kwargs["callback_on_step_end_tensor_inputs"] = ["latents"]
+    device_type = pipe.device.type
+    if timings is not None:
+        timings.start(device_type)
     try:
-        with torch.inference_mode(), torch.xpu.amp.autocast():
-            return pipe(prompt, height=height, width=width, **kwargs).images[0]
+        with torch.inference_mode(), _autocast(device_type):
+            if prompt_encoder is not None:
+                kwargs.update(prompt_encoder(prompts))
+                prompts = None
+            if timings is not None:
+                timings.text_encode_s = timings.lap()
+            images = pipe(prompts, height=height, width=width, **kwargs).images
+            if timings is not None:
+                # Pipelines without a prompt encoder hook encode inside the
+                # call, which then lands in the first step.
+                timings.decode_s = timings.lap()
+            return images
     except Exception as e:
         logger.error(f"Generation failed: {str(e)}")
         raise
     finally:
-        if hasattr(torch.xpu, "empty_cache"):
+        if device_type == "xpu":
             torch.xpu.empty_cache()
 
 
+def perform_inference(
+    pipe, prompt: str, height: int, width: int, **kwargs
+) -> Image.Image:
+    """Perform inference with optimized settings."""
+    return perform_batch_inference(pipe, [prompt], height, width, **kwargs)[0]
+
+
 def optimize_model_recursive(model):
     """Recursively optimize all torch.nn.Module components with IPEX"""
+    if ipex is None:
+        return model
     try:
         if isinstance(model, torch.nn.Module):
             logger.info(f"Optimizing module: {type(model).__name__}")
@@ -72,41 +355,416 @@ def optimize_model_recursive(model):
         return model
 
 
+def _toggle_pipeline_feature(pipe, feature: str, enabled: bool) -> None:
+    """Call ``pipe.enable_<feature>()`` or ``disable_<feature>()`` if it exists."""
+    method = getattr(pipe, f"{'enable' if enabled else 'disable'}_{feature}", None)
+    if method is None:
+        return
+    try:
+        method()
+    except Exception as e:
+        logger.warning(f"Could not {'enable' if enabled else 'disable'} {feature}: {e}")
+
+
+def _module_nbytes(module: torch.nn.Module) -> int:
+    tensors = itertools.chain(module.parameters(), module.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+class ComponentRegistry:
+    """Process-wide store of pipeline components shared between models.
+
+    Components are keyed by class, source repo, subfolder and dtype, so
+    models built from the same base weights (SDXL base and SDXL Lightning)
+    hold a single copy of their VAE, text encoders and tokenizers. Entries
+    are weak: a component is freed once no model uses it.
+    """
+
+    def __init__(self):
+        self._components: "weakref.WeakValueDictionary" = weakref.WeakValueDictionary()
+        self._owners: Dict[Tuple, "weakref.WeakSet"] = {}
+        self._key_locks: Dict[Tuple, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.reuses = 0
+
+    def get(
+        self,
+        cls,
+        repo: str,
+        subfolder: str,
+        owner: "BaseModel",
+        dtype: Optional[torch.dtype] = None,
+        load_from: Optional[str] = None,
+    ):
+        """Return the shared instance of a component, loading it on first use.
+
+        ``load_from`` is a local copy of ``repo`` (a download or a snapshot)
+        to read the weights from; the component is still keyed by ``repo``.
+        """
+        key = (cls.__name__, repo, subfolder, str(dtype))
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            component = self._components.get(key)
+            if component is None:
+                kwargs = {"torch_dtype": dtype} if dtype is not None else {}
+                component = cls.from_pretrained(
+                    load_from or repo, subfolder=subfolder, **kwargs
+                )
+                with self._lock:
+                    self._components[key] = component
+                    self._owners[key] = weakref.WeakSet()
+                    self.loads += 1
+            else:
+                with self._lock:
+                    self.reuses += 1
+                logger.info(f"Reusing shared {cls.__name__} from {repo}/{subfolder}")
+            with self._lock:
+                self._owners[key].add(owner)
+        return component
+
+    def in_use_elsewhere(self, component, owner: "BaseModel", device: str) -> bool:
+        """Whether another model on ``device`` uses ``component``."""
+        with self._lock:
+            for key, shared in self._components.items():
+                if shared is component:
+                    return any(
+                        other is not owner and other.device == device
+                        for other in self._owners.get(key, ())
+                    )
+        return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Count shared components and the memory saved by not duplicating them."""
+        with self._lock:
+            entries = [
+                (component, len(self._owners.get(key, ())))
+                for key, component in self._components.items()
+            ]
+        bytes_total = 0
+        bytes_saved = 0
+        for component, owners in entries:
+            if isinstance(component, torch.nn.Module):
+                nbytes = _module_nbytes(component)
+                bytes_total += nbytes
+                bytes_saved += nbytes * max(owners - 1, 0)
+        return {
+            "components": len(entries),
+            "shared": sum(1 for _, owners in entries if owners > 1),
+            "loads": self.loads,
+            "reuses": self.reuses,
+            "bytes": bytes_total,
+            "bytes_saved": bytes_saved,
+        }
+
+
+COMPONENT_REGISTRY = ComponentRegistry()
+
+
+def sdxl_shared_loaders(
+    owner: "BaseModel", repo: str, dtype: torch.dtype
+) -> Dict[str, Callable[[str], Any]]:
+    """Loaders that fetch or reuse the VAE, text encoders and tokenizers of an
+    SDXL repo, each called with a local copy of the repo to read from."""
+    shared = {
+        "vae": (AutoencoderKL, dtype),
+        "text_encoder": (CLIPTextModel, dtype),
+        "text_encoder_2": (CLIPTextModelWithProjection, dtype),
+        "tokenizer": (CLIPTokenizer, None),
+        "tokenizer_2": (CLIPTokenizer, None),
+    }
+
+    def loader(name: str, cls, component_dtype) -> Callable[[str], Any]:
+        return lambda load_from: COMPONENT_REGISTRY.get(
+            cls, repo, name, owner, component_dtype, load_from
+        )
+
+    return {name: loader(name, *spec) for name, spec in shared.items()}
+
+
+def load_component(
+    local_dir: str, name: str, library: str, class_name: str, dtype: torch.dtype
+) -> Any:
+    """Load one pipeline component as listed in the repo's model_index.json."""
+    cls = getattr(importlib.import_module(library), class_name)
+    kwargs = {"torch_dtype": dtype} if issubclass(cls, torch.nn.Module) else {}
+    return cls.from_pretrained(local_dir, subfolder=name, **kwargs)
+
+
+COMPONENT_LOAD_WORKERS = int(os.environ.get("COMPONENT_LOAD_WORKERS", "8"))
+
+
+def library_versions() -> Dict[str, str]:
+    """Versions of the libraries that determine a pipeline's weights and layout."""
+    return {
+        "torch": torch.__version__,
+        "ipex": ipex.__version__ if ipex is not None else None,
+        "diffusers": diffusers.__version__,
+        "transformers": transformers.__version__,
+    }
+
+
+PIPELINE_SNAPSHOTS = (
+    PipelineSnapshotStore(
+        os.environ.get("PIPELINE_SNAPSHOT_DIR", "/tmp/sd_snapshots"),
+        verify_checksums=os.environ.get("PIPELINE_SNAPSHOT_VERIFY", "0") == "1",
+    )
+    if os.environ.get("PIPELINE_SNAPSHOT_ENABLED", "1") == "1"
+    else None
+)
+
+
 class BaseModel:
-    def generate(self, prompt: str, height: int, width: int, **kwargs) -> Image.Image:
+    latent_format: Optional[str] = None
+    memory_mode: Optional[str] = None
+    device: str = "xpu"
+    snapshot_name: str = ""
+    pipeline_cls = DiffusionPipeline
+    # Loading steps a component has to wait for, beyond the repo download.
+    component_deps: Dict[str, Tuple[str, ...]] = {}
+    # Components built from other weights, whose repo folders are not downloaded.
+    replaced_components: Tuple[str, ...] = ()
+
+    def generate(
+        self,
+        prompt: str,
+        height: int,
+        width: int,
+        seed: Optional[int] = None,
+        **kwargs,
+    ) -> Image.Image:
+        seeds = None if seed is None else [seed]
+        return self.generate_batch([prompt], height, width, seeds=seeds, **kwargs)[0]
+
+    def generate_batch(
+        self,
+        prompts: List[str],
+        height: int,
+        width: int,
+        seeds: Optional[List[int]] = None,
+        step_callback: Optional[StepCallback] = None,
+        timings: Optional[InferenceTimings] = None,
+        **kwargs,
+    ) -> List[Image.Image]:
         raise NotImplementedError
 
     def get_model_info(self) -> Dict[str, Any]:
         raise NotImplementedError
 
+    def _initialize_model(self):
+        """Build the pipeline from a local snapshot, or from the hub if none fits.
+
+        A pipeline built from the hub is snapshotted before it is moved to
+        the device and optimized, so later starts skip downloading,
+        checkpoint merging and dtype conversion.
+        """
+        self.startup = StartupTimer()
+        identity = self._snapshot_identity()
+        pipe = None
+        snapshot_dir = (
+            PIPELINE_SNAPSHOTS.find(self.snapshot_name, identity)
+            if PIPELINE_SNAPSHOTS is not None
+            else None
+        )
+        if snapshot_dir is not None:
+            try:
+                with self.startup.phase("deserialize"):
+                    pipe = self.pipeline_cls.from_pretrained(
+                        str(snapshot_dir),
+                        torch_dtype=self.dtype,
+                        local_files_only=True,
+                        **self._shared_components(str(snapshot_dir)),
+                    )
+                self.startup.source = "snapshot"
+            except Exception as e:
+                logger.warning(
+                    f"Could not load snapshot {snapshot_dir}: {e}, loading from the hub"
+                )
+        if pipe is None:
+            pipe = self._load_pipeline()
+            self.startup.source = "hub"
+            if PIPELINE_SNAPSHOTS is not None:
+                with self.startup.phase("snapshot_write"):
+                    PIPELINE_SNAPSHOTS.save(
+                        self.snapshot_name, identity, pipe.save_pretrained
+                    )
+        with self.startup.phase("device_transfer"):
+            self.pipe = pipe.to(self.device)
+        with self.startup.phase("optimize"):
+            self._optimize_pipeline()
+        logger.info(
+            f"Initialized {self.snapshot_name} with device={self.device}, "
+            f"dtype={self.dtype}, startup={self.startup.as_dict()}"
+        )
+
+    def _snapshot_identity(self) -> Dict[str, Any]:
+        """What a snapshot must have been built from to be reused."""
+        info = {k: v for k, v in self.get_model_info().items() if k != "device"}
+        return {"model": info, "versions": library_versions()}
+
+    def _pipeline_repo(self) -> str:
+        return self.model_id
+
+    def _shared_loaders(self) -> Dict[str, Callable[[str], Any]]:
+        """Loaders for components taken from the component registry."""
+        return {}
+
+    def _shared_components(self, load_from: Optional[str] = None) -> Dict[str, Any]:
+        return {name: load(load_from) for name, load in self._shared_loaders().items()}
+
+    def _component_loaders(self) -> Dict[str, Callable[..., Any]]:
+        """Loaders that replace reading a component straight from the repo.
+
+        Each is called with the local repo directory, followed by the
+        results of the steps named in ``component_deps``.
+        """
+        return self._shared_loaders()
+
+    def _submit_downloads(self, loader: ParallelLoader) -> None:
+        """Start downloads that can overlap the repo download."""
+
+    def _load_pipeline(self):
+        """Download the repo, then load every component on a thread pool.
+
+        Components listed in model_index.json are loaded concurrently, with
+        ``_component_loaders`` overriding how individual ones are built, and
+        the pipeline is assembled once all of them have finished. Folders of
+        ``replaced_components`` are left out of the download, as
+        ``from_pretrained`` does for components passed to it.
+        """
+        loader = ParallelLoader(COMPONENT_LOAD_WORKERS)
+        self._submit_downloads(loader)
+        with self.startup.phase("download"):
+            local_dir = DiffusionPipeline.download(
+                self._pipeline_repo(),
+                **{name: None for name in self.replaced_components},
+            )
+        index = json.loads((Path(local_dir) / "model_index.json").read_text())
+        overrides = self._component_loaders()
+        components: Dict[str, Any] = {}
+        config: Dict[str, Any] = {}
+        with self.startup.phase("deserialize"):
+            for name, spec in index.items():
+                if name.startswith("_"):
+                    continue
+                if not isinstance(spec, list):
+                    config[name] = spec
+                elif name in overrides:
+                    loader.submit(
+                        name,
+                        overrides[name],
+                        local_dir,
+                        after=self.component_deps.get(name, ()),
+                    )
+                elif spec[0] is None:
+                    components[name] = None
+                else:
+                    loader.submit(
+                        name, load_component, local_dir, name, *spec, self.dtype
+                    )
+            results = loader.results()
+        loader.log_timings(self.snapshot_name)
+        self.startup.components = loader.durations()
+        self.startup.critical_path = loader.critical_path()
+        components.update(
+            {name: result for name, result in results.items() if name in index}
+        )
+        pipeline_cls = getattr(diffusers, index["_class_name"])
+        return pipeline_cls(**components, **config)
+
+    def _optimize_pipeline(self) -> None:
+        self.pipe.unet = optimize_unet(self.pipe.unet)
+        self.set_memory_mode(SAFE_MEMORY_MODE)
+
+    def set_memory_mode(self, mode: str) -> None:
+        """Trade speed for peak memory in attention and VAE decoding.
+
+        ``full`` uses fused SDPA attention and decodes the batch at once,
+        ``vae_slicing`` decodes one image at a time, ``attention_slicing``
+        also computes attention in slices and ``vae_tiling`` also decodes
+        in overlapping tiles.
+
+        The VAE can be shared with other models (see ``ComponentRegistry``)
+        that switch its slicing and tiling for their own batches, so those
+        flags are set on every call rather than trusting ``memory_mode``.
+        """
+        level = MEMORY_MODES.index(mode)
+        vae = getattr(self.pipe, "vae", None)
+        if vae is not None:
+            _toggle_pipeline_feature(vae, "slicing", level >= 1)
+            _toggle_pipeline_feature(vae, "tiling", level >= 3)
+        sliced = MEMORY_MODES.index(self.memory_mode) >= 2 if self.memory_mode else None
+        if sliced != (level >= 2):
+            _toggle_pipeline_feature(self.pipe, "attention_slicing", level >= 2)
+        self.memory_mode = mode
+
+    def get_startup_stats(self) -> Dict[str, Any]:
+        return self.startup.as_dict()
+
+    def memory_bytes(self) -> int:
+        """Bytes held by the weights and buffers of the pipeline's modules.
+
+        Shared components are counted in full, so the total is an upper
+        bound on what unloading this model frees.
+        """
+        return sum(
+            _module_nbytes(component)
+            for component in self.pipe.components.values()
+            if isinstance(component, torch.nn.Module)
+        )
+
+    def to(self, device: str) -> None:
+        """Move the pipeline to ``device``, e.g. to park it in host memory.
+
+        Shared components still used by another model on the current device
+        stay where they are.
+        """
+        for component in self.pipe.components.values():
+            if not isinstance(component, torch.nn.Module):
+                continue
+            if COMPONENT_REGISTRY.in_use_elsewhere(component, self, self.device):
+                continue
+            component.to(device)
+        self.device = device
+
 
 class StableDiffusion2Model(BaseModel):
+    latent_format = "sd"
+    snapshot_name = "sd2"
+    pipeline_cls = StableDiffusionPipeline
+
     def __init__(self, device: str = "xpu", dtype: torch.dtype = torch.bfloat16):
         self.model_id = "stabilityai/stable-diffusion-2"
         self.device = device
         self.dtype = dtype
         self._initialize_model()
 
-    def _initialize_model(self):
-        scheduler = EulerDiscreteScheduler.from_pretrained(
-            self.model_id, subfolder="scheduler"
-        )
-        self.pipe = StableDiffusionPipeline.from_pretrained(
-            self.model_id, scheduler=scheduler, torch_dtype=self.dtype
-        )
-        self.pipe = self.pipe.to(self.device)
-        self.pipe.unet = optimize_unet(self.pipe.unet)
-        self.pipe.enable_attention_slicing()
-        logger.info(
-            f"Initialized {self.model_id} with device={self.device}, dtype={self.dtype}"
-        )
+    def _component_loaders(self) -> Dict[str, Callable[..., Any]]:
+        return {
+            "scheduler": lambda local_dir: EulerDiscreteScheduler.from_pretrained(
+                local_dir, subfolder="scheduler"
+            )
+        }
 
-    def generate(self, prompt: str, height: int, width: int, **kwargs) -> Image.Image:
-        return perform_inference(
+    def generate_batch(
+        self,
+        prompts: List[str],
+        height: int,
+        width: int,
+        seeds: Optional[List[int]] = None,
+        step_callback: Optional[StepCallback] = None,
+        timings: Optional[InferenceTimings] = None,
+        **kwargs,
+    ) -> List[Image.Image]:
+        return perform_batch_inference(
             self.pipe,
-            prompt,
+            prompts,
             height,
             width,
+            generator=make_generators(seeds),
+            step_callback=step_callback,
+            timings=timings,
             num_inference_steps=kwargs.get("num_inference_steps", 30),
             guidance_scale=kwargs.get("guidance_scale", 7.5),
         )
@@ -120,32 +778,64 @@ class StableDiffusion2Model(BaseModel):
         }
 
 
+class TinyStableDiffusionModel(StableDiffusion2Model):
+    """Tiny random-weight pipeline for exercising the service on CPU-only hosts."""
+
+    snapshot_name = "sd-tiny"
+
+    def __init__(self, device: str = "xpu", dtype: torch.dtype = torch.bfloat16):
+        self.model_id = "hf-internal-testing/tiny-stable-diffusion-pipe"
+        self.device = device
+        self.dtype = dtype
+        self._initialize_model()
+
+    def get_model_info(self) -> Dict[str, Any]:
+        return {
+            "model_id": self.model_id,
+            "model_type": "Tiny Stable Diffusion (testing)",
+            "device": self.device,
+            "dtype": str(self.dtype),
+        }
+
+
 class StableDiffusionXLModel(BaseModel):
+    latent_format = "sdxl"
+    snapshot_name = "sdxl"
+    pipeline_cls = StableDiffusionXLPipeline
+
     def __init__(self, device: str = "xpu", dtype: torch.dtype = torch.bfloat16):
         self.model_id = "stabilityai/stable-diffusion-xl-base-1.0"
         self.device = device
         self.dtype = dtype
         self._initialize_model()
 
-    def _initialize_model(self):
-        self.pipe = StableDiffusionXLPipeline.from_pretrained(
-            self.model_id, torch_dtype=self.dtype
-        )
-        self.pipe = self.pipe.to(self.device)
-        self.pipe.unet = optimize_unet(self.pipe.unet)
-        self.pipe.enable_attention_slicing()
-        logger.info(
-            f"Initialized {self.model_id} with device={self.device}, dtype={self.dtype}"
-        )
+    def _shared_loaders(self) -> Dict[str, Callable[[str], Any]]:
+        return sdxl_shared_loaders(self, self.model_id, self.dtype)
 
-    def generate(self, prompt: str, height: int, width: int, **kwargs) -> Image.Image:
-        return perform_inference(
+    def generate_batch(
+        self,
+        prompts: List[str],
+        height: int,
+        width: int,
+        seeds: Optional[List[int]] = None,
+        step_callback: Optional[StepCallback] = None,
+        timings: Optional[InferenceTimings] = None,
+        **kwargs,
+    ) -> List[Image.Image]:
+        guidance_scale = kwargs.get("guidance_scale", 7.5)
+        return perform_batch_inference(
             self.pipe,
-            prompt,
+            prompts,
             height,
             width,
+            prompt_encoder=sdxl_prompt_encoder(
+                self.pipe, self.model_id, guidance_scale > 1.0
+            ),
+            generator=make_generators(seeds),
+            step_callback=step_callback,
+            timings=timings,
             num_inference_steps=kwargs.get("num_inference_steps", 30),
-            guidance_scale=kwargs.get("guidance_scale", 7.5),
+            guidance_scale=guidance_scale,
         )
 
     def get_model_info(self) -> Dict[str, Any]:
@@ -158,30 +848,45 @@ class StableDiffusionXLModel(BaseModel):
 
 
 class FluxModel(BaseModel):
+    latent_format = "flux"
+    snapshot_name = "flux"
+    pipeline_cls = FluxPipeline
+
     def __init__(self, device: str = "xpu", dtype: torch.dtype = torch.bfloat16):
         self.model_id = "black-forest-labs/FLUX.1-schnell"
         self.device = device
         self.dtype = dtype
         self._initialize_model()
 
-    def _initialize_model(self):
-        self.pipe = FluxPipeline.from_pretrained(self.model_id, torch_dtype=self.dtype)
-        self.pipe = self.pipe.to(self.device)
+    def _optimize_pipeline(self) -> None:
         self.pipe = optimize_model_recursive(self.pipe)
-        self.pipe.enable_attention_slicing()
-        logger.info(
-            f"Initialized {self.model_id} with device={self.device}, dtype={self.dtype}"
-        )
+        self.set_memory_mode(SAFE_MEMORY_MODE)
 
-    def generate(self, prompt: str, height: int, width: int, **kwargs) -> Image.Image:
-        return perform_inference(
+    def generate_batch(
+        self,
+        prompts: List[str],
+        height: int,
+        width: int,
+        seeds: Optional[List[int]] = None,
+        step_callback: Optional[StepCallback] = None,
+        timings: Optional[InferenceTimings] = None,
+        **kwargs,
+    ) -> List[Image.Image]:
+        max_sequence_length = kwargs.get("max_sequence_length", 256)
+        return perform_batch_inference(
             self.pipe,
-            prompt,
+            prompts,
             height,
             width,
+            prompt_encoder=flux_prompt_encoder(
+                self.pipe, self.model_id, max_sequence_length
+            ),
+            generator=make_generators(seeds),
+            step_callback=step_callback,
+            timings=timings,
             guidance_scale=kwargs.get("guidance_scale", 0.0),
             num_inference_steps=kwargs.get("num_inference_steps", 4),
-            max_sequence_length=kwargs.get("max_sequence_length", 256),
+            max_sequence_length=max_sequence_length,
         )
 
     def get_model_info(self) -> Dict[str, Any]:
@@ -194,31 +899,42 @@ class FluxModel(BaseModel):
 
 
 class SDXLTurboModel(BaseModel):
+    latent_format = "sdxl"
+    snapshot_name = "sdxl-turbo"
+
     def __init__(self, device: str = "xpu", dtype: torch.dtype = torch.bfloat16):
         self.model_id = "stabilityai/sdxl-turbo"
         self.device = device
         self.dtype = dtype
         self._initialize_model()
 
-    def _initialize_model(self):
-        self.pipe = DiffusionPipeline.from_pretrained(
-            self.model_id, torch_dtype=self.dtype
-        )
-        self.pipe = self.pipe.to(self.device)
-        self.pipe.unet = optimize_unet(self.pipe.unet)
-        self.pipe.enable_attention_slicing()
-        logger.info(
-            f"Initialized {self.model_id} with device={self.device}, dtype={self.dtype}"
-        )
+    def _shared_loaders(self) -> Dict[str, Callable[[str], Any]]:
+        return sdxl_shared_loaders(self, self.model_id, self.dtype)
 
-    def generate(self, prompt: str, height: int, width: int, **kwargs) -> Image.Image:
-        return perform_inference(
+    def generate_batch(
+        self,
+        prompts: List[str],
+        height: int,
+        width: int,
+        seeds: Optional[List[int]] = None,
+        step_callback: Optional[StepCallback] = None,
+        timings: Optional[InferenceTimings] = None,
+        **kwargs,
+    ) -> List[Image.Image]:
+        guidance_scale = kwargs.get("guidance_scale", 0.0)
+        return perform_batch_inference(
             self.pipe,
-            prompt,
+            prompts,
             height,
             width,
+            prompt_encoder=sdxl_prompt_encoder(
+                self.pipe, self.model_id, guidance_scale > 1.0
+            ),
+            generator=make_generators(seeds),
+            step_callback=step_callback,
+            timings=timings,
             num_inference_steps=kwargs.get("num_inference_steps", 1),
-            guidance_scale=kwargs.get("guidance_scale", 0.0),
+            guidance_scale=guidance_scale,
         )
 
     def get_model_info(self) -> Dict[str, Any]:
@@ -231,6 +947,13 @@ class SDXLTurboModel(BaseModel):
 
 
 class SDXLLightningModel(BaseModel):
+    latent_format = "sdxl"
+    snapshot_name = "sdxl-lightning"
+    pipeline_cls = StableDiffusionXLPipeline
+    component_deps = {"unet": ("checkpoint", "unet_config")}
+    # The base UNet's weights are replaced by the Lightning checkpoint.
+    replaced_components = ("unet",)
+
     def __init__(self, device: str = "xpu", dtype: torch.dtype = torch.bfloat16):
         self.base_model_id = "stabilityai/stable-diffusion-xl-base-1.0"
         self.repo = "ByteDance/SDXL-Lightning"
@@ -239,35 +962,61 @@ class SDXLLightningModel(BaseModel):
         self.dtype = dtype
         self._initialize_model()
 
-    def _initialize_model(self):
-        unet = UNet2DConditionModel.from_config(
-            self.base_model_id, subfolder="unet"
-        ).to(self.device, self.dtype)
+    def _pipeline_repo(self) -> str:
+        return self.base_model_id
 
-        unet.load_state_dict(
-            load_file(hf_hub_download(self.repo, self.ckpt), device=self.device)
-        )
-        self.pipe = StableDiffusionXLPipeline.from_pretrained(
-            self.base_model_id, unet=unet, torch_dtype=self.dtype
-        ).to(self.device)
+    def _shared_loaders(self) -> Dict[str, Callable[[str], Any]]:
+        return sdxl_shared_loaders(self, self.base_model_id, self.dtype)
 
-        self.pipe.scheduler = EulerDiscreteScheduler.from_config(
-            self.pipe.scheduler.config, timestep_spacing="trailing"
+    def _submit_downloads(self, loader: ParallelLoader) -> None:
+        loader.submit("checkpoint", hf_hub_download, self.repo, self.ckpt)
+        loader.submit(
+            "unet_config", hf_hub_download, self.base_model_id, "unet/config.json"
         )
-        self.pipe.unet = optimize_unet(self.pipe.unet)
-        self.pipe.enable_attention_slicing()
-        logger.info(
-            f"Initialized {self.repo} with device={self.device}, dtype={self.dtype}"
+
+    def _load_unet(
+        self, local_dir: str, ckpt_path: str, config_path: str
+    ) -> UNet2DConditionModel:
+        config = UNet2DConditionModel.load_config(config_path)
+        unet = UNet2DConditionModel.from_config(config).to(dtype=self.dtype)
+        unet.load_state_dict(load_file(ckpt_path))
+        return unet
+
+    def _component_loaders(self) -> Dict[str, Callable[..., Any]]:
+        loaders = self._shared_loaders()
+        loaders["unet"] = self._load_unet
+        # Saved with the snapshot, so snapshot loads get the right scheduler.
+        loaders["scheduler"] = lambda local_dir: EulerDiscreteScheduler.from_pretrained(
+            local_dir, subfolder="scheduler", timestep_spacing="trailing"
         )
+        return loaders
 
-    def generate(self, prompt: str, height: int, width: int, **kwargs) -> Image.Image:
-        return perform_inference(
+    def generate_batch(
+        self,
+        prompts: List[str],
+        height: int,
+        width: int,
+        seeds: Optional[List[int]] = None,
+        step_callback: Optional[StepCallback] = None,
+        timings: Optional[InferenceTimings] = None,
+        **kwargs,
+    ) -> List[Image.Image]:
+        guidance_scale = kwargs.get("guidance_scale", 0.0)
+        # Lightning reuses the base model's text encoders, so it shares
+        # cached embeddings with StableDiffusionXLModel.
+        return perform_batch_inference(
             self.pipe,
-            prompt,
+            prompts,
             height,
             width,
+            prompt_encoder=sdxl_prompt_encoder(
+                self.pipe, self.base_model_id, guidance_scale > 1.0
+            ),
+            generator=make_generators(seeds),
+            step_callback=step_callback,
+            timings=timings,
             num_inference_steps=kwargs.get("num_inference_steps", 4),
-            guidance_scale=kwargs.get("guidance_scale", 0.0),
+            guidance_scale=guidance_scale,
         )
 
     def get_model_info(self) -> Dict[str, Any]:
@@ -290,6 +1039,7 @@ class ModelFactory:
             "flux": FluxModel,
             "sdxl-turbo": SDXLTurboModel,
             "sdxl-lightning": SDXLLightningModel,
+            "sd-tiny": TinyStableDiffusionModel,
         }
         if model_type not in models:
             raise ValueError(f"Unknown model type: {model_type}")
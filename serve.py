@@ -1,22 +1,160 @@
-import gc
+import asyncio
+import base64
+import contextlib
+import functools
+import hmac
+import json
 import logging
 import os
-from dataclasses import dataclass
+import random
+import time
+import zipfile
 from io import BytesIO
-from typing import Any, Dict, Optional, Union
+from dataclasses import asdict, dataclass, field, replace
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
 
 import ray.serve as serve
 import torch
-from fastapi import FastAPI, HTTPException, Response, Body
+from fastapi import FastAPI, Header, HTTPException, Response
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from ray.serve import metrics
 
-from config.model_configs import MODEL_CONFIGS
-from sd import ModelFactory
-from utils.system_monitor import SystemMonitor
+from config.model_configs import IMG_SIZE_BUCKET, MODEL_CONFIGS, img_size_buckets
+from sd import (
+    COMPONENT_REGISTRY,
+    PROMPT_EMBEDDING_CACHE,
+    InferenceTimings,
+    ModelFactory,
+)
+from utils.admission import AdmissionController, AdmissionRejected, CostModel
+from utils.batching import (
+    DEFAULT_PRIORITY_WEIGHTS,
+    DEFAULT_TENANT,
+    PRIORITY_BATCH,
+    PRIORITY_INTERACTIVE,
+    MicroBatcher,
+    QueueFullError,
+)
+from utils.device_assignment import claim_device_index
+from utils.image_encoding import ImageEncoder, OutputOptions, negotiate_format
+from utils.inference_executor import InferenceExecutor
+from utils.job_store import JobStatus, JobStore
+from utils.memory_policy import (
+    FULL_MEMORY_MODE,
+    MEMORY_MODES,
+    SAFE_MEMORY_MODE,
+    MemoryPolicy,
+    track_peak_memory,
+)
+from utils.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from utils.metrics import ServiceMetrics
+from utils.model_pool import ModelPool
+from utils.profiling import RequestProfiler
+from utils.progress import BatchProgress, ProgressSink, ProgressStats, encode_preview
+from utils.result_cache import ResultCache
+from utils.single_flight import SingleFlight
+from utils.system_monitor import SystemMonitor, SystemSampler
+from utils.usage_reporter import UsageReporter
 from utils.validators import GenerationValidator
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", "4"))
+BATCH_WAIT_TIMEOUT_MS = float(os.environ.get("BATCH_WAIT_TIMEOUT_MS", "20"))
+MAX_ONGOING_REQUESTS = 50
+MAX_QUEUE_SIZE = int(os.environ.get("MAX_QUEUE_SIZE", str(MAX_ONGOING_REQUESTS)))
+PRIORITY_WEIGHTS = json.loads(
+    os.environ.get("PRIORITY_WEIGHTS", json.dumps(DEFAULT_PRIORITY_WEIGHTS))
+)
+TENANT_WEIGHTS = json.loads(os.environ.get("TENANT_WEIGHTS", "{}"))
+ADMISSION_ENABLED = os.environ.get("ADMISSION_ENABLED", "1") == "1"
+ADMISSION_SLA_S = float(os.environ.get("ADMISSION_SLA_S", "60"))
+ADMISSION_PRIOR_S_PER_MPIX_STEP = float(
+    os.environ.get("ADMISSION_PRIOR_S_PER_MPIX_STEP", "0.1")
+)
+INFERENCE_DEVICE = os.environ.get("INFERENCE_DEVICE", "xpu")
+DEVICES_PER_NODE = int(os.environ.get("DEVICES_PER_NODE", "1"))
+DEVICE_LOCK_DIR = os.environ.get("DEVICE_LOCK_DIR", "/tmp/sd_device_locks")
+REPLICA_NUM_CPUS = float(os.environ.get("REPLICA_NUM_CPUS", "24"))
+REPLICA_RESOURCES = json.loads(os.environ.get("REPLICA_RESOURCES", "{}"))
+AUTOSCALING_ENABLED = os.environ.get("AUTOSCALING_ENABLED", "0") == "1"
+MIN_REPLICAS = int(os.environ.get("MIN_REPLICAS", "1"))
+MAX_REPLICAS = int(os.environ.get("MAX_REPLICAS", "4"))
+TARGET_ONGOING_REQUESTS = int(
+    os.environ.get("TARGET_ONGOING_REQUESTS", str(MAX_BATCH_SIZE * 2))
+)
+UPSCALE_DELAY_S = float(os.environ.get("UPSCALE_DELAY_S", "30"))
+DOWNSCALE_DELAY_S = float(os.environ.get("DOWNSCALE_DELAY_S", "600"))
+RESULT_CACHE_ENABLED = os.environ.get("RESULT_CACHE_ENABLED", "1") == "1"
+RESULT_CACHE_MEMORY_MB = int(os.environ.get("RESULT_CACHE_MEMORY_MB", "512"))
+RESULT_CACHE_DISK_MB = int(os.environ.get("RESULT_CACHE_DISK_MB", "4096"))
+RESULT_CACHE_DIR = os.environ.get("RESULT_CACHE_DIR", "/tmp/sd_result_cache")
+COALESCE_ENABLED = os.environ.get("COALESCE_ENABLED", "1") == "1"
+JOB_DB_PATH = os.environ.get("JOB_DB_PATH", "/tmp/sd_jobs/jobs.sqlite3")
+# Jobs each replica's dispatcher keeps in flight. Every replica runs one, so
+# the cluster total grows with the replica count. With autoscaling, twice the
+# target keeps Serve seeing a backlog, so it scales out while jobs are queued.
+JOB_CONCURRENCY = int(
+    os.environ.get(
+        "JOB_CONCURRENCY",
+        str(
+            TARGET_ONGOING_REQUESTS * 2
+            if AUTOSCALING_ENABLED
+            else MAX_BATCH_SIZE * 2
+        ),
+    )
+)
+JOB_MAX_QUEUED = int(os.environ.get("JOB_MAX_QUEUED", "10000"))
+JOB_RESULT_TTL_S = float(os.environ.get("JOB_RESULT_TTL_S", "86400"))
+JOB_POLL_INTERVAL_S = 1.0
+JOB_STALE_S = float(os.environ.get("JOB_STALE_S", "900"))
+MAX_CONSECUTIVE_FAILURES = int(os.environ.get("MAX_CONSECUTIVE_FAILURES", "5"))
+IMAGE_ENCODE_WORKERS = int(os.environ.get("IMAGE_ENCODE_WORKERS", "4"))
+IMAGE_ENCODE_PROCESSES = os.environ.get("IMAGE_ENCODE_PROCESSES", "0") == "1"
+SERVED_MODELS = [
+    name
+    for name in os.environ.get(
+        "SERVED_MODELS",
+        ",".join(n for n, c in MODEL_CONFIGS.items() if not c.get("test_only")),
+    ).split(",")
+    if name.strip() in MODEL_CONFIGS
+]
+MODEL_POOL_DEVICE_GB = float(os.environ.get("MODEL_POOL_DEVICE_GB", "40"))
+MODEL_POOL_HOST_GB = float(os.environ.get("MODEL_POOL_HOST_GB", "64"))
+WARMUP_ENABLED = os.environ.get("WARMUP_ENABLED", "1") == "1"
+WARMUP_STEPS = int(os.environ.get("WARMUP_STEPS", "2"))
+WARMUP_BATCH_SIZE = int(os.environ.get("WARMUP_BATCH_SIZE", str(MAX_BATCH_SIZE)))
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+AUTH_USAGE_URL = os.environ.get("AUTH_USAGE_URL", "http://auth:9001/auth/usage")
+USAGE_REPORT_TOKEN = os.environ.get("USAGE_REPORT_TOKEN")
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "/tmp/sd_profiles")
+MAX_PROFILED_REQUESTS = 100
+STAGE_TIMING_SYNC = os.environ.get("STAGE_TIMING_SYNC", "1") == "1"
+MEMORY_POLICY_ENABLED = os.environ.get("MEMORY_POLICY_ENABLED", "1") == "1"
+MEMORY_POLICY_HEADROOM = float(os.environ.get("MEMORY_POLICY_HEADROOM", "0.9"))
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9100"))
+SYSTEM_SAMPLE_INTERVAL_S = float(os.environ.get("SYSTEM_SAMPLE_INTERVAL_S", "5"))
+SYSTEM_SAMPLE_HISTORY = int(os.environ.get("SYSTEM_SAMPLE_HISTORY", "720"))
+DEFAULT_OUTPUT = OutputOptions(
+    output_format=os.environ.get("DEFAULT_OUTPUT_FORMAT", "png"),
+    quality=int(os.environ.get("DEFAULT_IMAGE_QUALITY", "90")),
+    compress_level=int(os.environ.get("PNG_COMPRESS_LEVEL", "6")),
+)
+
 
 # allow cors
 from fastapi.middleware.cors import CORSMiddleware
@@ -34,40 +172,326 @@ app.add_middleware(
 
 @dataclass
 class ModelStatus:
-    """Status and metadata for the loaded model."""
+    """Status of the default model.
+
+    ``consecutive_failures`` counts pipeline calls in a row in which every
+    request failed; any call that serves a request resets it.
+    """
 
     is_loaded: bool = False
+    is_warm: bool = False
     error: Optional[str] = None
-    model: Optional[Any] = None
+    warmup_timings: Dict[int, float] = field(default_factory=dict)
+    consecutive_failures: int = 0
+
+    @property
+    def is_failing(self) -> bool:
+        return self.consecutive_failures >= MAX_CONSECUTIVE_FAILURES
+
+    @property
+    def is_ready(self) -> bool:
+        return self.is_loaded and self.is_warm and not self.is_failing
+
+    def record_batch(self, error: Optional[Exception] = None) -> None:
+        """Count a pipeline call that failed entirely, or reset on success."""
+        if error is None:
+            if self.is_failing:
+                self.error = None
+            self.consecutive_failures = 0
+            return
+        self.consecutive_failures += 1
+        if self.is_failing:
+            self.error = f"{self.consecutive_failures} batches failed in a row: {error}"
 
     def __str__(self) -> str:
-        return f"Loaded: {self.is_loaded}, Error: {self.error}"
+        return (
+            f"Loaded: {self.is_loaded}, Warm: {self.is_warm}, "
+            f"Failed batches in a row: {self.consecutive_failures}, "
+            f"Error: {self.error}"
+        )
 
 
-@serve.deployment(
-    ray_actor_options={"num_cpus": 24},
-    num_replicas=1,
-    max_ongoing_requests=50,
-    max_queued_requests=100,
-)
+class GenerateBody(BaseModel):
+    """JSON body of a generation request, validated by GenerationValidator."""
+
+    prompt: str = Field(..., description="The prompt for image generation")
+    model: Optional[str] = Field(
+        None, description="Model to generate with; defaults to DEFAULT_MODEL"
+    )
+    img_size: Union[int, str] = Field(512, description="Size of the image")
+    guidance_scale: Optional[Union[float, int, str]] = Field(
+        None, description="Guidance scale"
+    )
+    num_inference_steps: Optional[Union[int, str]] = Field(
+        None, description="Number of inference steps"
+    )
+    seed: Optional[Union[int, str]] = Field(
+        None, description="Random seed; results with a seed are cached"
+    )
+    num_images: Optional[Union[int, str]] = Field(
+        1,
+        description="Images to generate from the prompt; more than one returns a zip",
+    )
+    output_format: Optional[str] = Field(
+        None, description="png, jpeg, webp or raw; overrides the Accept header"
+    )
+    quality: Optional[Union[int, str]] = Field(
+        None, description="JPEG/WebP quality (1-100)"
+    )
+    compress_level: Optional[Union[int, str]] = Field(
+        None, description="PNG compression level (0-9)"
+    )
+    deadline_s: Optional[Union[float, int, str]] = Field(
+        None,
+        description="Reject with 429 unless the image can be ready within this many seconds",
+    )
+    priority: Optional[str] = Field(
+        None,
+        description="interactive or batch; defaults to interactive, batch for /jobs",
+    )
+
+
+class StreamBody(GenerateBody):
+    preview_every: Union[int, str] = Field(
+        5, description="Send a latent preview every N steps (0 disables)"
+    )
+
+
+class ProfileBody(BaseModel):
+    requests: int = Field(1, description="Number of upcoming requests to profile")
+
+
+@dataclass
+class GenerationRequest:
+    """Validated parameters of a single generation request."""
+
+    prompt: str
+    img_size: int
+    num_inference_steps: int
+    guidance_scale: float
+    seed: Optional[int] = None
+    output_format: str = DEFAULT_OUTPUT.output_format
+    quality: int = DEFAULT_OUTPUT.quality
+    compress_level: int = DEFAULT_OUTPUT.compress_level
+    model: Optional[str] = None
+    tenant: str = DEFAULT_TENANT
+    priority: str = PRIORITY_INTERACTIVE
+    num_images: int = 1
+
+    @property
+    def output(self) -> OutputOptions:
+        return OutputOptions(self.output_format, self.quality, self.compress_level)
+
+
+class ModelLoadError(RuntimeError):
+    """A model could not be loaded into, or promoted onto, the device."""
+
+
+@dataclass
+class GenerationResult:
+    """Encoded image and the response headers that describe it."""
+
+    content: bytes
+    media_type: str
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class BatchItem:
+    """A prompt queued for batched generation, with one seed per image."""
+
+    prompt: str
+    seeds: List[int]
+    progress: Optional[ProgressSink] = None
+    queued_at: float = field(default_factory=time.monotonic)
+    profile: bool = False
+    trace_id: Optional[str] = None
+    peak_memory_bytes: int = 0
+
+
+def _format_sse(event: str, data: Dict[str, Any]) -> str:
+    """Format one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _pack_images(
+    images: Sequence[bytes], seeds: Sequence[int], extension: str
+) -> bytes:
+    """Zip encoded images, named by position and seed, without recompressing."""
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        for i, (content, seed) in enumerate(zip(images, seeds)):
+            archive.writestr(f"{i}_{seed}.{extension}", content)
+    return buffer.getvalue()
+
+
+def _size_label(img_size: int) -> str:
+    """Round an image size up to its warmup bucket for use as a metric label."""
+    return str(-(-img_size // IMG_SIZE_BUCKET) * IMG_SIZE_BUCKET)
+
+
+DEPLOYMENT_OPTIONS: Dict[str, Any] = {
+    "ray_actor_options": {
+        "num_cpus": REPLICA_NUM_CPUS,
+        "resources": REPLICA_RESOURCES,
+    },
+    "max_ongoing_requests": MAX_ONGOING_REQUESTS,
+    "max_queued_requests": 100,
+}
+if AUTOSCALING_ENABLED:
+    # Serve scales on requests ongoing at each replica. Sync requests stay
+    # ongoing while they wait in the inference queue, and async jobs are run
+    # through the deployment handle, so this tracks real inference demand.
+    DEPLOYMENT_OPTIONS["autoscaling_config"] = {
+        "min_replicas": MIN_REPLICAS,
+        "max_replicas": MAX_REPLICAS,
+        "target_ongoing_requests": TARGET_ONGOING_REQUESTS,
+        "upscale_delay_s": UPSCALE_DELAY_S,
+        "downscale_delay_s": DOWNSCALE_DELAY_S,
+    }
+else:
+    DEPLOYMENT_OPTIONS["num_replicas"] = 1
+
+
+@serve.deployment(**DEPLOYMENT_OPTIONS)
 @serve.ingress(app)
 class ImageGenerationServer:
     """Server for handling image generation requests."""
 
     def __init__(self):
-        """Initialize the image generation server with a single model."""
+        """Initialize the image generation server and load the default model."""
         logger.info("Initializing Image Generation Server")
+        self.started_at = time.time()
+        init_start = time.perf_counter()
+        self.replica_id = self._get_replica_id()
+        self.device = self._assign_device()
         self.model_name = os.environ.get("DEFAULT_MODEL", "sdxl-lightning")
-        logger.info(f"Using model: {self.model_name}")
+        self.served_models = list(dict.fromkeys([self.model_name] + SERVED_MODELS))
+        logger.info(f"Using model: {self.model_name}, serving: {self.served_models}")
         self.model_status = ModelStatus()
+        self.model_pool = ModelPool(
+            functools.partial(ModelFactory.create_model, device=self.device),
+            device=self.device,
+            device_budget_bytes=int(MODEL_POOL_DEVICE_GB * 1024**3),
+            host_budget_bytes=int(MODEL_POOL_HOST_GB * 1024**3),
+            size_estimates={
+                name: int(config["approx_memory_gb"] * 1024**3)
+                for name, config in MODEL_CONFIGS.items()
+            },
+        )
+        self.metrics = ServiceMetrics()
+        self.metrics_port = self._serve_metrics()
+        self.system_sampler = SystemSampler(
+            self.device, SYSTEM_SAMPLE_INTERVAL_S, SYSTEM_SAMPLE_HISTORY
+        )
+        self.system_sampler.start()
+        self.memory_policy = MemoryPolicy(
+            functools.partial(SystemMonitor.free_device_memory, self.device),
+            headroom=MEMORY_POLICY_HEADROOM,
+            enabled=MEMORY_POLICY_ENABLED,
+        )
+        self.profiler = RequestProfiler(PROFILE_DIR)
+        self.inference_executor = InferenceExecutor()
+        self.cost_model = CostModel(ADMISSION_PRIOR_S_PER_MPIX_STEP)
+        self.admission = AdmissionController(
+            self.cost_model, ADMISSION_SLA_S, enabled=ADMISSION_ENABLED
+        )
+        self.batcher = MicroBatcher(
+            self._generate_batch,
+            max_batch_size=MAX_BATCH_SIZE,
+            batch_wait_timeout_s=BATCH_WAIT_TIMEOUT_MS / 1000,
+            max_queue_size=MAX_QUEUE_SIZE,
+            priority_weights=PRIORITY_WEIGHTS,
+            tenant_weights=TENANT_WEIGHTS,
+        )
+        self.result_cache = (
+            ResultCache(
+                memory_bytes=RESULT_CACHE_MEMORY_MB * 1024**2,
+                disk_dir=RESULT_CACHE_DIR,
+                disk_bytes=RESULT_CACHE_DISK_MB * 1024**2,
+            )
+            if RESULT_CACHE_ENABLED
+            else None
+        )
+        self.single_flight = SingleFlight()
+        self.progress_stats = ProgressStats()
+        self.usage_reporter = UsageReporter(AUTH_USAGE_URL, USAGE_REPORT_TOKEN)
+        self.image_encoder = ImageEncoder(
+            max_workers=IMAGE_ENCODE_WORKERS, use_processes=IMAGE_ENCODE_PROCESSES
+        )
+        self.job_store = JobStore(JOB_DB_PATH, requeue_running=not AUTOSCALING_ENABLED)
+        self._job_dispatcher: Optional[asyncio.Task] = None
+        self._running_jobs: Set[str] = set()
+        self._jobs_wakeup: Optional[asyncio.Event] = None
         self._load_model()
+        self._warmup()
+        self.startup_s = time.perf_counter() - init_start
+        self._last_queue_depth = 0
+        self._queue_depth_gauge = metrics.Gauge(
+            "sd_inference_queue_depth",
+            description="Requests waiting for or running inference on this replica.",
+        )
+        self._tenant_queue_gauge = metrics.Gauge(
+            "sd_tenant_queue_length",
+            description="Requests waiting for inference, by tenant and priority.",
+            tag_keys=("tenant", "priority"),
+        )
+        self._tenant_share_gauge = metrics.Gauge(
+            "sd_tenant_service_share",
+            description="Fraction of recent GPU time spent on a tenant and priority.",
+            tag_keys=("tenant", "priority"),
+        )
+        metrics.Histogram(
+            "sd_replica_startup_seconds",
+            description="Time from replica construction to ready.",
+            boundaries=[10, 30, 60, 120, 300, 600, 1200],
+        ).observe(self.startup_s)
+        logger.info(
+            f"Replica {self.replica_id} ready on {self.device} "
+            f"in {self.startup_s:.1f}s"
+        )
+
+    def __del__(self):
+        uptime = time.time() - getattr(self, "started_at", time.time())
+        logger.info(
+            f"Replica {getattr(self, 'replica_id', None)} shutting down "
+            f"after {uptime:.0f}s"
+        )
+
+    @staticmethod
+    def _get_replica_id() -> Optional[str]:
+        try:
+            return serve.get_replica_context().replica_id.unique_id
+        except Exception:
+            return None
+
+    @staticmethod
+    def _assign_device() -> str:
+        """Pick this replica's device, claiming a free tile on multi-tile nodes."""
+        if INFERENCE_DEVICE != "xpu" or DEVICES_PER_NODE <= 1:
+            return INFERENCE_DEVICE
+        index = claim_device_index(DEVICES_PER_NODE, DEVICE_LOCK_DIR)
+        if index is None:
+            return INFERENCE_DEVICE
+        torch.xpu.set_device(index)
+        return f"xpu:{index}"
+
+    def _serve_metrics(self) -> Optional[int]:
+        """Serve this replica's metrics on ``METRICS_PORT`` plus its tile index.
+
+        Replicas on one node claim distinct tiles, so they get distinct ports.
+        """
+        if METRICS_PORT <= 0:
+            return None
+        _, _, index = self.device.partition(":")
+        port = METRICS_PORT + int(index or 0)
+        return port if self.metrics.serve(port) else None
 
     def _load_model(self) -> None:
         """Load the configured model."""
         try:
             logger.info(f"Loading model: {self.model_name}")
-            model = ModelFactory.create_model(self.model_name)
-            self.model_status.model = model
+            self.model_pool.get(self.model_name)
             self.model_status.is_loaded = True
             self.model_status.error = None
             logger.info(f"Successfully loaded model: {self.model_name}")
@@ -76,71 +500,1051 @@ class ImageGenerationServer:
             logger.error(error_msg)
             self.model_status.is_loaded = False
             self.model_status.error = error_msg
-            self.model_status.model = None
+
+    def _warmup(self) -> None:
+        """Run dummy generations at every image size bucket of the default model.
+
+        The first pipeline call at a new shape pays for kernel selection and
+        allocator growth; doing it here, before the replica reports ready,
+        keeps that cost off user requests. The runs double as the memory
+        policy's calibration: every bucket runs in ``full`` mode, and the
+        largest bucket that fits once more in each memory-saving mode.
+        """
+        if not self.model_status.is_loaded:
+            return
+        if not WARMUP_ENABLED:
+            self.model_status.is_warm = True
+            return
+        config = MODEL_CONFIGS[self.model_name]
+        steps = min(config["default_steps"], WARMUP_STEPS)
+        model = self.model_pool.get(self.model_name)
+        calibrate = self.memory_policy.enabled and self.device.startswith("xpu")
+        # Without device memory statistics the policy always picks full mode.
+        uncalibrated_mode = (
+            FULL_MEMORY_MODE if self.memory_policy.enabled else SAFE_MEMORY_MODE
+        )
+        largest_full = None
+        total_start = time.perf_counter()
+        try:
+            for img_size in img_size_buckets(self.model_name):
+                start = time.perf_counter()
+                if not calibrate:
+                    self._warmup_batch(model, img_size, steps, uncalibrated_mode)
+                else:
+                    try:
+                        self._warmup_batch(model, img_size, steps, FULL_MEMORY_MODE)
+                        largest_full = img_size
+                    except RuntimeError as e:
+                        logger.warning(
+                            f"Warmup of {self.model_name} at {img_size}px failed "
+                            f"in full memory mode, retrying with savings: {e}"
+                        )
+                        self.memory_policy.mark_unfit(
+                            self.model_name, img_size, WARMUP_BATCH_SIZE
+                        )
+                        self._warmup_batch(model, img_size, steps, SAFE_MEMORY_MODE)
+                elapsed = time.perf_counter() - start
+                # Not fed to the cost model: first calls at a shape are far
+                # slower than steady state and would inflate admission costs.
+                self.model_status.warmup_timings[img_size] = round(elapsed, 3)
+                logger.info(
+                    f"Warmed up {self.model_name} at {img_size}px "
+                    f"(batch {WARMUP_BATCH_SIZE}, {steps} steps) in {elapsed:.2f}s"
+                )
+            if largest_full is not None:
+                for mode in MEMORY_MODES[1:]:
+                    self._warmup_batch(model, largest_full, steps, mode)
+        except Exception as e:
+            error_msg = f"Warmup of {self.model_name} failed: {str(e)}"
+            logger.error(error_msg)
+            self.model_status.error = error_msg
+            return
+        self.model_status.is_warm = True
+        logger.info(f"Memory policy: {self.memory_policy.get_stats()}")
+        logger.info(f"Warmup finished in {time.perf_counter() - total_start:.2f}s")
+
+    def _warmup_batch(self, model, img_size: int, steps: int, mode: str) -> None:
+        """One warmup generation in ``mode``, recording its peak memory."""
+        model.set_memory_mode(mode)
+        with track_peak_memory(self.device) as memory:
+            model.generate_batch(
+                ["warmup"] * WARMUP_BATCH_SIZE,
+                img_size,
+                img_size,
+                seeds=list(range(WARMUP_BATCH_SIZE)),
+                num_inference_steps=steps,
+                guidance_scale=MODEL_CONFIGS[self.model_name]["default_guidance"],
+            )
+        self.memory_policy.observe(
+            self.model_name, img_size, WARMUP_BATCH_SIZE, mode, memory["peak_bytes"]
+        )
+
+    async def _generate_batch(
+        self, key: Tuple[str, int, int, float], items: List[BatchItem]
+    ) -> List[Any]:
+        """Run one pipeline call for prompts sharing model, size, steps and guidance.
+
+        Each item gets one image per seed; the prompt is repeated in the
+        batch for each, which is how ``num_images_per_prompt`` works inside
+        the pipelines too, and every item receives its list of images. When
+        the pipeline call fails, each item is retried on its own, so only
+        the requests that fail alone get the error. Batches in which every
+        request fails are counted towards ``MAX_CONSECUTIVE_FAILURES``.
+        """
+        model_name, img_size = key[0], key[1]
+        logger.info(
+            f"Running batch of {sum(len(item.seeds) for item in items)} images "
+            f"for {len(items)} requests on {model_name} at {img_size}px"
+        )
+        now = time.monotonic()
+        queue_wait = self.metrics.queue_wait_seconds.labels(model_name)
+        for item in items:
+            queue_wait.observe(now - item.queued_at)
+        try:
+            results = await self._generate_items(key, items)
+            self.model_status.record_batch()
+            return results
+        except ModelLoadError:
+            raise
+        except Exception as e:
+            if len(items) == 1:
+                self.model_status.record_batch(e)
+                raise
+            logger.warning(
+                f"Batch of {len(items)} requests failed ({e}), "
+                "retrying them one at a time"
+            )
+        results = []
+        for item in items:
+            try:
+                results.extend(await self._generate_items(key, [item]))
+            except Exception as e:
+                results.append(e)
+        errors = [r for r in results if isinstance(r, Exception)]
+        self.model_status.record_batch(
+            errors[0] if len(errors) == len(results) else None
+        )
+        return results
+
+    async def _generate_items(
+        self, key: Tuple[str, int, int, float], items: List[BatchItem]
+    ) -> List[Any]:
+        """One pipeline call for ``items``, split back into their images."""
+        model_name, img_size, num_inference_steps, guidance_scale = key
+        prompts = [item.prompt for item in items for _ in item.seeds]
+        step_callback = None
+        if any(item.progress is not None for item in items):
+            # Progress follows each request's first image.
+            step_callback = BatchProgress(
+                [
+                    item.progress if i == 0 else None
+                    for item in items
+                    for i in range(len(item.seeds))
+                ],
+                None,
+                img_size,
+                img_size,
+                self.progress_stats,
+            )
+        images = await self.inference_executor.run(
+            self._generate_on_pool,
+            model_name,
+            items=items,
+            prompts=prompts,
+            height=img_size,
+            width=img_size,
+            seeds=[seed for item in items for seed in item.seeds],
+            step_callback=step_callback,
+            num_inference_steps=num_inference_steps,
+            guidance_scale=guidance_scale,
+        )
+        results = []
+        offset = 0
+        for item in items:
+            results.append(images[offset : offset + len(item.seeds)])
+            offset += len(item.seeds)
+        return results
+
+    def _generate_on_pool(
+        self,
+        model_name: str,
+        step_callback: Optional[BatchProgress] = None,
+        items: Sequence[BatchItem] = (),
+        **kwargs,
+    ) -> List[Any]:
+        """Fetch a model from the pool and run a batch on it.
+
+        Runs on the inference thread, so loading, promoting and demoting
+        models never overlaps a pipeline call. When any request in the batch
+        asked to be profiled, the pipeline call is captured with
+        torch.profiler and each such request is given the trace id. The
+        memory policy picks the attention and VAE mode for the batch once
+        the model is resident, so free memory reflects its weights. Every
+        item is given the batch's peak device memory.
+        """
+        profile_items = [item for item in items if item.profile]
+        try:
+            model = self.model_pool.get(model_name)
+        except Exception as e:
+            raise ModelLoadError(f"Could not load {model_name}: {e}") from e
+        batch_size = len(kwargs["prompts"])
+        mode = self.memory_policy.choose(model_name, kwargs["height"], batch_size)
+        model.set_memory_mode(mode)
+        self.metrics.count_memory_mode(model_name, mode)
+        if step_callback is not None:
+            step_callback.latent_format = model.latent_format
+        timings = InferenceTimings(sync=STAGE_TIMING_SYNC)
+        profile = contextlib.nullcontext()
+        if profile_items:
+            profile = self.profiler.capture(
+                torch.device(self.device).type,
+                f"{model_name} batch of {len(kwargs['prompts'])} at "
+                f"{kwargs['height']}px, {kwargs['num_inference_steps']} steps",
+            )
+        start = time.perf_counter()
+        with profile as trace_id, track_peak_memory(self.device) as memory:
+            for item in profile_items:
+                item.trace_id = trace_id
+            images = model.generate_batch(
+                step_callback=step_callback, timings=timings, **kwargs
+            )
+        for item in items:
+            item.peak_memory_bytes = memory["peak_bytes"]
+        self.memory_policy.observe(
+            model_name, kwargs["height"], batch_size, mode, memory["peak_bytes"]
+        )
+        self.metrics.observe_batch(
+            model_name,
+            batch_size,
+            timings.text_encode_s,
+            timings.denoise_s,
+            timings.step_s,
+            timings.decode_s,
+        )
+        self.cost_model.observe(
+            model_name,
+            kwargs["height"],
+            kwargs["num_inference_steps"],
+            batch_size,
+            time.perf_counter() - start,
+        )
+        return images
 
     @app.get("/info")
-    def get_info(self) -> Dict[str, Any]:
-        """Get information about the model and system status."""
+    async def get_info(self) -> Dict[str, Any]:
+        """Get information about the model and system status.
+
+        Runs on the event loop, so the batcher's queues are not read while
+        the loop is changing them.
+        """
+        loop = asyncio.get_running_loop()
+        jobs = await loop.run_in_executor(None, self.job_store.count_by_status)
         return {
             "model": self.model_name,
             "is_loaded": self.model_status.is_loaded,
+            "is_warm": self.model_status.is_warm,
+            "warmup_timings_s": self.model_status.warmup_timings,
             "error": self.model_status.error,
+            "consecutive_failures": self.model_status.consecutive_failures,
             "config": MODEL_CONFIGS[self.model_name],
-            "system_info": SystemMonitor.get_system_info(),
+            "replica": {
+                "id": self.replica_id,
+                "device": self.device,
+                "started_at": self.started_at,
+                "startup_s": round(self.startup_s, 2),
+                "metrics_port": self.metrics_port,
+                "autoscaling": DEPLOYMENT_OPTIONS.get("autoscaling_config"),
+            },
+            "served_models": self.served_models,
+            "admission": self.admission.get_stats(),
+            "model_pool": self.model_pool.get_stats(),
+            "shared_components": COMPONENT_REGISTRY.get_stats(),
+            "memory_policy": self.memory_policy.get_stats(),
+            "usage_reporting": self.usage_reporter.get_stats(),
+            "batching": self.batcher.get_stats(),
+            "inference_executor": self.inference_executor.get_stats(),
+            "result_cache": (
+                self.result_cache.get_stats() if self.result_cache else None
+            ),
+            "coalescing": dict(
+                self.single_flight.get_stats(), enabled=COALESCE_ENABLED
+            ),
+            "prompt_embedding_cache": PROMPT_EMBEDDING_CACHE.get_stats(),
+            "jobs": jobs,
+            "progress": self.progress_stats.get_stats(),
+            "image_encoding": self.image_encoder.get_stats(),
+            "system_info": SystemMonitor.get_system_info(
+                self.system_sampler.latest()
+            ),
+        }
+
+    @app.get("/info/history")
+    def get_info_history(self, window_s: Optional[float] = None) -> Dict[str, Any]:
+        """Recent CPU, memory and device memory samples of this replica."""
+        if window_s is not None and window_s <= 0:
+            raise HTTPException(status_code=400, detail="window_s must be positive")
+        return {
+            "replica": self.replica_id,
+            "device": self.device,
+            **self.system_sampler.history(window_s),
         }
 
+    @app.get("/metrics")
+    async def get_metrics(self) -> Response:
+        """Prometheus metrics of whichever replica answers.
+
+        For monitoring, scrape every replica on its ``METRICS_PORT`` instead.
+        """
+        self._update_metric_gauges()
+        return Response(content=self.metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+    def _update_metric_gauges(self) -> None:
+        """Refresh gauges that are read rather than recorded as things happen."""
+        self.metrics.last_batch_size.set(self.batcher.last_batch_size)
+        if self.device.startswith("xpu"):
+            try:
+                self.metrics.set_device_memory(
+                    {
+                        "allocated": torch.xpu.memory_allocated(self.device),
+                        "reserved": torch.xpu.memory_reserved(self.device),
+                    }
+                )
+            except Exception as e:
+                logger.warning(f"Could not read device memory: {e}")
+
+    @staticmethod
+    def _require_admin(token: Optional[str]) -> None:
+        """Reject callers without the ``ADMIN_TOKEN`` in ``X-Admin-Token``."""
+        if not ADMIN_TOKEN or not token or not hmac.compare_digest(token, ADMIN_TOKEN):
+            raise HTTPException(status_code=403, detail="Admin token required")
+
+    @app.post("/admin/profile")
+    def arm_profiler(
+        self, body: ProfileBody, x_admin_token: Optional[str] = Header(None)
+    ) -> Dict[str, Any]:
+        """Profile the next N requests that run inference on this replica."""
+        self._require_admin(x_admin_token)
+        if body.requests < 0 or body.requests > MAX_PROFILED_REQUESTS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Requests must be between 0 and {MAX_PROFILED_REQUESTS}",
+            )
+        return {"replica": self.replica_id, "armed": self.profiler.arm(body.requests)}
+
+    @app.get("/admin/profile")
+    def get_profiles(
+        self, x_admin_token: Optional[str] = Header(None)
+    ) -> Dict[str, Any]:
+        """Armed captures and the most recent traces on this replica."""
+        self._require_admin(x_admin_token)
+        return {"replica": self.replica_id, **self.profiler.get_stats()}
+
+    @app.get("/admin/profile/{trace_id}")
+    def get_profile_summary(
+        self, trace_id: str, x_admin_token: Optional[str] = Header(None)
+    ) -> PlainTextResponse:
+        """Top operators of a captured trace."""
+        self._require_admin(x_admin_token)
+        path = self.profiler.find(trace_id, "txt")
+        if path is None:
+            raise HTTPException(status_code=404, detail="Profile not found")
+        return PlainTextResponse(path.read_text())
+
+    @app.get("/admin/profile/{trace_id}/trace")
+    def get_profile_trace(
+        self, trace_id: str, x_admin_token: Optional[str] = Header(None)
+    ) -> FileResponse:
+        """Chrome trace of a captured request."""
+        self._require_admin(x_admin_token)
+        path = self.profiler.find(trace_id, "json")
+        if path is None:
+            raise HTTPException(status_code=404, detail="Profile not found")
+        return FileResponse(path, media_type="application/json")
+
     @app.get("/health")
     def health_check(self) -> Dict[str, Any]:
         """Health check endpoint."""
         return {
-            "status": "healthy" if self.model_status.is_loaded else "degraded",
+            "status": "healthy" if self.model_status.is_ready else "degraded",
         }
 
+    @app.get("/health/live")
+    def liveness(self) -> Dict[str, Any]:
+        """Liveness probe: the replica process is up and serving HTTP."""
+        return {"status": "alive"}
+
+    @app.get("/health/ready")
+    def readiness(self) -> Dict[str, Any]:
+        """Readiness probe: the default model is loaded, warm and not failing."""
+        if not self.model_status.is_ready:
+            raise HTTPException(
+                status_code=503,
+                detail=f"Not ready. {self.model_status}",
+            )
+        return {"status": "ready"}
+
+    def _validate_request(
+        self,
+        body: GenerateBody,
+        accept: Optional[str] = None,
+        tenant: Optional[str] = None,
+        default_priority: str = PRIORITY_INTERACTIVE,
+    ) -> GenerationRequest:
+        """Validate a request body into a generation request.
+
+        The output format comes from the body if given, otherwise from the
+        ``Accept`` header, otherwise from the server default. ``tenant`` is
+        the caller identity set by the auth service.
+        """
+        with self.metrics.validation_seconds.time():
+            return self._build_request(body, accept, tenant, default_priority)
+
+    def _build_request(
+        self,
+        body: GenerateBody,
+        accept: Optional[str],
+        tenant: Optional[str],
+        default_priority: str,
+    ) -> GenerationRequest:
+        GenerationValidator.validate_prompt(body.prompt)
+        model_name = body.model or self.model_name
+        GenerationValidator.validate_model(model_name, self.served_models)
+        GenerationValidator.validate_image_size(model_name, body.img_size)
+        kwargs = GenerationValidator.validate_generation_params(
+            model_name, body.guidance_scale, body.num_inference_steps
+        )
+        num_images = GenerationValidator.validate_num_images(
+            body.num_images, self._max_images(model_name, int(body.img_size))
+        )
+        output = GenerationValidator.validate_output_options(
+            body.output_format or negotiate_format(accept),
+            body.quality,
+            body.compress_level,
+            DEFAULT_OUTPUT,
+        )
+        return GenerationRequest(
+            prompt=body.prompt,
+            img_size=int(body.img_size),
+            num_inference_steps=kwargs["num_inference_steps"],
+            guidance_scale=kwargs["guidance_scale"],
+            seed=GenerationValidator.validate_seed(body.seed),
+            output_format=output.output_format,
+            quality=output.quality,
+            compress_level=output.compress_level,
+            model=model_name,
+            tenant=tenant or DEFAULT_TENANT,
+            priority=GenerationValidator.validate_priority(
+                body.priority, default_priority
+            ),
+            num_images=num_images,
+        )
+
+    def _max_images(self, model_name: str, img_size: int) -> int:
+        """Images one request may ask for: the model's cap, lowered to what fits.
+
+        Once the memory policy is calibrated for the model, the cap is also
+        bounded by how many images of this size fit in free device memory.
+        """
+        limit = MODEL_CONFIGS[model_name]["max_images"]
+        fits = self.memory_policy.max_batch(model_name, img_size)
+        if fits is not None:
+            limit = max(1, min(limit, fits))
+        return limit
+
+    async def _run_generation(
+        self,
+        request: GenerationRequest,
+        progress: Optional[ProgressSink] = None,
+        deadline_s: Optional[float] = None,
+        force_admit: bool = False,
+        profile: bool = False,
+    ) -> GenerationResult:
+        """Serve a validated request from the cache or the model.
+
+        A request for several images uses consecutive seeds from its seed
+        (or random ones), runs them in one pipeline call and returns a zip
+        of the encoded images; it is served from the cache only when every
+        image is cached. A request that is ``profile``d, or that takes one
+        of the captures armed through ``/admin/profile``, has its pipeline
+        call profiled and gets the trace id in ``X-Profile-Trace-Id``;
+        profiled requests skip the cache. Armed captures are only claimed by
+        requests that are admitted and queued. Cache hits are always served.
+        Otherwise the request must pass admission control:
+        ``AdmissionRejected`` is raised when it could not finish within the
+        SLA or ``deadline_s``, unless ``force_admit`` is set. Raises
+        ``QueueFullError`` when the inference queue is at capacity and
+        ``HTTPException`` for every other failure.
+        """
+        loop = asyncio.get_running_loop()
+        model_name = request.model or self.model_name
+        output = request.output
+        headers = {}
+        if output.output_format == "raw":
+            headers = {
+                "X-Image-Width": str(request.img_size),
+                "X-Image-Height": str(request.img_size),
+                "X-Image-Mode": "RGB",
+            }
+        if request.seed is None:
+            seeds = [
+                random.randint(0, GenerationValidator.MAX_SEED)
+                for _ in range(request.num_images)
+            ]
+        else:
+            seeds = [
+                (request.seed + i) % (GenerationValidator.MAX_SEED + 1)
+                for i in range(request.num_images)
+            ]
+        cache_keys: List[str] = []
+        if self.result_cache is not None and request.seed is not None and not profile:
+            cache_keys = [
+                ResultCache.make_key(
+                    model_name,
+                    request.prompt,
+                    request.img_size,
+                    request.num_inference_steps,
+                    request.guidance_scale,
+                    seed,
+                    output.cache_tag(),
+                )
+                for seed in seeds
+            ]
+            cached = [
+                await loop.run_in_executor(None, self.result_cache.get, key)
+                for key in cache_keys
+            ]
+            if all(content is not None for content in cached):
+                for content in cached:
+                    self.metrics.response_bytes.labels(output.output_format).observe(
+                        len(content)
+                    )
+                headers["X-Cache"] = "HIT"
+                return self._generation_result(cached, seeds, output, headers)
+        if model_name == self.model_name and not self.model_status.is_loaded:
+            raise HTTPException(
+                status_code=503,
+                detail=f"Model is not available. Error: {self.model_status.error}",
+            )
+        ticket = self.admission.admit(
+            model_name,
+            request.img_size,
+            request.num_inference_steps,
+            deadline_s=deadline_s,
+            force=force_admit,
+            images=len(seeds),
+        )
+        headers["X-Estimated-Wait"] = f"{ticket.estimated_wait_s:.1f}"
+        armed = not profile and self.profiler.take()
+        profile = profile or armed
+        batch_key = (
+            model_name,
+            request.img_size,
+            request.num_inference_steps,
+            request.guidance_scale,
+        )
+        item = BatchItem(request.prompt, seeds, progress, profile=profile)
+        try:
+            images = await self.batcher.submit(
+                batch_key,
+                item,
+                tenant=request.tenant,
+                priority=request.priority,
+                cost=ticket.cost_s,
+                images=len(seeds),
+            )
+        except QueueFullError:
+            if armed:
+                self.profiler.give_back()
+            raise
+        except ModelLoadError as e:
+            # Drop whatever a failed load or promotion left behind, so the next
+            # request loads the model afresh.
+            logger.error(str(e))
+            if model_name == self.model_name:
+                self.model_status.error = str(e)
+            await self.inference_executor.run(
+                self.model_pool.evict, model_name, f"load failed: {e}"
+            )
+            raise HTTPException(status_code=503, detail=str(e))
+        except Exception as e:
+            # The model is still usable; only this request failed.
+            logger.error(f"Error generating image with {model_name}: {e}")
+            raise HTTPException(
+                status_code=500, detail=f"Error generating image: {str(e)}"
+            )
+        finally:
+            self.admission.release(ticket)
+        encoded = await asyncio.gather(
+            *(self.image_encoder.encode(image, output) for image in images)
+        )
+        for image in encoded:
+            self.metrics.observe_response(
+                output.output_format, image.encode_s, len(image.content)
+            )
+        for key, image in zip(cache_keys, encoded):
+            await loop.run_in_executor(None, self.result_cache.put, key, image.content)
+        headers["X-Cache"] = "MISS"
+        if item.trace_id is not None:
+            headers["X-Profile-Trace-Id"] = item.trace_id
+        if item.peak_memory_bytes:
+            self.metrics.observe_request_memory(model_name, item.peak_memory_bytes)
+            headers["X-Peak-Device-Memory"] = str(item.peak_memory_bytes)
+        return self._generation_result(
+            [image.content for image in encoded], seeds, output, headers
+        )
+
+    @staticmethod
+    def _generation_result(
+        contents: Sequence[bytes],
+        seeds: Sequence[int],
+        output: OutputOptions,
+        headers: Dict[str, str],
+    ) -> GenerationResult:
+        """A single image as is, or several as a zip listing seeds in ``X-Seeds``."""
+        headers["X-Seed"] = str(seeds[0])
+        if len(contents) == 1:
+            return GenerationResult(
+                content=contents[0], media_type=output.media_type, headers=headers
+            )
+        headers["X-Seeds"] = ",".join(map(str, seeds))
+        headers["X-Image-Media-Type"] = output.media_type
+        return GenerationResult(
+            content=_pack_images(contents, seeds, output.output_format),
+            media_type="application/zip",
+            headers=headers,
+        )
+
+    def _flight_key(
+        self, request: GenerationRequest, deadline_s: Optional[float]
+    ) -> Optional[Tuple[Any, ...]]:
+        """What two requests must share to be served by one generation.
+
+        Besides everything that determines the bytes, the tenant, priority
+        and deadline are included: a request that joins a flight skips its
+        own admission check and fair-queue charge, so it may only join one
+        that was admitted and charged exactly as it would have been.
+        """
+        if not COALESCE_ENABLED or request.seed is None:
+            return None
+        return (
+            request.tenant,
+            request.priority,
+            deadline_s,
+            request.model or self.model_name,
+            request.prompt,
+            request.img_size,
+            request.num_inference_steps,
+            request.guidance_scale,
+            request.seed,
+            request.num_images,
+            request.output.cache_tag(),
+        )
+
+    async def _run_coalesced(
+        self,
+        request: GenerationRequest,
+        deadline_s: Optional[float] = None,
+        profile: bool = False,
+    ) -> GenerationResult:
+        """``_run_generation``, shared with identical requests already running.
+
+        A retry or double submission from the same tenant, with the same
+        prompt, parameters, seed, priority and deadline, awaits the
+        generation in flight instead of starting another,
+        and gets the same bytes with ``X-Coalesced: 1``. The generation is
+        cancelled only when every request waiting on it has gone. Requests
+        without a seed or that are profiled always run on their own.
+        """
+        run = functools.partial(
+            self._run_generation, request, deadline_s=deadline_s, profile=profile
+        )
+        key = None if profile else self._flight_key(request, deadline_s)
+        if key is None:
+            return await run()
+        result, shared = await self.single_flight.run(key, run)
+        if not shared:
+            return result
+        self.metrics.count_coalesced(request.model or self.model_name)
+        return replace(result, headers=dict(result.headers, **{"X-Coalesced": "1"}))
+
     @app.post("/generate")
     async def generate(
         self,
-        prompt: str = Body(..., description="The prompt for image generation"),
-        img_size: Union[int, str] = Body(512, description="Size of the image"),
-        guidance_scale: Optional[Union[float, int, str]] = Body(
-            None, description="Guidance scale"
-        ),
-        num_inference_steps: Optional[Union[int, str]] = Body(
-            None, description="Number of inference steps"
-        ),
+        body: GenerateBody,
+        accept: Optional[str] = Header(None),
+        x_auth_user: Optional[str] = Header(None),
+        x_profile: Optional[str] = Header(None),
+        x_admin_token: Optional[str] = Header(None),
     ) -> Response:
-        """Generate an image using the loaded model."""
+        """Generate an image using the loaded model.
+
+        Admins may send ``X-Profile: 1`` to profile this request.
+        """
+        model_name = size = None
+        status = 500
+        try:
+            profile = bool(x_profile) and x_profile != "0"
+            if profile:
+                self._require_admin(x_admin_token)
+            request = self._validate_request(body, accept, x_auth_user)
+            model_name, size = request.model, _size_label(request.img_size)
+            result = await self._run_coalesced(
+                request,
+                deadline_s=GenerationValidator.validate_deadline(body.deadline_s),
+                profile=profile,
+            )
+            status = 200
+            return Response(
+                content=result.content,
+                media_type=result.media_type,
+                headers=result.headers,
+            )
+        except AdmissionRejected as e:
+            logger.warning(str(e))
+            status = 429
+            raise HTTPException(
+                status_code=429,
+                detail=str(e),
+                headers={"Retry-After": str(e.retry_after_s)},
+            )
+        except QueueFullError as e:
+            logger.warning(str(e))
+            status = 503
+            raise HTTPException(status_code=503, detail=str(e))
+        except HTTPException as e:
+            status = e.status_code
+            raise
+        except Exception as e:
+            logger.error(f"Unexpected error in generate: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+        finally:
+            self.metrics.count_request("generate", model_name, size, status)
+
+    @app.post("/generate/stream")
+    async def generate_stream(
+        self, body: StreamBody, x_auth_user: Optional[str] = Header(None)
+    ) -> StreamingResponse:
+        """Generate an image, streaming per-step progress as Server-Sent Events."""
+        request = self._validate_request(body, tenant=x_auth_user)
+        if request.num_images != 1:
+            raise HTTPException(
+                status_code=400, detail="Streaming generates one image per request"
+            )
+        deadline_s = GenerationValidator.validate_deadline(body.deadline_s)
+        sink = ProgressSink(
+            asyncio.get_running_loop(),
+            GenerationValidator.validate_preview_every(body.preview_every),
+        )
+        return StreamingResponse(
+            self._stream_generation(request, sink, deadline_s),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    async def _stream_generation(
+        self,
+        request: GenerationRequest,
+        sink: ProgressSink,
+        deadline_s: Optional[float] = None,
+    ) -> AsyncIterator[str]:
+        loop = asyncio.get_running_loop()
+        task = asyncio.create_task(
+            self._run_generation(request, progress=sink, deadline_s=deadline_s)
+        )
         try:
-            GenerationValidator.validate_prompt(prompt)
-            GenerationValidator.validate_image_size(self.model_name, img_size)
-            kwargs = GenerationValidator.validate_generation_params(
-                self.model_name, guidance_scale, num_inference_steps
-            )
-            if not self.model_status.is_loaded:
-                raise HTTPException(
-                    status_code=503,
-                    detail=f"Model is not available. Error: {self.model_status.error}",
+            while True:
+                getter = asyncio.ensure_future(sink.queue.get())
+                done, _ = await asyncio.wait(
+                    {getter, task}, return_when=asyncio.FIRST_COMPLETED
                 )
+                if getter not in done:
+                    getter.cancel()
+                    break
+                yield await self._format_progress(loop, getter.result())
+            while not sink.queue.empty():
+                yield await self._format_progress(loop, sink.queue.get_nowait())
+            status = 500
             try:
-                image = self.model_status.model.generate(
-                    prompt=prompt, height=img_size, width=img_size, **kwargs
+                result = task.result()
+                status = 200
+            except AdmissionRejected as e:
+                status = 429
+                yield _format_sse(
+                    "error",
+                    {
+                        "status_code": 429,
+                        "detail": str(e),
+                        "retry_after_s": e.retry_after_s,
+                    },
+                )
+                return
+            except QueueFullError as e:
+                status = 503
+                yield _format_sse("error", {"status_code": 503, "detail": str(e)})
+                return
+            except HTTPException as e:
+                status = e.status_code
+                yield _format_sse(
+                    "error", {"status_code": e.status_code, "detail": e.detail}
                 )
+                return
             except Exception as e:
-                logger.error(f"Error generating image: {e}")
-                self.model_status.is_loaded = False
-                self.model_status.error = str(e)
-                gc.collect()
-                torch.xpu.empty_cache()
-                raise HTTPException(
-                    status_code=500, detail=f"Error generating image: {str(e)}"
+                logger.error(f"Unexpected error in generate_stream: {e}")
+                yield _format_sse("error", {"status_code": 500, "detail": str(e)})
+                return
+            finally:
+                self.metrics.count_request(
+                    "stream", request.model, _size_label(request.img_size), status
                 )
-            file_stream = BytesIO()
-            image.save(file_stream, "PNG")
-            return Response(content=file_stream.getvalue(), media_type="image/png")
-        except HTTPException:
-            raise
+            yield _format_sse(
+                "result",
+                {
+                    "media_type": result.media_type,
+                    "image": base64.b64encode(result.content).decode("ascii"),
+                    "seed": int(result.headers["X-Seed"]),
+                    "cache": result.headers["X-Cache"],
+                    "progress_overhead_ms": round(sink.overhead_s * 1000, 3),
+                    "profile_trace_id": result.headers.get("X-Profile-Trace-Id"),
+                },
+            )
+        finally:
+            if not task.done():
+                task.cancel()
+
+    @staticmethod
+    async def _format_progress(
+        loop: asyncio.AbstractEventLoop, event: Dict[str, Any]
+    ) -> str:
+        data = {"step": event["step"], "total_steps": event["total_steps"]}
+        if "preview" in event:
+            data["preview"] = await loop.run_in_executor(
+                None, encode_preview, event["preview"]
+            )
+        return _format_sse(event["event"], data)
+
+    def _ensure_job_dispatcher(self) -> None:
+        if self._job_dispatcher is None or self._job_dispatcher.done():
+            self._jobs_wakeup = asyncio.Event()
+            self._job_dispatcher = asyncio.create_task(self._dispatch_jobs())
+
+    def _job_runner(self) -> Callable[[str, Dict[str, Any]], Awaitable[None]]:
+        """Run jobs through the deployment handle so Serve routes and counts them."""
+        try:
+            context = serve.get_replica_context()
+            handle = serve.get_deployment_handle(
+                context.deployment, app_name=context.app_name
+            )
         except Exception as e:
-            logger.error(f"Unexpected error in generate: {e}")
-            raise HTTPException(status_code=500, detail=str(e))
+            logger.warning(f"No deployment handle ({e}), running jobs locally")
+            return self.run_job
+        return lambda job_id, params: handle.run_job.remote(job_id, params)
+
+    async def _dispatch_jobs(self) -> None:
+        """Hand queued jobs to replicas, oldest first."""
+        slots = asyncio.Semaphore(JOB_CONCURRENCY)
+        loop = asyncio.get_running_loop()
+        runner = self._job_runner()
+        while True:
+            await slots.acquire()
+            self._jobs_wakeup.clear()
+            claimed = await loop.run_in_executor(None, self.job_store.claim_next)
+            if claimed is None:
+                slots.release()
+                try:
+                    await asyncio.wait_for(
+                        self._jobs_wakeup.wait(), JOB_POLL_INTERVAL_S
+                    )
+                except asyncio.TimeoutError:
+                    await loop.run_in_executor(
+                        None, self.job_store.purge_finished, JOB_RESULT_TTL_S
+                    )
+                    await loop.run_in_executor(
+                        None, self.job_store.requeue_stale, JOB_STALE_S
+                    )
+                continue
+            job_id, params = claimed
+            asyncio.create_task(self._dispatch_job(runner, job_id, params, slots))
+
+    async def _dispatch_job(
+        self,
+        runner: Callable[[str, Dict[str, Any]], Awaitable[None]],
+        job_id: str,
+        params: Dict[str, Any],
+        slots: asyncio.Semaphore,
+    ) -> None:
+        try:
+            await runner(job_id, params)
+        except Exception as e:
+            logger.warning(f"Could not dispatch job {job_id}, requeueing it: {e}")
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.job_store.requeue, job_id)
+            await asyncio.sleep(JOB_POLL_INTERVAL_S)
+        finally:
+            slots.release()
+
+    async def run_job(self, job_id: str, params: Dict[str, Any]) -> None:
+        """Run a claimed job and store its outcome; called via the deployment handle."""
+        loop = asyncio.get_running_loop()
+        request = None
+        status = 500
+        self._running_jobs.add(job_id)
+        try:
+            request = GenerationRequest(**params)
+            while True:
+                try:
+                    # Jobs have no client waiting on the connection, so they
+                    # are never shed, but still count toward the backlog.
+                    result = await self._run_generation(request, force_admit=True)
+                    break
+                except QueueFullError:
+                    await asyncio.sleep(JOB_POLL_INTERVAL_S)
+            await loop.run_in_executor(
+                None,
+                self.job_store.complete,
+                job_id,
+                result.content,
+                result.media_type,
+                result.headers,
+            )
+            status = 200
+        except HTTPException as e:
+            status = e.status_code
+            await loop.run_in_executor(
+                None, self.job_store.fail, job_id, str(e.detail)
+            )
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}")
+            await loop.run_in_executor(None, self.job_store.fail, job_id, str(e))
+        finally:
+            self._running_jobs.discard(job_id)
+            self.metrics.count_request(
+                "jobs",
+                request.model if request else None,
+                _size_label(request.img_size) if request else None,
+                status,
+            )
+
+    def _seconds_per_image(self) -> Optional[float]:
+        """Average inference time per generated image, if known."""
+        images = self.batcher.images_batched
+        if not images:
+            return None
+        return self.inference_executor.busy_time_s / images
+
+    async def check_health(self) -> None:
+        """Ray Serve health hook; keeps the job dispatcher running.
+
+        Also publishes the replica's inference queue depth, the signal
+        autoscaling acts on, and logs it when it changes, along with each
+        tenant's queue length and share of GPU time, and refreshes the gauges
+        on the replica's metrics port. GPU time used since the
+        last check is reported to the auth service, which charges it against
+        tenant quotas, and jobs running here are heartbeated so other
+        replicas do not requeue them as stale. Raises once
+        ``MAX_CONSECUTIVE_FAILURES`` batches in a row have failed, so Serve
+        replaces the replica.
+        """
+        self._ensure_job_dispatcher()
+        if self._running_jobs:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(
+                None, self.job_store.heartbeat, list(self._running_jobs)
+            )
+        self._update_metric_gauges()
+        depth = self.batcher.queue_depth + self.batcher.in_flight
+        self._queue_depth_gauge.set(depth)
+        service_s: Dict[str, float] = {}
+        for tenant, priorities in self.batcher.tenant_stats().items():
+            for priority, stats in priorities.items():
+                tags = {"tenant": tenant, "priority": priority}
+                self._tenant_queue_gauge.set(stats["queued"], tags=tags)
+                self._tenant_share_gauge.set(stats["share"], tags=tags)
+                service_s[tenant] = service_s.get(tenant, 0.0) + stats["service_s"]
+        if self.usage_reporter.enabled:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.usage_reporter.report, service_s)
+        if depth != self._last_queue_depth:
+            logger.info(
+                f"Replica {self.replica_id} inference queue depth "
+                f"{self._last_queue_depth} -> {depth}"
+            )
+            self._last_queue_depth = depth
+        if self.model_status.is_failing:
+            raise RuntimeError(
+                f"Replica {self.replica_id} is failing: {self.model_status}"
+            )
+
+    @app.post("/jobs", status_code=202)
+    async def submit_job(
+        self, body: GenerateBody, x_auth_user: Optional[str] = Header(None)
+    ) -> Dict[str, Any]:
+        """Queue a generation job and return its id immediately."""
+        request = self._validate_request(
+            body, tenant=x_auth_user, default_priority=PRIORITY_BATCH
+        )
+        loop = asyncio.get_running_loop()
+        counts = await loop.run_in_executor(None, self.job_store.count_by_status)
+        if counts.get(JobStatus.QUEUED, 0) >= JOB_MAX_QUEUED:
+            raise HTTPException(
+                status_code=503,
+                detail=f"Job queue is full ({JOB_MAX_QUEUED} jobs waiting)",
+            )
+        job_id = await loop.run_in_executor(
+            None, self.job_store.create, asdict(request)
+        )
+        self._ensure_job_dispatcher()
+        self._jobs_wakeup.set()
+        return {"job_id": job_id, "status": JobStatus.QUEUED}
+
+    @app.get("/jobs/{job_id}")
+    async def get_job(self, job_id: str) -> Dict[str, Any]:
+        """Get a job's status, queue position and estimated time to finish."""
+        loop = asyncio.get_running_loop()
+        job = await loop.run_in_executor(None, self.job_store.get, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        status = {
+            "job_id": job_id,
+            "status": job["status"],
+            "created_at": job["created_at"],
+            "started_at": job["started_at"],
+            "finished_at": job["finished_at"],
+            "error": job["error"],
+            "position": None,
+            "eta_s": None,
+        }
+        seconds_per_image = self._seconds_per_image()
+        if job["status"] == JobStatus.QUEUED:
+            position = await loop.run_in_executor(
+                None, self.job_store.queue_position, job_id, job["created_at"]
+            )
+            status["position"] = position
+            if seconds_per_image is not None:
+                ahead = position + self.batcher.queue_depth + self.batcher.in_flight
+                status["eta_s"] = round((ahead + 1) * seconds_per_image, 2)
+        elif job["status"] == JobStatus.RUNNING:
+            status["position"] = 0
+            if seconds_per_image is not None:
+                status["eta_s"] = round(seconds_per_image, 2)
+        return status
+
+    @app.get("/jobs/{job_id}/result")
+    def get_job_result(self, job_id: str) -> Response:
+        """Fetch the image produced by a finished job."""
+        job = self.job_store.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        if job["status"] == JobStatus.FAILED:
+            raise HTTPException(
+                status_code=500, detail=f"Job failed: {job['error']}"
+            )
+        result = self.job_store.get_result(job_id)
+        if result is None:
+            raise HTTPException(
+                status_code=409, detail=f"Job is {job['status']}, result not ready"
+            )
+        content, media_type, headers = result
+        return Response(content=content, media_type=media_type, headers=headers)
 
 
 entrypoint = ImageGenerationServer.bind()
@@ -1,6 +1,8 @@
 import streamlit as st
 import requests
+import io
 import os
+import zipfile
 from pathlib import Path
 from datetime import datetime
 import re
@@ -397,9 +399,17 @@ def main():
             with col1:
                 img_size = st.select_slider(
                     "Image Size",
-                    options=[512, 576, 640, 704, 768, 832, 896, 960, 1024],
+                    options=[512, 640, 768, 896, 1024],
                     value=512,
                 )
+            with col2:
+                num_images = st.number_input(
+                    "Images",
+                    min_value=1,
+                    max_value=4,
+                    value=1,
+                    help="Candidates generated together in one request",
+                )
             with st.expander("⚙️ Advanced Configuration", expanded=False):
                 adv_col1, adv_col2 = st.columns(2)
                 with adv_col1:
@@ -432,6 +442,7 @@ def main():
                         "img_size": img_size,
                         "num_inference_steps": inference_steps,
                         "guidance_scale": guidance_scale,
+                        "num_images": num_images,
                     }
 
                     with st.spinner("Generating image..."):
@@ -439,19 +450,24 @@ def main():
                             response = config.api_client.make_request(
                                 "generate", method="POST", data=params
                             )
-                            image_data = response.content
+                            if response.headers.get("Content-Type") == "application/zip":
+                                with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+                                    images = [archive.read(n) for n in archive.namelist()]
+                            else:
+                                images = [response.content]
                             timestamp = datetime.now().isoformat()
-                            image_path = config.output_dir / f"image_{timestamp}.png"
-                            safe_save_image(image_path, image_data)
                             history = config.history_manager.load()
-                            history.append(
-                                {
-                                    "prompt": cleaned_prompt,
-                                    "timestamp": timestamp,
-                                    "path": str(image_path),
-                                    "parameters": params,
-                                }
-                            )
+                            for i, image_data in enumerate(images):
+                                image_path = config.output_dir / f"image_{timestamp}_{i}.png"
+                                safe_save_image(image_path, image_data)
+                                history.append(
+                                    {
+                                        "prompt": cleaned_prompt,
+                                        "timestamp": timestamp,
+                                        "path": str(image_path),
+                                        "parameters": params,
+                                    }
+                                )
                             config.history_manager.save(history)
                             st.success("✨ Image generated successfully!")
                         except Exception as e:
@@ -2,11 +2,17 @@
 set -e
 set -x
 
+SERVE_CONFIG=serve_config.yaml
+if [ "${AUTOSCALING_ENABLED:-0}" = "1" ]; then
+    SERVE_CONFIG=serve_config.autoscale.yaml
+fi
+
 ray start --head --disable-usage-stats \
     --node-ip-address="0.0.0.0" \
     --port=6379 \
     --dashboard-host="0.0.0.0" \
-    --dashboard-port=8265
+    --dashboard-port=8265 \
+    --resources="{\"xpu_tile\": ${DEVICES_PER_NODE:-1}}"
 
-serve deploy serve_config.yaml
+serve deploy "$SERVE_CONFIG"
 tail -f /dev/null
@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# Let the unit tests import ``utils`` and ``auth`` modules from the repo root.
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "auth"))
@@ -0,0 +1,70 @@
+import pytest
+
+from utils.admission import AdmissionController, AdmissionRejected, CostModel
+
+
+def test_cost_model_starts_from_prior_and_follows_observations():
+    model = CostModel(prior_s_per_mpix_step=0.1, alpha=0.5)
+    # 1000px is 1 megapixel; 10 steps is 10 megapixel-steps.
+    assert model.estimate("m", 1000, 10) == pytest.approx(1.0)
+    model.observe("m", 1000, 10, batch_size=2, elapsed_s=4.0)
+    assert model.estimate("m", 1000, 10) == pytest.approx(2.0)
+    model.observe("m", 1000, 10, batch_size=1, elapsed_s=4.0)
+    assert model.estimate("m", 1000, 10) == pytest.approx(3.0)
+    assert model.estimate("other", 1000, 10) == pytest.approx(1.0)
+
+
+def test_cost_model_ignores_empty_observations():
+    model = CostModel(prior_s_per_mpix_step=0.1)
+    model.observe("m", 1000, 10, batch_size=1, elapsed_s=0.0)
+    assert model.get_stats()["observations"] == {}
+
+
+def test_requests_are_admitted_until_backlog_exceeds_sla():
+    controller = AdmissionController(CostModel(0.1), sla_s=2.5)
+    first = controller.admit("m", 1000, 10)
+    second = controller.admit("m", 1000, 10)
+    assert (first.estimated_wait_s, second.estimated_wait_s) == (1.0, 2.0)
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit("m", 1000, 10)
+    assert rejected.value.retry_after_s == 1
+    assert controller.get_stats()["rejected"] == 1
+
+
+def test_release_frees_capacity():
+    controller = AdmissionController(CostModel(0.1), sla_s=1.5)
+    ticket = controller.admit("m", 1000, 10)
+    with pytest.raises(AdmissionRejected):
+        controller.admit("m", 1000, 10)
+    controller.release(ticket)
+    controller.admit("m", 1000, 10)
+    assert controller.in_flight == 1
+
+
+def test_deadline_tighter_than_sla_is_honoured():
+    controller = AdmissionController(CostModel(0.1), sla_s=60)
+    with pytest.raises(AdmissionRejected):
+        controller.admit("m", 1000, 10, deadline_s=0.5)
+    controller.admit("m", 1000, 10, deadline_s=5)
+
+
+def test_images_scale_cost():
+    controller = AdmissionController(CostModel(0.1), sla_s=60)
+    ticket = controller.admit("m", 1000, 10, images=4)
+    assert ticket.cost_s == pytest.approx(4.0)
+
+
+def test_forced_requests_are_admitted_but_counted():
+    controller = AdmissionController(CostModel(0.1), sla_s=0.5)
+    controller.admit("m", 1000, 10, force=True)
+    assert controller.backlog_s == pytest.approx(1.0)
+    assert controller.forced == 1
+    with pytest.raises(AdmissionRejected):
+        controller.admit("m", 1000, 1)
+
+
+def test_disabled_controller_admits_everything():
+    controller = AdmissionController(CostModel(0.1), sla_s=0.1, enabled=False)
+    for _ in range(5):
+        controller.admit("m", 1000, 10)
+    assert controller.rejected == 0
@@ -0,0 +1,87 @@
+#!/bin/bash
+# Exercise queue-depth autoscaling on a local CPU-only Ray cluster.
+#
+# Uses the tiny random-weight "sd-tiny" model on CPU and fake "xpu_tile"
+# resources, sends a burst of requests and prints the replica count while
+# the deployment scales up and back down. Run from the repository root.
+
+GREEN='\033[0;32m'
+RED='\033[0;31m'
+YELLOW='\033[1;33m'
+NC='\033[0m'
+
+export INFERENCE_DEVICE=cpu
+export DEFAULT_MODEL=sd-tiny
+export SERVED_MODELS=sd-tiny
+export AUTOSCALING_ENABLED=1
+export MIN_REPLICAS=1
+export MAX_REPLICAS=3
+export TARGET_ONGOING_REQUESTS=2
+export UPSCALE_DELAY_S=5
+export DOWNSCALE_DELAY_S=30
+export REPLICA_NUM_CPUS=1
+export REPLICA_RESOURCES='{"xpu_tile": 1}'
+export MAX_BATCH_SIZE=1
+export WARMUP_ENABLED=0
+export PIPELINE_SNAPSHOT_ENABLED=0
+export RESULT_CACHE_ENABLED=0
+export JOB_DB_PATH=$(mktemp -d)/jobs.sqlite3
+
+BURST=${BURST:-200}
+URL=http://localhost:8000
+
+cleanup() {
+    serve shutdown -y >/dev/null 2>&1
+    ray stop >/dev/null 2>&1
+}
+trap cleanup EXIT
+
+replicas() {
+    serve status 2>/dev/null | grep -A3 "replica_states" | grep -o "RUNNING: [0-9]*" | grep -o "[0-9]*"
+}
+
+echo -e "${YELLOW}Starting local Ray cluster with 3 fake tiles...${NC}"
+ray start --head --num-cpus=4 --resources='{"xpu_tile": 3}' --disable-usage-stats >/dev/null
+serve run serve:entrypoint >serve_autoscale_test.log 2>&1 &
+
+for _ in $(seq 1 120); do
+    if curl -sf "$URL/health/ready" >/dev/null; then
+        break
+    fi
+    sleep 2
+done
+if ! curl -sf "$URL/health/ready" >/dev/null; then
+    echo -e "${RED}✗ Service did not become ready, see serve_autoscale_test.log${NC}"
+    exit 1
+fi
+echo -e "${GREEN}✓ Service ready with $(replicas) replica(s)${NC}"
+
+echo -e "${YELLOW}Sending $BURST requests...${NC}"
+for i in $(seq 1 "$BURST"); do
+    curl -s -o /dev/null -X POST "$URL/generate" \
+        -H "Content-Type: application/json" \
+        -d "{\"prompt\": \"autoscaling test $i\", \"img_size\": 64, \"num_inference_steps\": 50}" &
+done
+
+MAX_SEEN=0
+for _ in $(seq 1 30); do
+    COUNT=$(replicas)
+    echo "$(date +%T) running replicas: ${COUNT:-?}"
+    if [ -n "$COUNT" ] && [ "$COUNT" -gt "$MAX_SEEN" ]; then
+        MAX_SEEN=$COUNT
+    fi
+    sleep 5
+done
+wait
+
+if [ "$MAX_SEEN" -gt 1 ]; then
+    echo -e "${GREEN}✓ Scaled up to $MAX_SEEN replicas under load${NC}"
+else
+    echo -e "${RED}✗ Deployment did not scale up${NC}"
+    exit 1
+fi
+
+echo -e "${YELLOW}Waiting for scale-down...${NC}"
+sleep $((${DOWNSCALE_DELAY_S%.*} + 30))
+echo "$(date +%T) running replicas: $(replicas)"
+grep -h "ready on\|shutting down" /tmp/ray/session_latest/logs/serve/replica_*.log 2>/dev/null | tail -n 10
@@ -0,0 +1,235 @@
+import asyncio
+import threading
+
+import pytest
+
+from utils.batching import MicroBatcher, QueueFullError
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def recording_batcher(calls, **kwargs):
+    async def batch_fn(key, payloads):
+        calls.append((key, list(payloads)))
+        return [f"{key}:{payload}" for payload in payloads]
+
+    return MicroBatcher(batch_fn, **kwargs)
+
+
+def test_concurrent_requests_with_same_key_share_a_batch():
+    calls = []
+    batcher = recording_batcher(calls, max_batch_size=4, batch_wait_timeout_s=0.05)
+
+    async def main():
+        return await asyncio.gather(*(batcher.submit("k", i) for i in range(3)))
+
+    assert run(main()) == ["k:0", "k:1", "k:2"]
+    assert calls == [("k", [0, 1, 2])]
+    assert batcher.batches_run == 1
+    assert batcher.images_batched == 3
+
+
+def test_full_batch_runs_without_waiting_for_timeout():
+    calls = []
+    batcher = recording_batcher(calls, max_batch_size=2, batch_wait_timeout_s=10)
+
+    async def main():
+        return await asyncio.wait_for(
+            asyncio.gather(batcher.submit("k", 0), batcher.submit("k", 1)), 1
+        )
+
+    assert run(main()) == ["k:0", "k:1"]
+    assert calls == [("k", [0, 1])]
+
+
+def test_batch_is_split_at_max_batch_size_in_images():
+    calls = []
+    batcher = recording_batcher(calls, max_batch_size=3, batch_wait_timeout_s=0.05)
+
+    async def main():
+        return await asyncio.gather(
+            batcher.submit("k", "a", images=2),
+            batcher.submit("k", "b", images=2),
+            batcher.submit("k", "c", images=1),
+        )
+
+    run(main())
+    assert [payloads for _, payloads in calls] == [["a"], ["b", "c"]]
+
+
+def test_oversized_request_runs_on_its_own():
+    calls = []
+    batcher = recording_batcher(calls, max_batch_size=2, batch_wait_timeout_s=0.01)
+
+    async def main():
+        return await batcher.submit("k", "big", images=5)
+
+    assert run(main()) == "k:big"
+    assert calls == [("k", ["big"])]
+
+
+def test_different_keys_run_in_separate_batches():
+    calls = []
+    batcher = recording_batcher(calls, max_batch_size=4, batch_wait_timeout_s=0.02)
+
+    async def main():
+        return await asyncio.gather(batcher.submit("a", 1), batcher.submit("b", 2))
+
+    assert run(main()) == ["a:1", "b:2"]
+    assert sorted(calls) == [("a", [1]), ("b", [2])]
+
+
+def test_returned_exception_fails_only_that_request():
+    async def batch_fn(key, payloads):
+        return [ValueError(p) if p == "bad" else p for p in payloads]
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=4, batch_wait_timeout_s=0.05)
+
+    async def main():
+        return await asyncio.gather(
+            batcher.submit("k", "a"),
+            batcher.submit("k", "bad"),
+            batcher.submit("k", "c"),
+            return_exceptions=True,
+        )
+
+    a, bad, c = run(main())
+    assert (a, c) == ("a", "c")
+    assert isinstance(bad, ValueError)
+
+
+def test_raised_exception_fails_the_whole_batch():
+    async def batch_fn(key, payloads):
+        raise RuntimeError("device lost")
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=4, batch_wait_timeout_s=0.05)
+
+    async def main():
+        return await asyncio.gather(
+            batcher.submit("k", 1), batcher.submit("k", 2), return_exceptions=True
+        )
+
+    assert all(isinstance(r, RuntimeError) for r in run(main()))
+
+
+def test_submit_rejects_when_queue_is_full():
+    async def batch_fn(key, payloads):
+        return payloads
+
+    batcher = MicroBatcher(
+        batch_fn, max_batch_size=8, batch_wait_timeout_s=1, max_queue_size=2
+    )
+
+    async def main():
+        waiting = [asyncio.ensure_future(batcher.submit("k", i)) for i in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFullError):
+            await batcher.submit("k", 2)
+        for task in waiting:
+            task.cancel()
+        await asyncio.gather(*waiting, return_exceptions=True)
+
+    run(main())
+    assert batcher.rejected == 1
+
+
+def test_weighted_flows_share_batches_in_proportion():
+    order = []
+
+    async def batch_fn(key, payloads):
+        order.extend(payloads)
+        return payloads
+
+    batcher = MicroBatcher(
+        batch_fn,
+        max_batch_size=1,
+        batch_wait_timeout_s=0,
+        priority_weights={"interactive": 3.0, "batch": 1.0},
+    )
+
+    async def main():
+        requests = [
+            batcher.submit("k", ("batch", i), tenant="t", priority="batch")
+            for i in range(8)
+        ] + [
+            batcher.submit("k", ("interactive", i), tenant="t", priority="interactive")
+            for i in range(8)
+        ]
+        await asyncio.gather(*requests)
+
+    run(main())
+    first_eight = [priority for priority, _ in order[:8]]
+    assert first_eight.count("interactive") == 6
+    assert first_eight.count("batch") == 2
+
+
+def test_tenant_with_many_requests_does_not_starve_another():
+    order = []
+
+    async def batch_fn(key, payloads):
+        order.extend(payloads)
+        return payloads
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=1, batch_wait_timeout_s=0)
+
+    async def main():
+        bulk = [batcher.submit("k", ("bulk", i), tenant="bulk") for i in range(10)]
+        ui = [batcher.submit("k", ("ui", i), tenant="ui") for i in range(2)]
+        await asyncio.gather(*bulk, *ui)
+
+    run(main())
+    ui_positions = [i for i, (tenant, _) in enumerate(order) if tenant == "ui"]
+    assert ui_positions[-1] < 5
+
+
+def test_tenant_stats_report_service_per_flow():
+    async def batch_fn(key, payloads):
+        return payloads
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=4, batch_wait_timeout_s=0)
+
+    async def main():
+        await asyncio.gather(
+            batcher.submit("k", 1, tenant="a"),
+            batcher.submit("k", 2, tenant="b", priority="batch"),
+        )
+
+    run(main())
+    stats = batcher.tenant_stats()
+    assert stats["a"]["interactive"]["served"] == 1
+    assert stats["b"]["batch"]["served"] == 1
+    assert stats["a"]["interactive"]["queued"] == 0
+
+
+def test_stats_can_be_read_from_another_thread_while_submitting():
+    async def batch_fn(key, payloads):
+        await asyncio.sleep(0)
+        return payloads
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=2, batch_wait_timeout_s=0)
+    errors = []
+    done = threading.Event()
+
+    def read_stats():
+        while not done.is_set():
+            try:
+                batcher.get_stats()
+            except RuntimeError as e:
+                errors.append(e)
+
+    reader = threading.Thread(target=read_stats)
+    reader.start()
+
+    async def main():
+        await asyncio.gather(
+            *(batcher.submit("k", i, tenant=f"t{i % 7}") for i in range(2000))
+        )
+
+    try:
+        run(main())
+    finally:
+        done.set()
+        reader.join()
+    assert errors == []
@@ -0,0 +1,123 @@
+import sqlite3
+import time
+
+from utils.job_store import JobStatus, JobStore
+
+
+def make_store(tmp_path, **kwargs):
+    return JobStore(str(tmp_path / "jobs.sqlite3"), **kwargs)
+
+
+def test_claims_oldest_queued_job_once(tmp_path):
+    store = make_store(tmp_path)
+    first = store.create({"prompt": "a"})
+    second = store.create({"prompt": "b"})
+    assert store.claim_next() == (first, {"prompt": "a"})
+    assert store.claim_next() == (second, {"prompt": "b"})
+    assert store.claim_next() is None
+    assert store.get(first)["status"] == JobStatus.RUNNING
+
+
+def test_two_stores_on_one_database_never_claim_the_same_job(tmp_path):
+    a = make_store(tmp_path)
+    b = make_store(tmp_path, requeue_running=False)
+    ids = {a.create({}) for _ in range(10)}
+    claimed = []
+    for store in [a, b] * 6:
+        job = store.claim_next()
+        if job is not None:
+            claimed.append(job[0])
+    assert sorted(claimed) == sorted(ids)
+
+
+def test_complete_and_fail_store_outcome(tmp_path):
+    store = make_store(tmp_path)
+    done = store.create({})
+    failed = store.create({})
+    store.claim_next()
+    store.claim_next()
+    store.complete(done, b"png", "image/png", {"X-Seed": "1"})
+    store.fail(failed, "boom")
+    assert store.get_result(done) == (b"png", "image/png", {"X-Seed": "1"})
+    assert store.get_result(failed) is None
+    assert store.get(failed)["error"] == "boom"
+    assert store.count_by_status() == {
+        JobStatus.SUCCEEDED: 1,
+        JobStatus.FAILED: 1,
+    }
+
+
+def test_requeue_puts_running_job_back(tmp_path):
+    store = make_store(tmp_path)
+    job_id = store.create({})
+    store.claim_next()
+    store.requeue(job_id)
+    assert store.get(job_id)["status"] == JobStatus.QUEUED
+    assert store.claim_next()[0] == job_id
+
+
+def test_queue_position_counts_older_queued_jobs(tmp_path):
+    store = make_store(tmp_path)
+    ids = [store.create({}) for _ in range(3)]
+    last = store.get(ids[2])
+    assert store.queue_position(ids[2], last["created_at"]) == 2
+    store.claim_next()
+    assert store.queue_position(ids[2], last["created_at"]) == 1
+
+
+def test_stale_jobs_are_requeued_unless_heartbeated(tmp_path):
+    store = make_store(tmp_path)
+    quiet = store.create({})
+    alive = store.create({})
+    store.claim_next()
+    store.claim_next()
+    time.sleep(0.2)
+    store.heartbeat([alive])
+    assert store.requeue_stale(0.1) == 1
+    assert store.get(quiet)["status"] == JobStatus.QUEUED
+    assert store.get(alive)["status"] == JobStatus.RUNNING
+
+
+def test_restart_requeues_running_jobs(tmp_path):
+    store = make_store(tmp_path)
+    job_id = store.create({})
+    store.claim_next()
+    restarted = make_store(tmp_path)
+    assert restarted.get(job_id)["status"] == JobStatus.QUEUED
+
+
+def test_shared_database_start_leaves_running_jobs(tmp_path):
+    store = make_store(tmp_path)
+    job_id = store.create({})
+    store.claim_next()
+    make_store(tmp_path, requeue_running=False)
+    assert store.get(job_id)["status"] == JobStatus.RUNNING
+
+
+def test_database_without_heartbeat_column_is_upgraded(tmp_path):
+    path = tmp_path / "jobs.sqlite3"
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE jobs (id TEXT PRIMARY KEY, status TEXT NOT NULL, "
+        "params TEXT NOT NULL, created_at REAL NOT NULL, started_at REAL, "
+        "finished_at REAL, error TEXT, result BLOB, media_type TEXT, headers TEXT)"
+    )
+    conn.commit()
+    conn.close()
+    store = JobStore(str(path))
+    job_id = store.create({})
+    store.claim_next()
+    store.heartbeat([job_id])
+    assert store.requeue_stale(60) == 0
+
+
+def test_purge_deletes_only_old_finished_jobs(tmp_path):
+    store = make_store(tmp_path)
+    finished = store.create({})
+    queued = store.create({})
+    store.claim_next()
+    store.complete(finished, b"", "image/png")
+    assert store.purge_finished(60) == 0
+    assert store.purge_finished(-1) == 1
+    assert store.get(finished) is None
+    assert store.get(queued) is not None
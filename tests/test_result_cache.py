@@ -0,0 +1,71 @@
+import os
+import time
+
+from utils.result_cache import DiskTier, ResultCache
+
+
+def test_key_ignores_whitespace_but_not_parameters():
+    key = ResultCache.make_key("m", "a  cat", 512, 4, 0.0, 1)
+    assert key == ResultCache.make_key("m", " a cat ", 512, 4, 0.0, 1)
+    assert key != ResultCache.make_key("m", "a cat", 512, 4, 0.0, 2)
+    assert key != ResultCache.make_key("m", "a cat", 512, 4, 0.0, 1, "webp")
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = ResultCache(memory_bytes=20)
+    cache.put("a", b"x" * 10)
+    cache.put("b", b"y" * 10)
+    cache.get("a")
+    cache.put("c", b"z" * 10)
+    assert cache.get("a") == b"x" * 10
+    assert cache.get("b") is None
+    assert cache.get("c") == b"z" * 10
+
+
+def test_disk_hit_is_promoted_to_memory(tmp_path):
+    cache = ResultCache(memory_bytes=10, disk_dir=str(tmp_path), disk_bytes=100)
+    cache.put("a", b"x" * 10)
+    cache.put("b", b"y" * 10)
+    assert cache.memory.get("a") is None
+    assert cache.get("a") == b"x" * 10
+    assert cache.memory.get("a") == b"x" * 10
+
+
+def test_disk_tier_evicts_oldest_files_to_low_watermark(tmp_path):
+    disk = DiskTier(str(tmp_path), max_bytes=100)
+    for i in range(10):
+        disk.put(f"k{i}", b"x" * 10)
+        os.utime(tmp_path / f"k{i}.bin", (i, i))
+    disk.put("new", b"y" * 10)
+    assert disk.current_bytes <= 90
+    assert disk.get("k0") is None
+    assert disk.get("new") == b"y" * 10
+    assert disk.evictions >= 2
+
+
+def test_disk_tier_skips_results_larger_than_budget(tmp_path):
+    disk = DiskTier(str(tmp_path), max_bytes=10)
+    disk.put("big", b"x" * 11)
+    assert disk.get("big") is None
+
+
+def test_disk_tier_reindexes_existing_files(tmp_path):
+    DiskTier(str(tmp_path), max_bytes=100).put("a", b"x" * 10)
+    reopened = DiskTier(str(tmp_path), max_bytes=100)
+    assert reopened.entries == 1
+    assert reopened.current_bytes == 10
+    assert reopened.get("a") == b"x" * 10
+
+
+def test_replicas_sharing_a_directory_see_each_other_and_stay_in_budget(tmp_path):
+    a = DiskTier(str(tmp_path), max_bytes=100)
+    b = DiskTier(str(tmp_path), max_bytes=100)
+    a.RESCAN_INTERVAL_S = b.RESCAN_INTERVAL_S = 0
+    for i in range(8):
+        a.put(f"a{i}", b"x" * 10)
+        time.sleep(0.01)
+        b.put(f"b{i}", b"y" * 10)
+        time.sleep(0.01)
+    assert b.get("a7") == b"x" * 10
+    on_disk = sum(p.stat().st_size for p in tmp_path.glob("*.bin"))
+    assert on_disk <= 100
@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+from utils.single_flight import SingleFlight
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_concurrent_callers_share_one_computation():
+    flights = SingleFlight()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "image"
+
+    async def main():
+        return await asyncio.gather(*(flights.run("k", compute) for _ in range(3)))
+
+    results = run(main())
+    assert [value for value, _ in results] == ["image"] * 3
+    assert [shared for _, shared in results] == [False, True, True]
+    assert len(calls) == 1
+    assert flights.get_stats()["coalesced"] == 2
+
+
+def test_different_keys_run_separately():
+    flights = SingleFlight()
+
+    async def main():
+        return await asyncio.gather(
+            flights.run("a", lambda: asyncio.sleep(0, "a")),
+            flights.run("b", lambda: asyncio.sleep(0, "b")),
+        )
+
+    assert run(main()) == [("a", False), ("b", False)]
+
+
+def test_key_is_forgotten_once_finished():
+    flights = SingleFlight()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return len(calls)
+
+    async def main():
+        first = await flights.run("k", compute)
+        second = await flights.run("k", compute)
+        return first, second
+
+    assert run(main()) == ((1, False), (2, False))
+    assert flights.get_stats()["in_flight"] == 0
+
+
+def test_exception_is_shared_by_every_caller():
+    flights = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        return await asyncio.gather(
+            flights.run("k", compute),
+            flights.run("k", compute),
+            return_exceptions=True,
+        )
+
+    assert all(isinstance(r, ValueError) for r in run(main()))
+
+
+def test_computation_survives_until_last_caller_leaves():
+    flights = SingleFlight()
+    finished = []
+
+    async def compute():
+        await asyncio.sleep(0.05)
+        finished.append(1)
+        return "done"
+
+    async def main():
+        leaving = asyncio.ensure_future(flights.run("k", compute))
+        staying = asyncio.ensure_future(flights.run("k", compute))
+        await asyncio.sleep(0.01)
+        leaving.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leaving
+        return await staying
+
+    assert run(main()) == ("done", True)
+    assert finished == [1]
+    assert flights.get_stats()["abandoned"] == 0
+
+
+def test_computation_is_cancelled_when_every_caller_leaves():
+    flights = SingleFlight()
+    finished = []
+
+    async def compute():
+        await asyncio.sleep(0.05)
+        finished.append(1)
+
+    async def main():
+        callers = [asyncio.ensure_future(flights.run("k", compute)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0.08)
+
+    run(main())
+    assert finished == []
+    assert flights.get_stats()["abandoned"] == 1
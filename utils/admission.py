@@ -0,0 +1,158 @@
+import logging
+import math
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request could not finish within its time limit."""
+
+    def __init__(self, predicted_s: float, limit_s: float, retry_after_s: int):
+        super().__init__(
+            f"Server is overloaded: request would finish in ~{predicted_s:.0f}s, "
+            f"limit is {limit_s:.0f}s"
+        )
+        self.predicted_s = predicted_s
+        self.limit_s = limit_s
+        self.retry_after_s = retry_after_s
+
+
+class CostModel:
+    """Predict inference seconds per image from model, image size and steps.
+
+    The cost of an image is taken to be proportional to megapixels times
+    denoising steps. The per-model factor starts from ``prior_s_per_mpix_step``
+    and follows an exponential moving average of observed batch latencies,
+    divided evenly over the images in each batch.
+    """
+
+    def __init__(self, prior_s_per_mpix_step: float = 0.1, alpha: float = 0.2):
+        self.prior_s_per_mpix_step = prior_s_per_mpix_step
+        self.alpha = alpha
+        self._s_per_mpix_step: Dict[str, float] = {}
+        self._observations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def units(img_size: int, steps: int) -> float:
+        return (img_size * img_size / 1e6) * steps
+
+    def estimate(self, model_name: str, img_size: int, steps: int) -> float:
+        """Predicted seconds of inference for one image."""
+        with self._lock:
+            factor = self._s_per_mpix_step.get(model_name, self.prior_s_per_mpix_step)
+        return factor * self.units(img_size, steps)
+
+    def observe(
+        self,
+        model_name: str,
+        img_size: int,
+        steps: int,
+        batch_size: int,
+        elapsed_s: float,
+    ) -> None:
+        """Fold a measured batch latency into the model's cost factor."""
+        units = self.units(img_size, steps) * batch_size
+        if units <= 0 or elapsed_s <= 0:
+            return
+        sample = elapsed_s / units
+        with self._lock:
+            current = self._s_per_mpix_step.get(model_name)
+            self._s_per_mpix_step[model_name] = (
+                sample
+                if current is None
+                else (1 - self.alpha) * current + self.alpha * sample
+            )
+            self._observations[model_name] = self._observations.get(model_name, 0) + 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "prior_s_per_mpix_step": self.prior_s_per_mpix_step,
+                "s_per_mpix_step": {
+                    name: round(factor, 5)
+                    for name, factor in self._s_per_mpix_step.items()
+                },
+                "observations": dict(self._observations),
+            }
+
+
+@dataclass
+class AdmissionTicket:
+    """Work reserved for an admitted request until it finishes."""
+
+    cost_s: float
+    estimated_wait_s: float
+
+
+class AdmissionController:
+    """Reject requests that cannot finish within the SLA or their deadline.
+
+    The backlog is the summed estimated cost of every admitted request that
+    has not finished yet. A request is predicted to finish once that backlog
+    and its own cost have run; if that is later than ``sla_s`` (or the
+    client's own deadline, whichever is sooner) it is rejected and told to
+    retry once enough of the backlog has drained.
+    """
+
+    def __init__(self, cost_model: CostModel, sla_s: float, enabled: bool = True):
+        self.cost_model = cost_model
+        self.sla_s = sla_s
+        self.enabled = enabled
+        self.backlog_s = 0.0
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.forced = 0
+
+    def admit(
+        self,
+        model_name: str,
+        img_size: int,
+        steps: int,
+        deadline_s: Optional[float] = None,
+        force: bool = False,
+        images: int = 1,
+    ) -> AdmissionTicket:
+        """Reserve capacity for a request or raise ``AdmissionRejected``.
+
+        ``force`` admits the request regardless of the limit while still
+        counting it in the backlog, for work that has no client waiting.
+        """
+        cost_s = self.cost_model.estimate(model_name, img_size, steps) * images
+        wait_s = self.backlog_s
+        predicted_s = wait_s + cost_s
+        limit_s = self.sla_s if deadline_s is None else min(self.sla_s, deadline_s)
+        if self.enabled and not force and predicted_s > limit_s:
+            self.rejected += 1
+            # Finishing within the limit needs the backlog to shrink by the
+            # overshoot; with one inference stream that takes as many seconds.
+            retry_after_s = max(1, math.ceil(predicted_s - limit_s))
+            raise AdmissionRejected(predicted_s, limit_s, retry_after_s)
+        if force:
+            self.forced += 1
+        self.admitted += 1
+        self.in_flight += 1
+        self.backlog_s += cost_s
+        return AdmissionTicket(cost_s=cost_s, estimated_wait_s=predicted_s)
+
+    def release(self, ticket: AdmissionTicket) -> None:
+        """Return a finished (or failed) request's reserved capacity."""
+        self.in_flight -= 1
+        self.backlog_s = max(0.0, self.backlog_s - ticket.cost_s)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "sla_s": self.sla_s,
+            "backlog_s": round(self.backlog_s, 3),
+            "in_flight": self.in_flight,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "forced": self.forced,
+            "cost_model": self.cost_model.get_stats(),
+        }
@@ -0,0 +1,359 @@
+import asyncio
+import dataclasses
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Tuple,
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BatchFn = Callable[[Hashable, List[Any]], Awaitable[List[Any]]]
+
+DEFAULT_TENANT = "anonymous"
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BATCH = "batch"
+DEFAULT_PRIORITY_WEIGHTS = {PRIORITY_INTERACTIVE: 4.0, PRIORITY_BATCH: 1.0}
+
+
+class QueueFullError(Exception):
+    """Raised when the batcher's pending queue is at capacity."""
+
+
+@dataclass
+class PendingRequest:
+    """A request waiting to be grouped into a batch."""
+
+    key: Hashable
+    payload: Any
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+    tenant: str = DEFAULT_TENANT
+    priority: str = PRIORITY_INTERACTIVE
+    cost: float = 1.0
+    start_tag: float = 0.0
+    images: int = 1
+
+
+@dataclass
+class FlowStats:
+    """Service received by one tenant at one priority."""
+
+    served: int = 0
+    service_s: float = 0.0
+    recent_service_s: float = 0.0
+    updated_at: float = field(default_factory=time.monotonic)
+
+    def decayed(self, now: float, half_life_s: float) -> float:
+        return self.recent_service_s * 0.5 ** ((now - self.updated_at) / half_life_s)
+
+
+class MicroBatcher:
+    """Group concurrent requests that share a batch key into one call.
+
+    Requests are scheduled by start-time fair queueing over flows, one flow
+    per (tenant, priority). Each request is tagged on arrival with the
+    virtual time at which its flow may next be served, and the flow's tag
+    then advances by the request's cost divided by the flow's weight, so
+    backlogged flows receive GPU time in proportion to their weights no
+    matter how many requests they send. With a single flow this is plain
+    arrival order.
+
+    The pending request with the smallest tag decides which key runs next.
+    Other pending requests with the same key ride along, lowest tags first,
+    while the batch holds at most ``max_batch_size`` images; a request for
+    more images than that runs on its own. A batch that is not full waits at
+    most ``batch_wait_timeout_s`` (counted from the head's arrival) for more
+    compatible requests. At most ``max_queue_size`` requests may wait;
+    further submissions raise ``QueueFullError``. ``batch_fn`` returns one
+    result per request. An exception returned in place of a result fails only
+    that request; an exception raised fails the whole batch.
+
+    Requests are submitted and batched on one event loop. The queue and
+    per-flow statistics are only changed under a lock, and ``queue_depth``,
+    ``get_stats`` and ``tenant_stats`` read copies taken under it, so they
+    may be called from other threads.
+    """
+
+    def __init__(
+        self,
+        batch_fn: BatchFn,
+        max_batch_size: int = 4,
+        batch_wait_timeout_s: float = 0.02,
+        max_queue_size: Optional[int] = None,
+        priority_weights: Optional[Dict[str, float]] = None,
+        tenant_weights: Optional[Dict[str, float]] = None,
+        share_half_life_s: float = 60.0,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self._batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.batch_wait_timeout_s = batch_wait_timeout_s
+        self.max_queue_size = max_queue_size
+        self.priority_weights = dict(priority_weights or DEFAULT_PRIORITY_WEIGHTS)
+        self.tenant_weights = dict(tenant_weights or {})
+        self.share_half_life_s = share_half_life_s
+        self._virtual_time = 0.0
+        self._flow_tags: Dict[Tuple[str, str], float] = {}
+        self._flow_stats: Dict[Tuple[str, str], FlowStats] = {}
+        self._pending: Deque[PendingRequest] = deque()
+        self._lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.batches_run = 0
+        self.requests_batched = 0
+        self.images_batched = 0
+        self.last_batch_size = 0
+        self.in_flight = 0
+        self.rejected = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of requests waiting to be batched."""
+        with self._lock:
+            pending = list(self._pending)
+        return sum(1 for r in pending if not r.future.done())
+
+    def weight(self, tenant: str, priority: str) -> float:
+        return self.tenant_weights.get(tenant, 1.0) * self.priority_weights.get(
+            priority, 1.0
+        )
+
+    async def submit(
+        self,
+        key: Hashable,
+        payload: Any,
+        tenant: str = DEFAULT_TENANT,
+        priority: str = PRIORITY_INTERACTIVE,
+        cost: float = 1.0,
+        images: int = 1,
+    ) -> Any:
+        """Queue a request and wait for its share of the batch result.
+
+        ``cost`` is the request's expected GPU time; a flow is charged that
+        much of its share for it. ``images`` is how many of the batch's
+        ``max_batch_size`` slots the request takes.
+        """
+        loop = asyncio.get_running_loop()
+        if self.max_queue_size is not None and self.queue_depth >= self.max_queue_size:
+            self.rejected += 1
+            raise QueueFullError(
+                f"Inference queue is full ({self.max_queue_size} requests waiting)"
+            )
+        self._ensure_worker()
+        flow = (tenant, priority)
+        start_tag = max(self._virtual_time, self._flow_tags.get(flow, 0.0))
+        self._flow_tags[flow] = start_tag + cost / self.weight(tenant, priority)
+        request = PendingRequest(
+            key=key,
+            payload=payload,
+            future=loop.create_future(),
+            tenant=tenant,
+            priority=priority,
+            cost=cost,
+            start_tag=start_tag,
+            images=images,
+        )
+        with self._lock:
+            self._pending.append(request)
+        self._wakeup.set()
+        return await request.future
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get batching configuration and counters."""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "batch_wait_timeout_ms": self.batch_wait_timeout_s * 1000,
+            "batches_run": self.batches_run,
+            "requests_batched": self.requests_batched,
+            "images_batched": self.images_batched,
+            "avg_batch_size": (
+                self.images_batched / self.batches_run if self.batches_run else 0.0
+            ),
+            "last_batch_size": self.last_batch_size,
+            "queue_depth": self.queue_depth,
+            "max_queue_size": self.max_queue_size,
+            "in_flight": self.in_flight,
+            "rejected": self.rejected,
+            "tenants": self.tenant_stats(),
+        }
+
+    def tenant_stats(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Queue length and service share of every flow, by tenant and priority.
+
+        ``share`` is the flow's fraction of recent GPU time, with older
+        service decaying by half every ``share_half_life_s``.
+        """
+        now = time.monotonic()
+        with self._lock:
+            pending = list(self._pending)
+            flow_stats = {
+                flow: dataclasses.replace(stats)
+                for flow, stats in self._flow_stats.items()
+            }
+        queued: Dict[Tuple[str, str], int] = {}
+        for request in pending:
+            if not request.future.done():
+                flow = (request.tenant, request.priority)
+                queued[flow] = queued.get(flow, 0) + 1
+        recent = {
+            flow: stats.decayed(now, self.share_half_life_s)
+            for flow, stats in flow_stats.items()
+        }
+        total_recent = sum(recent.values())
+        result: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for flow in set(queued) | set(flow_stats):
+            tenant, priority = flow
+            stats = flow_stats.get(flow, FlowStats())
+            result.setdefault(tenant, {})[priority] = {
+                "queued": queued.get(flow, 0),
+                "served": stats.served,
+                "service_s": round(stats.service_s, 3),
+                "share": (
+                    round(recent.get(flow, 0.0) / total_recent, 4)
+                    if total_recent
+                    else 0.0
+                ),
+                "weight": self.weight(tenant, priority),
+            }
+        return result
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+
+    def _count_compatible(self, key: Hashable) -> int:
+        """Images requested by live pending requests for ``key``."""
+        return sum(
+            r.images for r in self._pending if r.key == key and not r.future.done()
+        )
+
+    def _next_head(self) -> PendingRequest:
+        """The live pending request with the lowest start tag."""
+        return min(
+            (r for r in self._pending if not r.future.done()),
+            key=lambda r: (r.start_tag, r.enqueued_at),
+        )
+
+    def _take_batch(self, key: Hashable) -> List[PendingRequest]:
+        """Remove live requests for ``key`` totalling up to ``max_batch_size`` images.
+
+        The first request is always taken, even if it alone is larger.
+        """
+        compatible = sorted(
+            (r for r in self._pending if r.key == key and not r.future.done()),
+            key=lambda r: (r.start_tag, r.enqueued_at),
+        )
+        batch: List[PendingRequest] = []
+        images = 0
+        for request in compatible:
+            if batch and images + request.images > self.max_batch_size:
+                break
+            batch.append(request)
+            images += request.images
+        taken = set(map(id, batch))
+        with self._lock:
+            self._pending = deque(
+                r for r in self._pending if not r.future.done() and id(r) not in taken
+            )
+        return batch
+
+    def _forget_idle_flows(self) -> None:
+        """Drop tags of flows that could not be ahead of virtual time anyway."""
+        idle = [f for f, tag in self._flow_tags.items() if tag <= self._virtual_time]
+        for flow in idle:
+            del self._flow_tags[flow]
+
+    def _charge(self, batch: List[PendingRequest], elapsed_s: float) -> None:
+        """Split a batch's measured time over its flows in proportion to cost."""
+        now = time.monotonic()
+        total_cost = sum(r.cost for r in batch) or 1.0
+        with self._lock:
+            for request in batch:
+                flow = (request.tenant, request.priority)
+                stats = self._flow_stats.setdefault(flow, FlowStats())
+                service_s = elapsed_s * request.cost / total_cost
+                stats.recent_service_s = (
+                    stats.decayed(now, self.share_half_life_s) + service_s
+                )
+                stats.updated_at = now
+                stats.served += 1
+                stats.service_s += service_s
+
+    async def _wait_for_batch(self, head: PendingRequest) -> None:
+        """Wait until the head's batch is full or its wait window expires."""
+        deadline = head.enqueued_at + self.batch_wait_timeout_s
+        while self._count_compatible(head.key) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), remaining)
+            except asyncio.TimeoutError:
+                return
+
+    async def _run(self) -> None:
+        while True:
+            if any(r.future.done() for r in self._pending):
+                with self._lock:
+                    self._pending = deque(
+                        r for r in self._pending if not r.future.done()
+                    )
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            head = self._next_head()
+            await self._wait_for_batch(head)
+            batch = self._take_batch(head.key)
+            if batch:
+                self._virtual_time = max(self._virtual_time, batch[0].start_tag)
+                self._forget_idle_flows()
+                await self._run_batch(head.key, batch)
+
+    async def _run_batch(self, key: Hashable, batch: List[PendingRequest]) -> None:
+        self.batches_run += 1
+        self.requests_batched += len(batch)
+        images = sum(r.images for r in batch)
+        self.images_batched += images
+        self.last_batch_size = images
+        self.in_flight = len(batch)
+        start = time.perf_counter()
+        try:
+            results = await self._batch_fn(key, [r.payload for r in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(
+                    f"Batch function returned {len(results)} results for {len(batch)} requests"
+                )
+        except Exception as e:
+            logger.error(f"Batch of {len(batch)} requests failed: {e}")
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+        finally:
+            self.in_flight = 0
+            self._charge(batch, time.perf_counter() - start)
+        for request, result in zip(batch, results):
+            if request.future.done():
+                continue
+            # The batch function may fail single requests by returning the error.
+            if isinstance(result, Exception):
+                request.future.set_exception(result)
+            else:
+                request.future.set_result(result)
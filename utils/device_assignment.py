@@ -0,0 +1,33 @@
+import fcntl
+import logging
+from pathlib import Path
+from typing import IO, List, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Lock files stay open for the life of the process; the OS drops the locks
+# when it exits, so a crashed replica frees its tile.
+_held_locks: List[IO] = []
+
+
+def claim_device_index(num_devices: int, lock_dir: str) -> Optional[int]:
+    """Claim a device index no other process on this node holds.
+
+    Ray schedules replicas onto nodes by custom resources (one unit per
+    accelerator tile) but does not say which tile a replica got; replicas
+    on the same node pick distinct tiles through per-tile lock files.
+    """
+    Path(lock_dir).mkdir(parents=True, exist_ok=True)
+    for index in range(num_devices):
+        lock_file = open(Path(lock_dir) / f"device{index}.lock", "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            continue
+        _held_locks.append(lock_file)
+        logger.info(f"Claimed device index {index}")
+        return index
+    logger.warning(f"All {num_devices} device indices on this node are claimed")
+    return None
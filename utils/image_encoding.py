@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Any, Dict, Optional, Tuple
+
+from PIL import Image
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MEDIA_TYPES: Dict[str, str] = {
+    "png": "image/png",
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+    "raw": "application/octet-stream",
+}
+FORMAT_ALIASES: Dict[str, str] = {"jpg": "jpeg", "rgb": "raw"}
+
+
+@dataclass
+class OutputOptions:
+    """How a generated image should be encoded for the response."""
+
+    output_format: str = "png"
+    quality: int = 90
+    compress_level: int = 6
+
+    def cache_tag(self) -> str:
+        """Short description of the encoding, used in cache keys."""
+        if self.output_format == "png":
+            return f"png:{self.compress_level}"
+        if self.output_format in ("jpeg", "webp"):
+            return f"{self.output_format}:{self.quality}"
+        return self.output_format
+
+    @property
+    def media_type(self) -> str:
+        return MEDIA_TYPES[self.output_format]
+
+
+@dataclass
+class EncodedImage:
+    content: bytes
+    media_type: str
+    encode_s: float = 0.0
+
+
+def negotiate_format(accept: Optional[str]) -> Optional[str]:
+    """Pick the preferred supported format from an ``Accept`` header.
+
+    Returns None when the header is missing, only allows wildcards, or names
+    no supported type, so the caller can fall back to its default.
+    """
+    if not accept:
+        return None
+    by_media_type = {media_type: fmt for fmt, media_type in MEDIA_TYPES.items()}
+    best: Tuple[float, Optional[str]] = (0.0, None)
+    for part in accept.split(","):
+        media_range, *params = [p.strip() for p in part.split(";")]
+        fmt = by_media_type.get(media_range.lower())
+        if fmt is None:
+            continue
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if q > best[0]:
+            best = (q, fmt)
+    return best[1]
+
+
+def encode_image(image: Image.Image, options: OutputOptions) -> Tuple[bytes, float]:
+    """Encode an image, returning the bytes and the encode time in seconds."""
+    start = time.perf_counter()
+    if options.output_format == "raw":
+        content = image.convert("RGB").tobytes()
+    else:
+        buffer = BytesIO()
+        if options.output_format == "png":
+            image.save(buffer, "PNG", compress_level=options.compress_level)
+        elif options.output_format == "jpeg":
+            image.convert("RGB").save(buffer, "JPEG", quality=options.quality)
+        else:
+            image.save(buffer, "WEBP", quality=options.quality)
+        content = buffer.getvalue()
+    return content, time.perf_counter() - start
+
+
+class ImageEncoder:
+    """Encode images on a worker pool so encoding overlaps the next inference.
+
+    A process pool sidesteps the GIL at the cost of pickling each image;
+    a thread pool avoids the copy and is the default.
+    """
+
+    def __init__(self, max_workers: int = 4, use_processes: bool = False):
+        self._executor: Executor = (
+            ProcessPoolExecutor(max_workers=max_workers)
+            if use_processes
+            else ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="image-encode"
+            )
+        )
+        self.use_processes = use_processes
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    async def encode(self, image: Image.Image, options: OutputOptions) -> EncodedImage:
+        loop = asyncio.get_running_loop()
+        content, seconds = await loop.run_in_executor(
+            self._executor, encode_image, image, options
+        )
+        self._record(options.output_format, seconds, len(content))
+        return EncodedImage(content, options.media_type, seconds)
+
+    def _record(self, output_format: str, seconds: float, size: int) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(
+                output_format, {"count": 0, "encode_s": 0.0, "bytes": 0}
+            )
+            stats["count"] += 1
+            stats["encode_s"] += seconds
+            stats["bytes"] += size
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get per-format encode counts, average time and average size."""
+        with self._lock:
+            return {
+                fmt: {
+                    "count": int(s["count"]),
+                    "avg_encode_ms": round(s["encode_s"] * 1000 / s["count"], 3),
+                    "avg_bytes": int(s["bytes"] / s["count"]),
+                }
+                for fmt, s in self._stats.items()
+            }
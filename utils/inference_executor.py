@@ -0,0 +1,68 @@
+import asyncio
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class InferenceExecutor:
+    """Run blocking inference calls on one dedicated worker thread.
+
+    Keeping the pipeline off the event loop lets health checks, info
+    requests and new submissions proceed while a generation is running.
+    A single worker keeps device work strictly sequential.
+    """
+
+    def __init__(self, name: str = "inference"):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self.is_busy = False
+        self.jobs_completed = 0
+        self.jobs_failed = 0
+        self.busy_time_s = 0.0
+        self._started_at = time.monotonic()
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run ``fn`` on the inference thread and await its result."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(self._timed_call, fn, *args, **kwargs)
+        )
+
+    def _timed_call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        start = time.perf_counter()
+        self.is_busy = True
+        failed = False
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            with self._lock:
+                self.is_busy = False
+                self.busy_time_s += time.perf_counter() - start
+                if failed:
+                    self.jobs_failed += 1
+                else:
+                    self.jobs_completed += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get executor utilization counters."""
+        uptime = time.monotonic() - self._started_at
+        return {
+            "busy": self.is_busy,
+            "jobs_completed": self.jobs_completed,
+            "jobs_failed": self.jobs_failed,
+            "busy_time_s": round(self.busy_time_s, 3),
+            "utilization": round(self.busy_time_s / uptime, 4) if uptime else 0.0,
+        }
+
+    def shutdown(self) -> None:
+        """Stop accepting work and wait for the running job to finish."""
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,213 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class JobStatus:
+    """Lifecycle states of an asynchronous generation job."""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class JobStore:
+    """SQLite-backed table of generation jobs and their results.
+
+    Jobs survive client disconnects and replica restarts: jobs that were
+    running when the process stopped are put back in the queue on startup.
+    Several replicas may share one database; claims are atomic. When they do,
+    pass ``requeue_running=False`` so a starting replica does not requeue
+    jobs other replicas are running, and rely on ``requeue_stale`` instead.
+    The replica running a job keeps its claim alive with ``heartbeat``, so
+    only jobs whose replica has gone quiet count as stale, however long they
+    wait in its inference queue.
+    """
+
+    def __init__(self, db_path: str, requeue_running: bool = True):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    heartbeat_at REAL,
+                    finished_at REAL,
+                    error TEXT,
+                    result BLOB,
+                    media_type TEXT,
+                    headers TEXT
+                )
+                """
+            )
+            columns = {
+                row["name"]
+                for row in self._conn.execute("PRAGMA table_info(jobs)").fetchall()
+            }
+            if "heartbeat_at" not in columns:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_status_created "
+                "ON jobs (status, created_at)"
+            )
+            requeued = 0
+            if requeue_running:
+                requeued = self._conn.execute(
+                    "UPDATE jobs SET status = ?, started_at = NULL, "
+                    "heartbeat_at = NULL WHERE status = ?",
+                    (JobStatus.QUEUED, JobStatus.RUNNING),
+                ).rowcount
+        if requeued:
+            logger.info(f"Requeued {requeued} jobs interrupted by a restart")
+
+    def create(self, params: Dict[str, Any]) -> str:
+        """Insert a queued job and return its id."""
+        job_id = uuid.uuid4().hex
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, params, created_at) VALUES (?, ?, ?, ?)",
+                (job_id, JobStatus.QUEUED, json.dumps(params), time.time()),
+            )
+        return job_id
+
+    def claim_next(self) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Mark the oldest queued job as running and return its id and params.
+
+        The select and update are one statement, so two processes sharing
+        the database never claim the same job.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ?, heartbeat_at = ? "
+                "WHERE id = ("
+                "SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1"
+                ") AND status = ? RETURNING id, params",
+                (JobStatus.RUNNING, now, now, JobStatus.QUEUED, JobStatus.QUEUED),
+            ).fetchone()
+        if row is None:
+            return None
+        return row["id"], json.loads(row["params"])
+
+    def requeue(self, job_id: str) -> None:
+        """Put a running job back in the queue, e.g. when dispatching it failed."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL, heartbeat_at = NULL "
+                "WHERE id = ? AND status = ?",
+                (JobStatus.QUEUED, job_id, JobStatus.RUNNING),
+            )
+
+    def heartbeat(self, job_ids: Iterable[str]) -> None:
+        """Record that the given running jobs are still being worked on."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = ?",
+                [(now, job_id, JobStatus.RUNNING) for job_id in job_ids],
+            )
+
+    def requeue_stale(self, older_than_s: float) -> int:
+        """Requeue running jobs without a heartbeat for ``older_than_s``."""
+        cutoff = time.time() - older_than_s
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL, heartbeat_at = NULL "
+                "WHERE status = ? AND COALESCE(heartbeat_at, started_at) < ?",
+                (JobStatus.QUEUED, JobStatus.RUNNING, cutoff),
+            ).rowcount
+
+    def complete(
+        self,
+        job_id: str,
+        result: bytes,
+        media_type: str,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, result = ?, "
+                "media_type = ?, headers = ? WHERE id = ?",
+                (
+                    JobStatus.SUCCEEDED,
+                    time.time(),
+                    result,
+                    media_type,
+                    json.dumps(headers or {}),
+                    job_id,
+                ),
+            )
+
+    def fail(self, job_id: str, error: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE id = ?",
+                (JobStatus.FAILED, time.time(), error, job_id),
+            )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get job metadata without the result payload."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, params, created_at, started_at, finished_at, "
+                "error FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        return job
+
+    def get_result(self, job_id: str) -> Optional[Tuple[bytes, str, Dict[str, str]]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result, media_type, headers FROM jobs "
+                "WHERE id = ? AND status = ?",
+                (job_id, JobStatus.SUCCEEDED),
+            ).fetchone()
+        if row is None:
+            return None
+        return row["result"], row["media_type"], json.loads(row["headers"] or "{}")
+
+    def queue_position(self, job_id: str, created_at: float) -> int:
+        """Number of queued jobs that were submitted before this one."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ? AND "
+                "(created_at < ? OR (created_at = ? AND id < ?))",
+                (JobStatus.QUEUED, created_at, created_at, job_id),
+            ).fetchone()[0]
+
+    def count_by_status(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"
+            ).fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    def purge_finished(self, older_than_s: float) -> int:
+        """Delete finished jobs whose results are older than ``older_than_s``."""
+        cutoff = time.time() - older_than_s
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                (JobStatus.SUCCEEDED, JobStatus.FAILED, cutoff),
+            ).rowcount
@@ -0,0 +1,194 @@
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+import torch
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Cheapest first: each mode saves more peak memory than the one before it
+# and costs more time.
+MEMORY_MODES = ("full", "vae_slicing", "attention_slicing", "vae_tiling")
+FULL_MEMORY_MODE = "full"
+# Attention slicing, which every model ran with before the policy existed,
+# plus VAE slicing, which only lowers peak memory further.
+SAFE_MEMORY_MODE = "attention_slicing"
+
+
+@contextmanager
+def track_peak_memory(device: str) -> Iterator[Dict[str, int]]:
+    """Measure the peak device memory allocated by the enclosed block.
+
+    Yields a dict whose ``peak_bytes`` is filled in on exit, counting only
+    memory above what was allocated on entry (so not the weights). Stays 0
+    on devices without allocator statistics.
+    """
+    result = {"peak_bytes": 0}
+    if not device.startswith("xpu"):
+        yield result
+        return
+    torch.xpu.reset_peak_memory_stats(device)
+    base = torch.xpu.memory_allocated(device)
+    try:
+        yield result
+    finally:
+        result["peak_bytes"] = max(0, torch.xpu.max_memory_allocated(device) - base)
+
+
+class MemoryPolicy:
+    """Choose the fastest attention/VAE mode that fits in free device memory.
+
+    Peak activation memory in ``full`` mode is calibrated per model and
+    image size at startup, then kept up to date from live batches, and
+    taken to grow linearly with batch size. Sizes that were never measured
+    are extrapolated from the nearest measured size, with attention making
+    memory grow with the square of the pixel count. The saving of each
+    cheaper mode is a ratio to ``full`` measured at one size. A model that
+    has not been calibrated runs in ``SAFE_MEMORY_MODE``.
+    """
+
+    def __init__(
+        self,
+        free_memory: Callable[[], Optional[int]],
+        headroom: float = 0.9,
+        enabled: bool = True,
+    ):
+        self._free_memory = free_memory
+        self.headroom = headroom
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        # model -> img_size -> peak bytes per image in full mode
+        self._full_peaks: Dict[str, Dict[int, float]] = defaultdict(dict)
+        # model -> mode -> (img_size, peak bytes per image)
+        self._mode_peaks: Dict[str, Dict[str, Tuple[int, float]]] = defaultdict(dict)
+        # model -> smallest batch megapixels that ran out of memory in full mode
+        self._full_limits: Dict[str, float] = {}
+        self.decisions: Dict[str, int] = {mode: 0 for mode in MEMORY_MODES}
+
+    def observe(
+        self,
+        model_name: str,
+        img_size: int,
+        batch_size: int,
+        mode: str,
+        peak_bytes: int,
+    ) -> None:
+        """Record the peak memory of a batch that ran in ``mode``."""
+        if peak_bytes <= 0 or batch_size <= 0:
+            return
+        per_image = peak_bytes / batch_size
+        with self._lock:
+            if mode == FULL_MEMORY_MODE:
+                peaks = self._full_peaks[model_name]
+                peaks[img_size] = max(peaks.get(img_size, 0.0), per_image)
+            else:
+                known = self._mode_peaks[model_name].get(mode)
+                if known is None or known[0] == img_size:
+                    self._mode_peaks[model_name][mode] = (
+                        img_size,
+                        max(per_image, known[1] if known else 0.0),
+                    )
+
+    def mark_unfit(self, model_name: str, img_size: int, batch_size: int) -> None:
+        """Record that a batch ran out of device memory in ``full`` mode."""
+        mpix = batch_size * img_size * img_size / 1e6
+        with self._lock:
+            self._full_limits[model_name] = min(
+                self._full_limits.get(model_name, mpix), mpix
+            )
+
+    def _estimate_full(self, model_name: str, img_size: int) -> Optional[float]:
+        peaks = self._full_peaks.get(model_name)
+        if not peaks:
+            return None
+        if img_size in peaks:
+            return peaks[img_size]
+        nearest = min(peaks, key=lambda size: abs(size - img_size))
+        # Attention scales with pixels squared; scale down only with pixels,
+        # which overestimates, the safe direction.
+        exponent = 4 if img_size > nearest else 2
+        return peaks[nearest] * (img_size / nearest) ** exponent
+
+    def estimate(
+        self, model_name: str, img_size: int, batch_size: int, mode: str
+    ) -> Optional[float]:
+        """Predicted peak bytes of a batch in ``mode``, if calibrated."""
+        with self._lock:
+            full = self._estimate_full(model_name, img_size)
+            if full is None:
+                return None
+            if mode == FULL_MEMORY_MODE:
+                limit = self._full_limits.get(model_name)
+                if limit is not None and batch_size * img_size**2 / 1e6 >= limit:
+                    return float("inf")
+                return full * batch_size
+            measured = self._mode_peaks.get(model_name, {}).get(mode)
+            if measured is None:
+                return None
+            size, per_image = measured
+            reference = self._estimate_full(model_name, size)
+            if not reference:
+                return None
+            return full * batch_size * min(1.0, per_image / reference)
+
+    def max_batch(self, model_name: str, img_size: int) -> Optional[int]:
+        """Most images of ``img_size`` that fit in free memory in any mode, if known."""
+        free = self._free_memory()
+        if free is None:
+            return None
+        estimates = [
+            self.estimate(model_name, img_size, 1, mode) for mode in MEMORY_MODES
+        ]
+        per_image = min((e for e in estimates if e), default=None)
+        if per_image is None:
+            return None
+        return int(free * self.headroom // per_image)
+
+    def choose(self, model_name: str, img_size: int, batch_size: int) -> str:
+        """The cheapest mode predicted to fit, or the most frugal one."""
+        mode = self._choose(model_name, img_size, batch_size)
+        with self._lock:
+            self.decisions[mode] += 1
+        return mode
+
+    def _choose(self, model_name: str, img_size: int, batch_size: int) -> str:
+        if not self.enabled:
+            return SAFE_MEMORY_MODE
+        free = self._free_memory()
+        if free is None:
+            # Host memory: nothing to calibrate against and nothing to protect.
+            return FULL_MEMORY_MODE
+        if self.estimate(model_name, img_size, batch_size, FULL_MEMORY_MODE) is None:
+            return SAFE_MEMORY_MODE
+        budget = free * self.headroom
+        for mode in MEMORY_MODES:
+            predicted = self.estimate(model_name, img_size, batch_size, mode)
+            if predicted is not None and predicted <= budget:
+                return mode
+        return MEMORY_MODES[-1]
+
+    def get_stats(self) -> Dict[str, Any]:
+        mib = 1024**2
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "headroom": self.headroom,
+                "decisions": dict(self.decisions),
+                "full_peak_mb_per_image": {
+                    model: {
+                        size: round(b / mib, 1) for size, b in sorted(peaks.items())
+                    }
+                    for model, peaks in self._full_peaks.items()
+                },
+                "mode_peak_mb_per_image": {
+                    model: {
+                        mode: {"img_size": size, "mb": round(b / mib, 1)}
+                        for mode, (size, b) in modes.items()
+                    }
+                    for model, modes in self._mode_peaks.items()
+                },
+                "full_limit_mpix": dict(self._full_limits),
+            }
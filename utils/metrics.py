@@ -0,0 +1,199 @@
+import logging
+from typing import Dict, Optional, Sequence
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    start_http_server,
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Request stages range from sub-millisecond validation to minute-long
+# generations at high step counts.
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+STAGE_BUCKETS += (5.0, 10.0, 30.0, 60.0, 120.0)
+STEP_BUCKETS = (0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.25, 0.5, 1.0, 2.5)
+SIZE_BUCKETS = tuple(2**i * 1024 for i in range(4, 13))  # 16KB .. 4MB
+MEMORY_BUCKETS = tuple(2**i * 1024**2 for i in range(7, 17))  # 128MB .. 64GB
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+
+class ServiceMetrics:
+    """Prometheus metrics for one replica, kept in a private registry.
+
+    Recording a sample is a dictionary lookup and a few additions, cheap
+    enough to leave on for every request. Labels are limited to bounded
+    sets (model, size bucket, format, status) to keep series counts small.
+
+    Ray Serve sends each request to any replica, so ``/metrics`` on the
+    service shows whichever replica answered. Prometheus should instead
+    scrape every replica on the port given to ``serve``. The inference
+    queue depth is exported through Ray's metrics (``sd_inference_queue_depth``),
+    which already aggregates replicas, and is not repeated here.
+    """
+
+    def __init__(self):
+        self.registry = CollectorRegistry()
+        self.validation_seconds = Histogram(
+            "sd_validation_seconds",
+            "Time spent validating a request.",
+            buckets=STAGE_BUCKETS,
+            registry=self.registry,
+        )
+        self.queue_wait_seconds = Histogram(
+            "sd_queue_wait_seconds",
+            "Time from admission until the request's batch started.",
+            ["model"],
+            buckets=STAGE_BUCKETS,
+            registry=self.registry,
+        )
+        self.text_encode_seconds = Histogram(
+            "sd_text_encode_seconds",
+            "Prompt encoding time per batch.",
+            ["model"],
+            buckets=STAGE_BUCKETS,
+            registry=self.registry,
+        )
+        self.denoise_seconds = Histogram(
+            "sd_denoise_seconds",
+            "Denoising loop time per batch.",
+            ["model"],
+            buckets=STAGE_BUCKETS,
+            registry=self.registry,
+        )
+        self.denoise_step_seconds = Histogram(
+            "sd_denoise_step_seconds",
+            "Time of a single denoising step.",
+            ["model"],
+            buckets=STEP_BUCKETS,
+            registry=self.registry,
+        )
+        self.vae_decode_seconds = Histogram(
+            "sd_vae_decode_seconds",
+            "VAE decode and image conversion time per batch.",
+            ["model"],
+            buckets=STAGE_BUCKETS,
+            registry=self.registry,
+        )
+        self.image_encode_seconds = Histogram(
+            "sd_image_encode_seconds",
+            "Time to encode one image for the response.",
+            ["format"],
+            buckets=STAGE_BUCKETS,
+            registry=self.registry,
+        )
+        self.response_bytes = Histogram(
+            "sd_response_bytes",
+            "Size of an encoded image response.",
+            ["format"],
+            buckets=SIZE_BUCKETS,
+            registry=self.registry,
+        )
+        self.requests_total = Counter(
+            "sd_requests_total",
+            "Generation requests by endpoint, model, size bucket and status code.",
+            ["endpoint", "model", "size", "status"],
+            registry=self.registry,
+        )
+        self.coalesced_requests_total = Counter(
+            "sd_coalesced_requests_total",
+            "Requests served by an identical generation already in flight.",
+            ["model"],
+            registry=self.registry,
+        )
+        self.batch_size = Histogram(
+            "sd_batch_size",
+            "Number of images generated per pipeline call.",
+            ["model"],
+            buckets=(1, 2, 3, 4, 6, 8, 12, 16),
+            registry=self.registry,
+        )
+        self.last_batch_size = Gauge(
+            "sd_last_batch_size",
+            "Size of the most recent batch.",
+            registry=self.registry,
+        )
+        self.memory_mode_total = Counter(
+            "sd_memory_mode_total",
+            "Batches by the attention/VAE memory mode they ran in.",
+            ["model", "mode"],
+            registry=self.registry,
+        )
+        self.request_peak_memory_bytes = Histogram(
+            "sd_request_peak_device_memory_bytes",
+            "Peak device memory above the weights during a request's batch.",
+            ["model"],
+            buckets=MEMORY_BUCKETS,
+            registry=self.registry,
+        )
+        self.device_memory_bytes = Gauge(
+            "sd_device_memory_bytes",
+            "Device memory held by the allocator.",
+            ["kind"],
+            registry=self.registry,
+        )
+
+    def observe_batch(
+        self,
+        model: str,
+        batch_size: int,
+        text_encode_s: float,
+        denoise_s: float,
+        step_s: Sequence[float],
+        decode_s: float,
+    ) -> None:
+        self.batch_size.labels(model).observe(batch_size)
+        self.text_encode_seconds.labels(model).observe(text_encode_s)
+        self.denoise_seconds.labels(model).observe(denoise_s)
+        step_histogram = self.denoise_step_seconds.labels(model)
+        for seconds in step_s:
+            step_histogram.observe(seconds)
+        self.vae_decode_seconds.labels(model).observe(decode_s)
+
+    def observe_response(self, output_format: str, encode_s: float, size: int) -> None:
+        self.image_encode_seconds.labels(output_format).observe(encode_s)
+        self.response_bytes.labels(output_format).observe(size)
+
+    def count_request(
+        self,
+        endpoint: str,
+        model: Optional[str],
+        size: Optional[str],
+        status: int,
+    ) -> None:
+        self.requests_total.labels(
+            endpoint, model or "unknown", size or "unknown", str(status)
+        ).inc()
+
+    def observe_request_memory(self, model: str, peak_bytes: int) -> None:
+        self.request_peak_memory_bytes.labels(model).observe(peak_bytes)
+
+    def count_coalesced(self, model: str) -> None:
+        self.coalesced_requests_total.labels(model).inc()
+
+    def count_memory_mode(self, model: str, mode: str) -> None:
+        self.memory_mode_total.labels(model, mode).inc()
+
+    def set_device_memory(self, stats: Dict[str, int]) -> None:
+        for kind, value in stats.items():
+            self.device_memory_bytes.labels(kind).set(value)
+
+    def render(self) -> bytes:
+        return generate_latest(self.registry)
+
+    def serve(self, port: int) -> bool:
+        """Expose the registry on its own HTTP port; returns whether it started."""
+        try:
+            start_http_server(port, registry=self.registry)
+        except OSError as e:
+            logger.warning(f"Could not serve metrics on port {port}: {e}")
+            return False
+        logger.info(f"Serving metrics on port {port}")
+        return True
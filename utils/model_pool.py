@@ -0,0 +1,197 @@
+import gc
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Optional
+
+import torch
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PoolEntry:
+    """A model held by the pool and where its weights currently live."""
+
+    name: str
+    model: Any
+    device: str
+    size_bytes: int
+    load_time_s: float
+    loaded_at: float
+    last_used: float
+    uses: int = 0
+
+
+class ModelPool:
+    """Keep several models loaded under a device memory budget.
+
+    Models are loaded on demand through ``factory`` and must provide
+    ``memory_bytes()``, ``to(device)`` and ``get_startup_stats()``. When a model needs room
+    on the device, the least recently used models are first demoted to host
+    memory (if the host budget allows) and otherwise evicted. All methods
+    that move weights must be called from the inference thread.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[str], Any],
+        device: str,
+        device_budget_bytes: int,
+        host_budget_bytes: int = 0,
+        size_estimates: Optional[Dict[str, int]] = None,
+        history_size: int = 20,
+    ):
+        self._factory = factory
+        self.device = device
+        self.device_budget_bytes = device_budget_bytes
+        self.host_budget_bytes = host_budget_bytes
+        self._size_estimates = dict(size_estimates or {})
+        self._entries: "OrderedDict[str, PoolEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted: Deque[Dict[str, Any]] = deque(maxlen=history_size)
+        self.loads = 0
+        self.promotions = 0
+        self.demotions = 0
+        self.evictions = 0
+
+    def _bytes_on(self, device: str) -> int:
+        return sum(e.size_bytes for e in self._entries.values() if e.device == device)
+
+    def get(self, name: str) -> Any:
+        """Return a device-resident model, loading or promoting it if needed."""
+        entry = self._entries.get(name)
+        if entry is None:
+            entry = self._load(name)
+        elif entry.device != self.device:
+            self._make_room(entry.size_bytes, keep=name)
+            start = time.perf_counter()
+            entry.model.to(self.device)
+            with self._lock:
+                entry.device = self.device
+                self.promotions += 1
+            logger.info(
+                f"Promoted {name} to {self.device} in {time.perf_counter() - start:.2f}s"
+            )
+        with self._lock:
+            entry.last_used = time.time()
+            entry.uses += 1
+            self._entries.move_to_end(name)
+        return entry.model
+
+    def _load(self, name: str) -> PoolEntry:
+        estimate = self._size_estimates.get(name, 0)
+        self._make_room(estimate, keep=name)
+        logger.info(f"Loading {name} into the model pool")
+        start = time.perf_counter()
+        model = self._factory(name)
+        load_time = time.perf_counter() - start
+        size = model.memory_bytes()
+        self._size_estimates[name] = size
+        now = time.time()
+        entry = PoolEntry(
+            name=name,
+            model=model,
+            device=self.device,
+            size_bytes=size,
+            load_time_s=load_time,
+            loaded_at=now,
+            last_used=now,
+        )
+        with self._lock:
+            self._entries[name] = entry
+            self.loads += 1
+        logger.info(f"Loaded {name} ({size / 1024**3:.2f}GB) in {load_time:.2f}s")
+        self._make_room(0, keep=name)
+        return entry
+
+    def _make_room(self, incoming_bytes: int, keep: str) -> None:
+        """Demote or evict LRU models until ``incoming_bytes`` fits the budget."""
+        for name in list(self._entries):
+            if self._bytes_on(self.device) + incoming_bytes <= self.device_budget_bytes:
+                return
+            entry = self._entries[name]
+            if name == keep or entry.device != self.device:
+                continue
+            if self._bytes_on("cpu") + entry.size_bytes <= self.host_budget_bytes:
+                self._demote(entry)
+            else:
+                self.evict(name, reason="device budget")
+
+    def _demote(self, entry: PoolEntry) -> None:
+        start = time.perf_counter()
+        try:
+            entry.model.to("cpu")
+        except Exception as e:
+            logger.warning(f"Could not demote {entry.name}: {e}")
+            self.evict(entry.name, reason=f"demotion failed: {e}")
+            return
+        with self._lock:
+            entry.device = "cpu"
+            self.demotions += 1
+        _release_device_memory(self.device)
+        logger.info(
+            f"Demoted {entry.name} to host memory in {time.perf_counter() - start:.2f}s"
+        )
+
+    def evict(self, name: str, reason: str) -> None:
+        """Drop a model from the pool and release its memory."""
+        with self._lock:
+            entry = self._entries.pop(name, None)
+            if entry is None:
+                return
+            self.evictions += 1
+            self.evicted.append(
+                {
+                    "name": name,
+                    "evicted_at": time.time(),
+                    "reason": reason,
+                    "size_bytes": entry.size_bytes,
+                    "uses": entry.uses,
+                }
+            )
+        del entry
+        gc.collect()
+        _release_device_memory(self.device)
+        logger.info(f"Evicted {name} from the model pool ({reason})")
+
+    def is_resident(self, name: str) -> bool:
+        entry = self._entries.get(name)
+        return entry is not None and entry.device == self.device
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Describe resident and demoted models, evictions and load times."""
+        with self._lock:
+            entries = [
+                {
+                    "name": e.name,
+                    "device": e.device,
+                    "size_gb": round(e.size_bytes / 1024**3, 3),
+                    "load_time_s": round(e.load_time_s, 2),
+                    "loaded_at": e.loaded_at,
+                    "last_used": e.last_used,
+                    "uses": e.uses,
+                    "startup": e.model.get_startup_stats(),
+                }
+                for e in self._entries.values()
+            ]
+            return {
+                "device_budget_gb": round(self.device_budget_bytes / 1024**3, 2),
+                "host_budget_gb": round(self.host_budget_bytes / 1024**3, 2),
+                "device_used_gb": round(self._bytes_on(self.device) / 1024**3, 3),
+                "host_used_gb": round(self._bytes_on("cpu") / 1024**3, 3),
+                "models": entries,
+                "recently_evicted": list(self.evicted),
+                "loads": self.loads,
+                "promotions": self.promotions,
+                "demotions": self.demotions,
+                "evictions": self.evictions,
+            }
+
+
+def _release_device_memory(device: str) -> None:
+    if device.startswith("xpu"):
+        torch.xpu.empty_cache()
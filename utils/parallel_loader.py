@@ -0,0 +1,84 @@
+import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ParallelLoader:
+    """Run named loading steps on a thread pool and record when each ran.
+
+    A step may depend on earlier steps; it starts once they finish and
+    receives their results after its own arguments. Steps must be submitted
+    after the steps they depend on, which keeps the pool deadlock-free.
+    """
+
+    def __init__(self, max_workers: int = 8):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="model-load"
+        )
+        self._origin = time.perf_counter()
+        self._futures: Dict[str, Future] = {}
+        self._deps: Dict[str, Tuple[str, ...]] = {}
+        self.spans: Dict[str, Tuple[float, float]] = {}
+
+    def submit(
+        self,
+        name: str,
+        fn: Callable[..., Any],
+        *args: Any,
+        after: Sequence[str] = (),
+    ) -> Future:
+        deps = [self._futures[dep] for dep in after]
+
+        def run() -> Any:
+            dep_results = [dep.result() for dep in deps]
+            start = time.perf_counter()
+            try:
+                return fn(*args, *dep_results)
+            finally:
+                self.spans[name] = (
+                    start - self._origin,
+                    time.perf_counter() - self._origin,
+                )
+
+        self._deps[name] = tuple(after)
+        self._futures[name] = self._executor.submit(run)
+        return self._futures[name]
+
+    def results(self) -> Dict[str, Any]:
+        """Wait for every step and return their results by name."""
+        try:
+            return {name: future.result() for name, future in self._futures.items()}
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def durations(self) -> Dict[str, float]:
+        return {name: end - start for name, (start, end) in self.spans.items()}
+
+    def critical_path(self) -> List[str]:
+        """The chain of steps that determined when loading finished."""
+        if not self.spans:
+            return []
+        name = max(self.spans, key=lambda n: self.spans[n][1])
+        path = [name]
+        while self._deps.get(name):
+            name = max(self._deps[name], key=lambda n: self.spans[n][1])
+            path.append(name)
+        return path[::-1]
+
+    def log_timings(self, label: str) -> None:
+        for name, (start, end) in sorted(self.spans.items(), key=lambda i: i[1][0]):
+            logger.info(
+                f"{label}: loaded {name} in {end - start:.2f}s "
+                f"(started at +{start:.2f}s)"
+            )
+        path = self.critical_path()
+        if path:
+            steps = " -> ".join(f"{n} ({self.durations()[n]:.2f}s)" for n in path)
+            logger.info(
+                f"{label}: critical path {steps}, "
+                f"finished at +{self.spans[path[-1]][1]:.2f}s"
+            )
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT_VERSION = 1
+MANIFEST_NAME = "snapshot_manifest.json"
+
+
+def file_sha256(path: Path, chunk_size: int = 8 * 1024**2) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class StartupTimer:
+    """Wall time spent in each phase of building a model."""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.source: Optional[str] = None
+        self.components: Dict[str, float] = {}
+        self.critical_path: List[str] = []
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + (
+                time.perf_counter() - start
+            )
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "source": self.source,
+            "phases_s": {name: round(s, 3) for name, s in self.phases.items()},
+            "total_s": round(sum(self.phases.values()), 3),
+            "components_s": {name: round(s, 3) for name, s in self.components.items()},
+            "critical_path": self.critical_path,
+        }
+
+
+class PipelineSnapshotStore:
+    """Local copies of assembled pipelines, validated by a manifest.
+
+    Each snapshot is a directory written by ``save_pretrained`` plus a
+    manifest recording what the pipeline was built from, the library
+    versions that built it and the size, modification time and checksum of
+    every file. A snapshot is only used when the sources, versions, sizes
+    and modification times still match. Checksums are computed when the
+    snapshot is written, but only compared on load with
+    ``verify_checksums``, since hashing tens of GB would cost more than the
+    snapshot saves.
+    """
+
+    def __init__(self, root_dir: str, verify_checksums: bool = False):
+        self.root_dir = Path(root_dir)
+        self.root_dir.mkdir(parents=True, exist_ok=True)
+        self.verify_checksums = verify_checksums
+
+    def path(self, name: str) -> Path:
+        return self.root_dir / name
+
+    def find(self, name: str, identity: Dict[str, Any]) -> Optional[Path]:
+        """Return the snapshot directory if it is complete and matches ``identity``."""
+        snapshot_dir = self.path(name)
+        manifest_path = snapshot_dir / MANIFEST_NAME
+        if not manifest_path.exists():
+            return None
+        try:
+            manifest = json.loads(manifest_path.read_text())
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unreadable snapshot manifest {manifest_path}: {e}")
+            return None
+        if manifest.get("format") != SNAPSHOT_FORMAT_VERSION:
+            logger.info(f"Snapshot {name} has an old format, ignoring it")
+            return None
+        if manifest.get("identity") != identity:
+            logger.info(f"Snapshot {name} was built from different sources or versions")
+            return None
+        for relpath, expected in manifest.get("files", {}).items():
+            file_path = snapshot_dir / relpath
+            if not file_path.exists() or file_path.stat().st_size != expected["size"]:
+                logger.warning(f"Snapshot {name} is missing or has truncated {relpath}")
+                return None
+            mtime_ns = expected.get("mtime_ns")
+            if mtime_ns is not None and file_path.stat().st_mtime_ns != mtime_ns:
+                logger.warning(f"Snapshot {name} has a modified {relpath}")
+                return None
+            if self.verify_checksums and file_sha256(file_path) != expected["sha256"]:
+                logger.warning(f"Snapshot {name} has a corrupt {relpath}")
+                return None
+        return snapshot_dir
+
+    def save(
+        self, name: str, identity: Dict[str, Any], save_fn: Callable[[str], None]
+    ) -> None:
+        """Write a snapshot with ``save_fn(directory)`` and publish it atomically.
+
+        Failures are logged and leave any previous snapshot untouched.
+        """
+        snapshot_dir = self.path(name)
+        tmp_dir = self.root_dir / f".{name}.tmp-{os.getpid()}"
+        try:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            save_fn(str(tmp_dir))
+            files = {
+                str(p.relative_to(tmp_dir)): {
+                    "size": p.stat().st_size,
+                    "mtime_ns": p.stat().st_mtime_ns,
+                    "sha256": file_sha256(p),
+                }
+                for p in sorted(tmp_dir.rglob("*"))
+                if p.is_file()
+            }
+            manifest = {
+                "format": SNAPSHOT_FORMAT_VERSION,
+                "identity": identity,
+                "files": files,
+                "created_at": time.time(),
+            }
+            (tmp_dir / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2))
+            shutil.rmtree(snapshot_dir, ignore_errors=True)
+            os.replace(tmp_dir, snapshot_dir)
+            size_gb = sum(f["size"] for f in files.values()) / 1024**3
+            logger.info(f"Wrote snapshot {name} ({size_gb:.2f}GB) to {snapshot_dir}")
+        except Exception as e:
+            logger.warning(f"Could not write snapshot {name}: {e}")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
@@ -0,0 +1,126 @@
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+import torch
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def _activities(device_type: str) -> List[Any]:
+    activities = [torch.profiler.ProfilerActivity.CPU]
+    if device_type == "xpu":
+        xpu_activity = getattr(torch.profiler.ProfilerActivity, "XPU", None)
+        if xpu_activity is not None:
+            activities.append(xpu_activity)
+        else:
+            logger.warning("This torch build cannot profile XPU kernels, CPU only")
+    return activities
+
+
+class RequestProfiler:
+    """Capture torch.profiler traces of selected pipeline calls.
+
+    Profiling is armed for the next N requests, or requested per request;
+    until then the only cost is an integer check. Each capture writes a
+    Chrome trace (``<trace_id>.json``, viewable in chrome://tracing or
+    Perfetto) and a table of the most expensive operators
+    (``<trace_id>.txt``) to ``output_dir``.
+    """
+
+    def __init__(self, output_dir: str, top_k: int = 30, history_size: int = 20):
+        self.output_dir = Path(output_dir)
+        self.top_k = top_k
+        self._lock = threading.Lock()
+        self._armed = 0
+        self.captured = 0
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=history_size)
+
+    def arm(self, requests: int) -> int:
+        """Profile the next ``requests`` requests; returns how many are armed."""
+        with self._lock:
+            self._armed = max(0, requests)
+            return self._armed
+
+    def take(self) -> bool:
+        """Claim one armed capture for a request, if any are left."""
+        if not self._armed:
+            return False
+        with self._lock:
+            if self._armed <= 0:
+                return False
+            self._armed -= 1
+            return True
+
+    def give_back(self) -> None:
+        """Return a capture claimed by a request that never ran."""
+        with self._lock:
+            self._armed += 1
+
+    @contextmanager
+    def capture(self, device_type: str, label: str) -> Iterator[str]:
+        """Profile the enclosed block and yield the id its trace is saved under."""
+        trace_id = uuid.uuid4().hex
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        sort_by = (
+            "self_xpu_time_total" if device_type == "xpu" else "self_cpu_time_total"
+        )
+        start = time.perf_counter()
+        with torch.profiler.profile(
+            activities=_activities(device_type),
+            record_shapes=True,
+            profile_memory=True,
+        ) as prof:
+            yield trace_id
+        elapsed = time.perf_counter() - start
+        try:
+            trace_path = self.output_dir / f"{trace_id}.json"
+            prof.export_chrome_trace(str(trace_path))
+            try:
+                table = prof.key_averages().table(sort_by=sort_by, row_limit=self.top_k)
+            except Exception:
+                table = prof.key_averages().table(
+                    sort_by="self_cpu_time_total", row_limit=self.top_k
+                )
+            summary_path = self.output_dir / f"{trace_id}.txt"
+            summary_path.write_text(f"{label}\nwall time: {elapsed:.3f}s\n\n{table}\n")
+        except Exception as e:
+            logger.warning(f"Could not save profile {trace_id}: {e}")
+            return
+        with self._lock:
+            self.captured += 1
+            self.recent.append(
+                {
+                    "trace_id": trace_id,
+                    "label": label,
+                    "captured_at": time.time(),
+                    "wall_time_s": round(elapsed, 3),
+                    "trace": str(trace_path),
+                    "summary": str(summary_path),
+                }
+            )
+        logger.info(
+            f"Saved profile {trace_id} of {label} ({elapsed:.2f}s) to {trace_path}"
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "output_dir": str(self.output_dir),
+                "armed": self._armed,
+                "captured": self.captured,
+                "recent": list(self.recent),
+            }
+
+    def find(self, trace_id: str, kind: str) -> Optional[Path]:
+        """Path of a saved trace (``json``) or summary (``txt``), if it exists."""
+        if not trace_id.isalnum():
+            return None
+        path = self.output_dir / f"{trace_id}.{kind}"
+        return path if path.exists() else None
@@ -0,0 +1,193 @@
+import asyncio
+import base64
+import logging
+import threading
+import time
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+from PIL import Image
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Linear projections from latent channels to RGB, with per-channel bias.
+# They approximate the VAE decoder well enough for a progress thumbnail.
+LATENT_RGB_FACTORS: Dict[str, Tuple[List[List[float]], List[float]]] = {
+    "sd": (
+        [
+            [0.3512, 0.2297, 0.3227],
+            [0.3250, 0.4974, 0.2350],
+            [-0.2829, 0.1762, 0.2721],
+            [-0.2120, -0.2616, -0.7177],
+        ],
+        [0.0, 0.0, 0.0],
+    ),
+    "sdxl": (
+        [
+            [0.3651, 0.4232, 0.4341],
+            [-0.2533, -0.0042, 0.1068],
+            [0.1076, 0.1111, -0.0362],
+            [-0.3165, -0.2492, -0.2188],
+        ],
+        [0.1084, -0.0175, -0.0011],
+    ),
+    "flux": (
+        [
+            [-0.0346, 0.0244, 0.0681],
+            [0.0034, 0.0210, 0.0687],
+            [0.0275, -0.0668, -0.0433],
+            [-0.0174, 0.0160, 0.0617],
+            [0.0859, 0.0721, 0.0329],
+            [0.0004, 0.0383, 0.0115],
+            [0.0405, 0.0861, 0.0915],
+            [-0.0236, -0.0185, -0.0259],
+            [-0.0245, 0.0250, 0.1180],
+            [0.1008, 0.0755, -0.0421],
+            [-0.0515, 0.0201, 0.0011],
+            [0.0428, -0.0012, -0.0036],
+            [0.0817, 0.0765, 0.0749],
+            [-0.1264, -0.0522, -0.1103],
+            [-0.0280, -0.0881, -0.0499],
+            [-0.1262, -0.0982, -0.0778],
+        ],
+        [-0.0329, -0.0718, -0.0851],
+    ),
+}
+
+
+def _unpack_flux_latents(latents: torch.Tensor, height: int, width: int) -> torch.Tensor:
+    """Turn Flux's packed (B, tokens, C*4) latents into (B, C, H, W)."""
+    batch, _, channels = latents.shape
+    h, w = height // 16, width // 16
+    latents = latents.view(batch, h, w, channels // 4, 2, 2)
+    latents = latents.permute(0, 3, 1, 4, 2, 5)
+    return latents.reshape(batch, channels // 4, h * 2, w * 2)
+
+
+def latents_to_rgb(
+    latents: torch.Tensor, latent_format: str, height: int, width: int
+) -> torch.Tensor:
+    """Project latents to uint8 RGB thumbnails of shape (B, H/8, W/8, 3) on CPU."""
+    factors, bias = LATENT_RGB_FACTORS[latent_format]
+    if latent_format == "flux":
+        latents = _unpack_flux_latents(latents, height, width)
+    weight = torch.tensor(factors, dtype=torch.float32, device=latents.device)
+    offset = torch.tensor(bias, dtype=torch.float32, device=latents.device)
+    rgb = torch.einsum("bchw,cr->bhwr", latents.float(), weight) + offset
+    rgb = ((rgb.clamp(-1, 1) + 1) * 127.5).to(torch.uint8)
+    return rgb.cpu()
+
+
+def encode_preview(pixels: torch.Tensor, quality: int = 70) -> str:
+    """Encode one RGB thumbnail as a base64 JPEG string."""
+    buffer = BytesIO()
+    Image.fromarray(pixels.numpy()).save(buffer, "JPEG", quality=quality)
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+class ProgressSink:
+    """Per-request receiver of step events, delivered to an asyncio queue.
+
+    Events are pushed from the inference thread and consumed on the event
+    loop. Previews are sent every ``preview_every`` steps (0 disables them).
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, preview_every: int = 0):
+        self.loop = loop
+        self.preview_every = preview_every
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.overhead_s = 0.0
+
+    def wants_preview(self, step: int, total_steps: int) -> bool:
+        return (
+            self.preview_every > 0
+            and step % self.preview_every == 0
+            and step < total_steps
+        )
+
+    def push(self, event: Dict[str, Any]) -> None:
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+
+
+class ProgressStats:
+    """Aggregate cost of progress reporting inside the denoising loop."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.steps = 0
+        self.previews = 0
+        self.overhead_s = 0.0
+
+    def record(self, overhead_s: float, previews: int) -> None:
+        with self._lock:
+            self.steps += 1
+            self.previews += previews
+            self.overhead_s += overhead_s
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "steps": self.steps,
+            "previews": self.previews,
+            "overhead_ms_total": round(self.overhead_s * 1000, 3),
+            "overhead_ms_per_step": (
+                round(self.overhead_s * 1000 / self.steps, 4) if self.steps else 0.0
+            ),
+        }
+
+
+class BatchProgress:
+    """Step callback for one pipeline call, fanning out to each request's sink.
+
+    Only the cheap part of a preview (latent projection and the copy of a
+    small thumbnail to the host) runs on the inference thread; JPEG encoding
+    happens on the consumer side.
+    """
+
+    def __init__(
+        self,
+        sinks: List[Optional[ProgressSink]],
+        latent_format: Optional[str],
+        height: int,
+        width: int,
+        stats: ProgressStats,
+    ):
+        self.sinks = sinks
+        self.latent_format = latent_format
+        self.height = height
+        self.width = width
+        self.stats = stats
+
+    def __call__(self, step: int, total_steps: int, latents: torch.Tensor) -> None:
+        start = time.perf_counter()
+        wanted = [
+            i
+            for i, sink in enumerate(self.sinks)
+            if sink is not None and sink.wants_preview(step, total_steps)
+        ]
+        previews: Dict[int, torch.Tensor] = {}
+        if wanted and self.latent_format in LATENT_RGB_FACTORS:
+            try:
+                pixels = latents_to_rgb(
+                    latents[wanted], self.latent_format, self.height, self.width
+                )
+                previews = dict(zip(wanted, pixels))
+            except Exception as e:
+                logger.warning(f"Latent preview failed: {e}")
+        for i, sink in enumerate(self.sinks):
+            if sink is None:
+                continue
+            event: Dict[str, Any] = {
+                "event": "progress",
+                "step": step,
+                "total_steps": total_steps,
+            }
+            if i in previews:
+                event["preview"] = previews[i]
+            sink.push(event)
+        overhead = time.perf_counter() - start
+        for sink in self.sinks:
+            if sink is not None:
+                sink.overhead_s += overhead
+        self.stats.record(overhead, len(previews))
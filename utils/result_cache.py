@@ -0,0 +1,202 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.lru import SizedLRUCache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so trivially different prompts share a cache key."""
+    return " ".join(prompt.split())
+
+
+class DiskTier:
+    """Size-bounded on-disk store of cached results, evicted in LRU order.
+
+    The directory may be shared by several replicas, so the files in it,
+    not this process's bookkeeping, are the source of truth. Lookups read
+    the file directly, so results written by another replica are hits too,
+    and recency is tracked through file modification times, which also
+    survive restarts. Writes are counted locally, and the directory is
+    rescanned for its real size when the count passes ``max_bytes`` or the
+    last scan is older than ``RESCAN_INTERVAL_S``, which bounds how far
+    other replicas' writes can push it over. When over, the least recently
+    used files are removed until it is below ``LOW_WATERMARK`` of the limit.
+    """
+
+    SUFFIX = ".bin"
+    LOW_WATERMARK = 0.9
+    RESCAN_INTERVAL_S = 10.0
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.entries = 0
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rescans = 0
+        self._scanned_at = 0.0
+        with self._lock:
+            self._rescan()
+        if self.entries:
+            logger.info(
+                f"Indexed {self.entries} cached results "
+                f"({self.current_bytes / 1024**2:.1f}MB) in {self.cache_dir}"
+            )
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}{self.SUFFIX}"
+
+    def _scan(self) -> List[Tuple[float, int, Path]]:
+        """Modification time, size and path of every result, oldest first."""
+        files = []
+        for path in self.cache_dir.glob(f"*{self.SUFFIX}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                # Evicted by another replica while listing.
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+        return files
+
+    def _rescan(self) -> None:
+        """Recount the directory, evicting down to the low watermark if over."""
+        self.rescans += 1
+        self._scanned_at = time.monotonic()
+        files = self._scan()
+        total = sum(size for _, size, _ in files)
+        entries = len(files)
+        if total > self.max_bytes:
+            target = self.max_bytes * self.LOW_WATERMARK
+            for _, size, path in files:
+                if total <= target:
+                    break
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+                total -= size
+                entries -= 1
+                self.evictions += 1
+        self.current_bytes = total
+        self.entries = entries
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        size = len(data)
+        if size > self.max_bytes:
+            return
+        # Unique per process, so replicas writing the same key do not collide.
+        tmp_path = self.cache_dir / f"{key}.{os.getpid()}.tmp"
+        try:
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            logger.warning(f"Could not write cached result {key}: {e}")
+            return
+        with self._lock:
+            self.entries += 1
+            self.current_bytes += size
+            if (
+                self.current_bytes > self.max_bytes
+                or time.monotonic() - self._scanned_at > self.RESCAN_INTERVAL_S
+            ):
+                self._rescan()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "entries": self.entries,
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "rescans": self.rescans,
+        }
+
+
+class ResultCache:
+    """Content-addressed cache of generated images.
+
+    Results live in a byte-bounded in-memory LRU backed by an optional
+    on-disk tier. Disk hits are promoted back into memory.
+    """
+
+    def __init__(
+        self,
+        memory_bytes: int,
+        disk_dir: Optional[str] = None,
+        disk_bytes: int = 0,
+    ):
+        self.memory = SizedLRUCache(memory_bytes)
+        self.disk = DiskTier(disk_dir, disk_bytes) if disk_dir and disk_bytes else None
+
+    @staticmethod
+    def make_key(
+        model_name: str,
+        prompt: str,
+        img_size: int,
+        num_inference_steps: int,
+        guidance_scale: float,
+        seed: int,
+        encoding: str = "png",
+    ) -> str:
+        """Build a canonical hash of everything that determines the output."""
+        canonical = json.dumps(
+            {
+                "model": model_name,
+                "prompt": normalize_prompt(prompt),
+                "img_size": int(img_size),
+                "steps": int(num_inference_steps),
+                "guidance": float(guidance_scale),
+                "seed": int(seed),
+                "encoding": encoding,
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        data = self.memory.get(key)
+        if data is not None or self.disk is None:
+            return data
+        data = self.disk.get(key)
+        if data is not None:
+            self.memory.put(key, data)
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        self.memory.put(key, data)
+        if self.disk is not None:
+            self.disk.put(key, data)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "memory": self.memory.get_stats(),
+            "disk": self.disk.get_stats() if self.disk is not None else None,
+        }
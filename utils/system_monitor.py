@@ -3,44 +3,188 @@ import warnings
 warnings.filterwarnings("ignore")  # ipex warning
 
 import logging
-from typing import Any, Dict
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
 
 import psutil
 import torch
-import intel_extension_for_pytorch
+
+try:
+    # Imported for its side effect: on older torch builds IPEX is what
+    # provides the torch.xpu device and memory queries used below.
+    import intel_extension_for_pytorch  # noqa: F401
+except ImportError:
+    # CPU-only hosts, where there is no device memory to sample.
+    pass
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+# Numeric fields of a sample, summarized by ``SystemSampler.history``.
+SAMPLE_FIELDS = (
+    "cpu_percent",
+    "process_cpu_percent",
+    "rss_bytes",
+    "host_available_bytes",
+    "device_allocated_bytes",
+    "device_reserved_bytes",
+)
+
+
 class SystemMonitor:
     """Utility class for monitoring system resources."""
 
     BYTES_PER_GB: int = 1024**3
 
     @classmethod
-    def get_system_info(cls, device=0) -> Dict[str, Any]:
-        """Get comprehensive system information."""
+    def get_system_info(cls, sample: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Summarize a ``SystemSampler`` sample in the units ``/info`` reports."""
+        if sample is None:
+            return {}
         info = {
-            "cpu_usage": psutil.cpu_percent(),
-            "available_memory": psutil.virtual_memory().available / cls.BYTES_PER_GB,
-            "total_memory": psutil.virtual_memory().total / cls.BYTES_PER_GB,
+            "sampled_at": sample["timestamp"],
+            "cpu_usage": sample["cpu_percent"],
+            "process_cpu_usage": sample["process_cpu_percent"],
+            "process_rss": round(sample["rss_bytes"] / cls.BYTES_PER_GB, 2),
+            "available_memory": sample["host_available_bytes"] / cls.BYTES_PER_GB,
+            "total_memory": sample["host_total_bytes"] / cls.BYTES_PER_GB,
         }
+        if sample["device_total_bytes"] is not None:
+            total_vram = sample["device_total_bytes"] / cls.BYTES_PER_GB
+            used_vram = sample["device_allocated_bytes"] / cls.BYTES_PER_GB
+            info.update(
+                {
+                    "total_vram": f"{total_vram:.2f}GB",
+                    "available_vram": f"{total_vram - used_vram:.2f}GB",
+                    "vram_usage": f"{used_vram:.2f}GB",
+                }
+            )
+        return info
 
+    @staticmethod
+    def free_device_memory(device: str) -> Optional[int]:
+        """Bytes of device memory not allocated by this process, if known."""
+        if not device.startswith("xpu"):
+            return None
         try:
-            if hasattr(torch.xpu, "get_device_properties"):
-                device_props = torch.xpu.get_device_properties(device)
-                total_vram = device_props.total_memory / cls.BYTES_PER_GB
-                memory_stats = torch.xpu.memory_stats(device)
-                used_vram = memory_stats.get("allocated_bytes", 0) / cls.BYTES_PER_GB
-                free_vram = total_vram - used_vram
-                info.update(
-                    {
-                        "total_vram": f"{total_vram:.2f}GB",
-                        "available_vram": f"{free_vram:.2f}GB",
-                        "vram_usage": f"{used_vram:.2f}GB",
-                    }
-                )
+            total = torch.xpu.get_device_properties(device).total_memory
+            return max(0, total - torch.xpu.memory_allocated(device))
         except Exception as e:
-            logger.warning(f"Could not get VRAM info: {e}")
-        return info
+            logger.warning(f"Could not get free device memory: {e}")
+            return None
+
+
+class SystemSampler:
+    """Sample host and device resource use on a background thread.
+
+    Every ``interval_s`` a sample of CPU use, this process's RSS, free host
+    memory and device memory goes into a ring buffer of the last
+    ``capacity`` samples, so readers get the latest figures without doing
+    any system calls. CPU percentages cover the time since the previous
+    sample.
+    """
+
+    def __init__(self, device: str, interval_s: float = 5.0, capacity: int = 720):
+        self.device = device
+        self.interval_s = interval_s
+        self._samples: Deque[Dict[str, Any]] = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._process = psutil.Process()
+        self._device_total: Optional[int] = None
+        if device.startswith("xpu"):
+            try:
+                self._device_total = torch.xpu.get_device_properties(
+                    device
+                ).total_memory
+            except Exception as e:
+                logger.warning(f"Could not get device memory size: {e}")
+        # The first call of each starts the interval the next one reports on.
+        psutil.cpu_percent(interval=None)
+        self._process.cpu_percent(interval=None)
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="system-sampler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval_s + 1)
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.sample()
+            except Exception as e:
+                logger.warning(f"System sample failed: {e}")
+            if self._stop.wait(self.interval_s):
+                return
+
+    def sample(self) -> Dict[str, Any]:
+        """Take a sample now and add it to the buffer."""
+        memory = psutil.virtual_memory()
+        sample = {
+            "timestamp": time.time(),
+            "cpu_percent": psutil.cpu_percent(interval=None),
+            "process_cpu_percent": self._process.cpu_percent(interval=None),
+            "rss_bytes": self._process.memory_info().rss,
+            "host_available_bytes": memory.available,
+            "host_total_bytes": memory.total,
+            "device_allocated_bytes": None,
+            "device_reserved_bytes": None,
+            "device_total_bytes": self._device_total,
+        }
+        if self._device_total is not None:
+            try:
+                sample["device_allocated_bytes"] = torch.xpu.memory_allocated(
+                    self.device
+                )
+                sample["device_reserved_bytes"] = torch.xpu.memory_reserved(
+                    self.device
+                )
+            except Exception as e:
+                logger.warning(f"Could not read device memory: {e}")
+        with self._lock:
+            self._samples.append(sample)
+        return sample
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._samples[-1] if self._samples else None
+
+    def history(self, window_s: Optional[float] = None) -> Dict[str, Any]:
+        """Buffered samples with the min, max and average of each field.
+
+        Limited to the last ``window_s`` seconds when given.
+        """
+        with self._lock:
+            samples: List[Dict[str, Any]] = list(self._samples)
+        if window_s is not None:
+            since = time.time() - window_s
+            samples = [s for s in samples if s["timestamp"] >= since]
+        summary = {}
+        for name in SAMPLE_FIELDS:
+            values = [s[name] for s in samples if s[name] is not None]
+            if values:
+                summary[name] = {
+                    "min": min(values),
+                    "max": max(values),
+                    "avg": round(sum(values) / len(values), 2),
+                }
+        return {
+            "interval_s": self.interval_s,
+            "capacity": self._samples.maxlen,
+            "count": len(samples),
+            "summary": summary,
+            "samples": samples,
+        }
@@ -0,0 +1,69 @@
+import json
+import logging
+import urllib.request
+from typing import Any, Dict, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class UsageReporter:
+    """Report GPU seconds used per tenant to the auth service's quota tracker.
+
+    Takes the cumulative GPU seconds of each tenant and sends what was added
+    since the last successful report, so a failed report is included in the
+    next one instead of being lost.
+    """
+
+    def __init__(self, url: Optional[str], token: Optional[str], timeout_s: float = 2):
+        self.url = url
+        self.token = token
+        self.timeout_s = timeout_s
+        self._reported: Dict[str, float] = {}
+        self.reports = 0
+        self.failures = 0
+        self.reported_s = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.url and self.token)
+
+    def pending(self, totals: Dict[str, float]) -> Dict[str, float]:
+        """GPU seconds per tenant not yet reported."""
+        usage = {}
+        for tenant, total in totals.items():
+            delta = total - self._reported.get(tenant, 0.0)
+            if delta > 0:
+                usage[tenant] = round(delta, 3)
+        return usage
+
+    def report(self, totals: Dict[str, float]) -> None:
+        """Send unreported usage; blocking, so run it off the event loop."""
+        usage = self.pending(totals)
+        if not self.enabled or not usage:
+            return
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(usage).encode(),
+            headers={"Content-Type": "application/json", "X-Usage-Token": self.token},
+            method="POST",
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout_s):
+                pass
+        except OSError as e:
+            self.failures += 1
+            logger.warning(f"Could not report usage to {self.url}: {e}")
+            return
+        for tenant, delta in usage.items():
+            self._reported[tenant] = self._reported.get(tenant, 0.0) + delta
+        self.reports += 1
+        self.reported_s += sum(usage.values())
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "reports": self.reports,
+            "failures": self.failures,
+            "reported_gpu_s": round(self.reported_s, 3),
+        }
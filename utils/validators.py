@@ -1,8 +1,10 @@
-from typing import Any, Dict, Optional, Union
+from typing import Any, Dict, List, Optional, Union
 
 from fastapi import HTTPException
 
-from config.model_configs import MODEL_CONFIGS
+from config.model_configs import MODEL_CONFIGS, img_size_buckets
+from utils.batching import DEFAULT_PRIORITY_WEIGHTS
+from utils.image_encoding import FORMAT_ALIASES, MEDIA_TYPES, OutputOptions
 
 
 class GenerationValidator:
@@ -11,6 +13,7 @@ class GenerationValidator:
     MAX_PROMPT_LENGTH: int = 200
     MAX_GUIDANCE_SCALE: float = 10.0
     MAX_INFERENCE_STEPS: int = 50
+    MAX_SEED: int = 2**32 - 1
 
     @classmethod
     def validate_prompt(cls, prompt: str) -> None:
@@ -23,9 +26,22 @@ class GenerationValidator:
                 detail=f"Prompt too long (max {cls.MAX_PROMPT_LENGTH} characters)",
             )
 
+    @classmethod
+    def validate_model(cls, model_name: str, served_models: List[str]) -> None:
+        """Validate that a requested model is served by this deployment."""
+        if model_name not in served_models:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Model must be one of {', '.join(served_models)}",
+            )
+
     @classmethod
     def validate_image_size(cls, model_name: str, img_size: Union[int, str]) -> None:
-        """Validate image size is within model's allowed range."""
+        """Validate image size is one of the model's size buckets.
+
+        Only bucket sizes are warmed up at startup, so any other size would
+        pay first-call costs on a user request.
+        """
         config = MODEL_CONFIGS[model_name]
 
         try:
@@ -41,6 +57,12 @@ class GenerationValidator:
                 status_code=400,
                 detail=f"Image size must be between {config['min_img_size']} and {config['max_img_size']}",
             )
+        sizes = img_size_buckets(model_name)
+        if img_size_int not in sizes:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Image size must be one of {', '.join(map(str, sizes))}",
+            )
 
     @classmethod
     def validate_generation_params(
@@ -91,3 +113,125 @@ class GenerationValidator:
             "guidance_scale": guidance_scale_float,
             "num_inference_steps": steps_int,
         }
+
+    @classmethod
+    def validate_seed(cls, seed: Optional[Union[int, str]]) -> Optional[int]:
+        """Validate an optional generation seed."""
+        if seed is None:
+            return None
+        try:
+            seed_int = int(seed)
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Seed must be an integer")
+        if seed_int < 0 or seed_int > cls.MAX_SEED:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Seed must be between 0 and {cls.MAX_SEED}",
+            )
+        return seed_int
+
+    @classmethod
+    def validate_num_images(
+        cls, num_images: Optional[Union[int, str]], max_images: int
+    ) -> int:
+        """Validate the number of images requested for one prompt."""
+        if num_images is None:
+            return 1
+        try:
+            num_images_int = int(num_images)
+        except (ValueError, TypeError):
+            raise HTTPException(
+                status_code=400, detail="Number of images must be an integer"
+            )
+        if num_images_int < 1 or num_images_int > max_images:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Number of images must be between 1 and {max_images}",
+            )
+        return num_images_int
+
+    @classmethod
+    def validate_deadline(
+        cls, deadline_s: Optional[Union[float, int, str]]
+    ) -> Optional[float]:
+        """Validate an optional client deadline in seconds."""
+        if deadline_s is None:
+            return None
+        try:
+            deadline_float = float(deadline_s)
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Deadline must be a number")
+        if deadline_float <= 0:
+            raise HTTPException(status_code=400, detail="Deadline must be positive")
+        return deadline_float
+
+    @classmethod
+    def validate_priority(cls, priority: Optional[str], default: str) -> str:
+        """Validate a request's priority class."""
+        if priority is None:
+            return default
+        if priority not in DEFAULT_PRIORITY_WEIGHTS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Priority must be one of {', '.join(DEFAULT_PRIORITY_WEIGHTS)}",
+            )
+        return priority
+
+    @classmethod
+    def validate_preview_every(cls, preview_every: Union[int, str]) -> int:
+        """Validate the preview interval of a streaming request."""
+        try:
+            preview_every_int = int(preview_every)
+        except (ValueError, TypeError):
+            raise HTTPException(
+                status_code=400, detail="Preview interval must be an integer"
+            )
+        if preview_every_int < 0 or preview_every_int > cls.MAX_INFERENCE_STEPS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Preview interval must be between 0 and {cls.MAX_INFERENCE_STEPS}",
+            )
+        return preview_every_int
+
+    @classmethod
+    def validate_output_options(
+        cls,
+        output_format: Optional[str],
+        quality: Optional[Union[int, str]],
+        compress_level: Optional[Union[int, str]],
+        defaults: OutputOptions,
+    ) -> OutputOptions:
+        """Validate response encoding options, filling gaps from ``defaults``."""
+        fmt = (output_format or defaults.output_format).lower()
+        fmt = FORMAT_ALIASES.get(fmt, fmt)
+        if fmt not in MEDIA_TYPES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Output format must be one of {', '.join(MEDIA_TYPES)}",
+            )
+        options = OutputOptions(
+            output_format=fmt,
+            quality=defaults.quality,
+            compress_level=defaults.compress_level,
+        )
+        if quality is not None:
+            try:
+                options.quality = int(quality)
+            except (ValueError, TypeError):
+                raise HTTPException(status_code=400, detail="Quality must be an integer")
+            if options.quality < 1 or options.quality > 100:
+                raise HTTPException(
+                    status_code=400, detail="Quality must be between 1 and 100"
+                )
+        if compress_level is not None:
+            try:
+                options.compress_level = int(compress_level)
+            except (ValueError, TypeError):
+                raise HTTPException(
+                    status_code=400, detail="Compress level must be an integer"
+                )
+            if options.compress_level < 0 or options.compress_level > 9:
+                raise HTTPException(
+                    status_code=400, detail="Compress level must be between 0 and 9"
+                )
+        return options